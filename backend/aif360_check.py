@@ -0,0 +1,113 @@
+import math
+import time
+import logging
+from aif360_preprocessing import group_split
+
+logger = logging.getLogger(__name__)
+
+# Cross-check of the numpy/pandas metrics against aif360 itself.
+#
+# The pipeline never imports aif360 (see label_dataset); this module does so on first use only,
+# and recomputes the metrics of the same encoded rows with BinaryLabelDatasetMetric and
+# Reweighing: binary attributes as 1 vs 0, categorical ones for every pair of groups.
+# check_metrics compares a response with that reference value by value, and cross_check does
+# both, or reports that aif360 is not installed instead of failing the request.
+
+TOLERANCE = 1e-9
+
+def aif360_import_ms():
+    # Cost of importing the aif360 modules used here (0 once they are loaded)
+    start = time.perf_counter()
+    import aif360.datasets, aif360.metrics, aif360.algorithms.preprocessing  # noqa: F401
+    return round((time.perf_counter() - start) * 1000.0, 3)
+
+def aif360_reference(df, target_column, categories=None, references=None):
+    # Original and reweighed metrics of encoded rows (see encode_frame), computed pair by pair with aif360
+    from aif360.datasets import BinaryLabelDataset
+    from aif360.metrics import BinaryLabelDatasetMetric
+    from aif360.algorithms.preprocessing import Reweighing
+
+    protected = [column for column in df.columns if column != target_column]
+    dataset = BinaryLabelDataset(favorable_label=1.0, unfavorable_label=0.0, df=df.astype(float),
+                                 label_names=[target_column], protected_attribute_names=protected)
+
+    splits = [group_split(column, categories, references) for column in protected]
+    reweighed = Reweighing(
+        privileged_groups=[{column: value} for column, (values, _) in zip(protected, splits) for value in values],
+        unprivileged_groups=[{column: value} for column, (_, values) in zip(protected, splits) for value in values],
+    ).fit_transform(dataset)
+
+    def metrics(data):
+        result = {}
+        for column in protected:
+            codes = sorted(set(data.protected_attributes[:, protected.index(column)]))
+            pairs = {}
+            for i in codes:
+                for j in codes:
+                    if i != j:
+                        pairs[(i, j)] = _aif360_metrics(BinaryLabelDatasetMetric, data, column, [i], [j])
+            result[column] = {'codes': codes, 'pairs': pairs,
+                              'binary': _aif360_metrics(BinaryLabelDatasetMetric, data, column, [1.0], [0.0])}
+        return result
+
+    return {'original': metrics(dataset), 'reweighed': metrics(reweighed)}
+
+def cross_check(response, df, target_column, categories=None, references=None):
+    try:
+        import_ms = aif360_import_ms()
+    except ImportError as e:
+        logger.warning("Skipping the aif360 cross-check: %s", e)
+        return {'compared': 0, 'max_abs_diff': None, 'ok': None, 'mismatches': [],
+                'error': f"The aif360 cross-check requires aif360: {str(e)}"}
+    return {**check_metrics(response, aif360_reference(df, target_column, categories, references)), 'aif360_import_ms': import_ms}
+
+def _aif360_metrics(metric_class, data, column, privileged, unprivileged):
+    metric = metric_class(data, privileged_groups=[{column: value} for value in privileged],
+                          unprivileged_groups=[{column: value} for value in unprivileged])
+    return metric.statistical_parity_difference(), metric.disparate_impact()
+
+def check_metrics(response, reference):
+    # Largest difference between the worker's metrics and aif360's over every reported value
+    compared = 0
+    max_abs_diff = 0.0
+    mismatches = []
+    for side in ('original', 'reweighed'):
+        for attr, metrics in (response.get(side) or {}).items():
+            expected = reference[side].get(attr) or reference[side].get(attr.replace(' ', ''))
+            if expected is None:
+                continue
+            if 'matrix' in metrics:
+                codes = expected['codes']
+                pairs = [((metrics['matrix'][name][i][j]), expected['pairs'][(codes[i], codes[j])][index], f'{name}[{i}][{j}]')
+                         for index, name in enumerate(('statistical_parity_difference', 'disparate_impact'))
+                         for i in range(len(codes)) for j in range(len(codes)) if i != j]
+            else:
+                pairs = [(metrics[name], expected['binary'][index], name)
+                         for index, name in enumerate(('statistical_parity_difference', 'disparate_impact'))]
+            for value, expected_value, name in pairs:
+                compared += 1
+                diff = _difference(value, expected_value)
+                max_abs_diff = max(max_abs_diff, diff)
+                if diff > TOLERANCE:
+                    mismatches.append({'side': side, 'attribute': attr, 'metric': name,
+                                       'value': value, 'aif360': _json_number(expected_value)})
+    return {'compared': compared, 'max_abs_diff': max_abs_diff, 'ok': not mismatches, 'mismatches': mismatches[:10]}
+
+def _number(value):
+    if value is None:
+        return math.nan
+    if isinstance(value, str):
+        return float(value.replace('Infinity', 'inf'))
+    return float(value)
+
+def _difference(value, expected):
+    value, expected = _number(value), _number(expected)
+    if math.isnan(value) or math.isnan(expected):
+        return 0.0 if math.isnan(value) and math.isnan(expected) else math.inf
+    if math.isinf(value) or math.isinf(expected):
+        return 0.0 if value == expected else math.inf
+    return abs(value - expected)
+
+def _json_number(value):
+    value = float(value)
+    return value if math.isfinite(value) else str(value)
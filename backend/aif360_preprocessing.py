@@ -1,20 +1,64 @@
 import pandas as pd
 import numpy as np
-import sys
 import json
 import logging
-from aif360.datasets import BinaryLabelDataset
-from aif360.algorithms.preprocessing import Reweighing
+import argparse
+from label_dataset import LabelDataset
+from encoding_schema import COMPILED_SCHEMA, OUTCOME_CODES, MISSING, reference_codes, category_codes, require_reference
+from group_metrics import (selection_rate, reweighing_cells, reweighing_factors, REWEIGHING_CELLS,
+                           PRIVILEGED_CELL, UNPRIVILEGED_CELL, FAVORABLE_CELL)
+from instrumentation import span, Preview, log_level_from_env
+from dataset_io import read_dataset, write_dataset, write_json, SUPPORTED_FORMATS, STDIO
 
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(message)s')
+logging.basicConfig(level=log_level_from_env(), format='%(message)s')
 logger = logging.getLogger(__name__)
 
-def calculate_outcome_rates(dataset, protected_attributes):
+def group_split(attr, categories=None, references=None):
+    # Encoded values on the privileged and unprivileged side of an attribute. Binary attributes
+    # are 1 vs 0; categorical ones are their reference category vs every other category.
+    if categories and attr in categories:
+        codes = [float(code) for code in range(len(categories[attr]))]
+        reference = require_reference(attr, (references or {}).get(attr))
+        privileged = [float(categories[attr].index(reference))] if reference in categories[attr] else []
+        return privileged, [code for code in codes if code not in privileged]
+    return [1.0], [0.0]
+
+def reweighing_cells_for(df, target_column, protected_attributes, categories=None, references=None):
+    # Reweighing cell of every row. As with aif360's group lists, a row is privileged if any
+    # attribute puts it on the privileged side, and unprivileged if any puts it on the other.
+    privileged = np.zeros(len(df), dtype=bool)
+    unprivileged = np.zeros(len(df), dtype=bool)
+    for attr in protected_attributes:
+        privileged_values, unprivileged_values = group_split(attr, categories, references)
+        values = df[attr].to_numpy()
+        privileged |= np.isin(values, privileged_values)
+        unprivileged |= np.isin(values, unprivileged_values)
+    return reweighing_cells(privileged, unprivileged, df[target_column].to_numpy())
+
+def reweighing_summary(cell_totals, factors):
+    # Compact weight table: one entry per non-empty (privileged, unprivileged, label) cell
+    weights = []
+    for cell in np.flatnonzero(cell_totals):
+        weights.append({
+            'privileged': bool(cell & PRIVILEGED_CELL),
+            'unprivileged': bool(cell & UNPRIVILEGED_CELL),
+            'favorable': bool(cell & FAVORABLE_CELL),
+            'count': float(cell_totals[cell]),
+            'weight': float(factors[cell])
+        })
+    return {'weights': weights}
+
+def code_value(value):
+    # Encoded columns hold small integer codes; raw data keys keep the 0.0 / 1.0 form the frontend expects
+    return float(value) if isinstance(value, (int, np.integer)) else value
+
+def calculate_outcome_rates(dataset, protected_attributes, categories=None, references=None):
     outcome_rates = {}
     for attr in protected_attributes:
-        privileged_mask = dataset.protected_attributes[:, dataset.protected_attribute_names.index(attr)] == 1.0
-        unprivileged_mask = dataset.protected_attributes[:, dataset.protected_attribute_names.index(attr)] == 0.0
+        privileged_values, unprivileged_values = group_split(attr, categories, references)
+        privileged_mask = np.isin(dataset.protected_attributes[:, dataset.protected_attribute_names.index(attr)], privileged_values)
+        unprivileged_mask = np.isin(dataset.protected_attributes[:, dataset.protected_attribute_names.index(attr)], unprivileged_values)
         
         privileged_rate = np.mean(dataset.labels[privileged_mask] == dataset.favorable_label)
         unprivileged_rate = np.mean(dataset.labels[unprivileged_mask] == dataset.favorable_label)
@@ -25,169 +69,239 @@ def calculate_outcome_rates(dataset, protected_attributes):
         }
     return outcome_rates
 
-def calculate_raw_data(df, target_column, protected_attributes):
+def outcome_rates_from_counts(attribute_counts, categories=None, references=None):
+    # Same result as calculate_outcome_rates, from running GroupLabelCounts totals per attribute
+    outcome_rates = {}
+    for attr, counts in attribute_counts.items():
+        privileged_values, unprivileged_values = group_split(attr, categories, references)
+        values = np.asarray(counts.values, dtype=float)
+
+        privileged_rate = selection_rate(counts.counts, np.isin(values, privileged_values))
+        unprivileged_rate = selection_rate(counts.counts, np.isin(values, unprivileged_values))
+
+        outcome_rates[attr] = {
+            'privileged': float(privileged_rate),
+            'unprivileged': float(unprivileged_rate)
+        }
+    return outcome_rates
+
+def raw_data_from_counts(attribute_counts, categories=None):
+    # Same result as calculate_raw_data, from running GroupLabelCounts totals per attribute
+    categories = categories or {}
     raw_data = {}
-    for attr in protected_attributes:
+    for attr, counts in attribute_counts.items():
         raw_data[attr] = {}
-        for group in df[attr].unique():
-            group_data = df[df[attr] == group]
-            approved = group_data[group_data[target_column] == 1.0].shape[0]
-            total = group_data.shape[0]
-            raw_data[attr][int(group)] = {
-                'approved': int(approved),
-                'total': int(total)
+        for value, (unfavorable, favorable) in zip(counts.values, counts.counts):
+            if attr in categories:
+                key = categories[attr][int(value)]
+            elif attr == 'Religion':
+                key = code_value(value)
+            else:
+                key = str(code_value(value))
+            raw_data[attr][key] = {
+                'approved': int(favorable),
+                'total': int(unfavorable + favorable)
             }
-    logger.info(f"Raw data calculated: {json.dumps(raw_data, indent=2)}")
     return raw_data
 
-def preprocess_data(dataset, target_column, protected_attributes, dataset_type, reference_religion, reference_sexual_orientation):
-    try:
-        # Convert the parsed data into a Pandas DataFrame
-        df = pd.DataFrame(dataset)
-         # When handling protected attributes
-        for attr in protected_attributes:
-            attr_no_space = attr.replace(' ', '')
-            if attr in df.columns:
-                # Process normally
-                unique_values = df[attr].unique()
-                # ... rest of the processing ...
-            elif attr_no_space in df.columns:
-                # Rename the column to include the space
-                df.rename(columns={attr_no_space: attr}, inplace=True)
-                unique_values = df[attr].unique()
-                # ... rest of the processing ...
-            else:
-                logger.warning(f"'{attr}' column not found in the data. Skipping {attr}-specific processing.")
-        # Remove BOM from column names if present
-        df.columns = df.columns.str.lstrip('\ufeff')
+def encode_frame(dataset, target_column, protected_attributes, reference_religion, reference_sexual_orientation,
+                 categorical_attributes=None):
+    # Cleans and encodes one frame (the whole dataset, or one chunk of it) and keeps only the
+    # protected attribute and label columns. Returns (df, categories, references).
+    categorical_attributes = [attr.replace(' ', '') for attr in (categorical_attributes or [])]
+    categories = {}
+    references = {}
+
+    # Accepts a DataFrame read straight from a file, or parsed records
+    df = pd.DataFrame(dataset)
+     # When handling protected attributes
+    for attr in protected_attributes:
+        attr_no_space = attr.replace(' ', '')
+        if attr in df.columns:
+            # Process normally
+            unique_values = df[attr].unique()
+            # ... rest of the processing ...
+        elif attr_no_space in df.columns:
+            # Rename the column to include the space
+            df.rename(columns={attr_no_space: attr}, inplace=True)
+            unique_values = df[attr].unique()
+            # ... rest of the processing ...
+        else:
+            logger.warning(f"'{attr}' column not found in the data. Skipping {attr}-specific processing.")
+    # Remove BOM from column names if present
+    df.columns = df.columns.str.lstrip('\ufeff')
 
-        logger.info(f"Column names in the DataFrame: {df.columns.tolist()}")
-        logger.info(f"DataFrame before preprocessing:\n{df.head().to_json()}")
+    logger.info("Column names in the DataFrame: %s", Preview(lambda: df.columns.tolist()))
+    logger.debug("DataFrame before preprocessing:\n%s", Preview(df))
 
-        # Remove rows with any NA values or empty strings
+    # Remove rows with any NA values or empty strings
+    with span('clean', rows=len(df)):
         df = df.replace('', pd.NA).dropna()
-        logger.info(f"Shape after removing NA values: {df.shape}")
-
-        # Custom encoding for Race, Outcome, Gender, Age, Education Level, Disability, and Sexual Orientation columns
-        race_mapping = {'Black': 0, 'Hispanic': 1, 'Asian': 2, 'White': 3}
-        outcome_mapping = {'Denied': 0, 'Approved': 1}
-        gender_mapping = {'Female': 0, 'Male': 1}
-        education_mapping = {'High School': 0, 'Bachelor': 1, 'Master': 2, 'PhD': 3}
-        disability_mapping = {'No': 1, 'Yes': 0}
-        sexual_orientation_mapping = {
-            'Heterosexual': 1,  # Privileged group
-            'Lesbian': 0,
-            'Gay': 0,
-            'Bisexual': 0,
-            'Asexual': 0,
-            'Queer': 0,
-            'Pansexual': 0
-        }
+    logger.info("Shape after removing NA values: %s", df.shape)
 
-        # Apply mappings
+    # Encode Race, Outcome, Gender, Age, Education Level, Disability, Religion and Sexual Orientation
+    # columns to compact integer codes (see encoding_schema); rows without a code are dropped below
+    with span('encode', rows=len(df)):
+        codes = {}
         if 'Race' in df.columns:
-            df['Race'] = df['Race'].map(race_mapping)
-        df[target_column] = df[target_column].map(outcome_mapping)
-        if 'Gender' in df.columns:
-            df['Gender'] = df['Gender'].map(gender_mapping)
-        if 'Age' in df.columns:
-            df['Age'] = pd.to_numeric(df['Age'], errors='coerce')
-            df = df.dropna(subset=['Age'])
-            df['Age'] = (df['Age'] < 40).astype(int)  # Young (< 40) is 1, Old (≥ 40) is 0
-        if 'Education' in df.columns:
-            df['Education'] = df['Education'].map(education_mapping)
-        if 'Disability' in df.columns:
-            df['Disability'] = df['Disability'].map(disability_mapping)
+            codes['Race'] = COMPILED_SCHEMA['Race'].encode(df['Race'])
+        codes[target_column] = OUTCOME_CODES.encode(df[target_column])
+        for col in ('Gender', 'Age', 'Education', 'Disability'):
+            if col in df.columns:
+                codes[col] = COMPILED_SCHEMA[col].encode(df[col])
 
         # Handle Religion column
-        if 'Religion' in df.columns and reference_religion:
-            unique_religions = df['Religion'].unique()
-            logger.info(f"Unique religions found: {unique_religions}")
-            religion_mapping = {religion: (1 if religion == reference_religion else 0) for religion in unique_religions}
-            df['Religion'] = df['Religion'].map(religion_mapping)
+        if 'Religion' in df.columns and 'Religion' in categorical_attributes:
+            codes['Religion'], religion_categories = category_codes(df['Religion'])
+            logger.info("Religion categories: %s", Preview(religion_categories))
+            categories['Religion'] = religion_categories
+            references['Religion'] = reference_religion
+        elif 'Religion' in df.columns and reference_religion:
+            logger.info("Unique religions found: %s", Preview(lambda: df['Religion'].unique()))
+            codes['Religion'] = reference_codes(df['Religion'], reference_religion)
         else:
             logger.warning("'Religion' column not found in the data or no reference religion provided. Skipping religion-specific processing.")
 
         # Handle Sexual Orientation column
         sexual_orientation_column = 'Sexual Orientation' if 'Sexual Orientation' in df.columns else 'SexualOrientation'
         if sexual_orientation_column in df.columns:
-            if reference_sexual_orientation:
-                unique_orientations = df[sexual_orientation_column].unique()
-                logger.info(f"Unique sexual orientations found: {unique_orientations}")
-                sexual_orientation_mapping = {orientation: (1 if orientation == reference_sexual_orientation else 0) for orientation in unique_orientations}
-            df[sexual_orientation_column] = df[sexual_orientation_column].map(sexual_orientation_mapping)
+            if 'SexualOrientation' in categorical_attributes:
+                codes['SexualOrientation'], orientation_categories = category_codes(df[sexual_orientation_column])
+                logger.info("Sexual orientation categories: %s", Preview(orientation_categories))
+                categories['SexualOrientation'] = orientation_categories
+                references['SexualOrientation'] = reference_sexual_orientation or 'Heterosexual'
+            elif reference_sexual_orientation:
+                logger.info("Unique sexual orientations found: %s", Preview(lambda: df[sexual_orientation_column].unique()))
+                codes['SexualOrientation'] = reference_codes(df[sexual_orientation_column], reference_sexual_orientation)
+            else:
+                codes['SexualOrientation'] = COMPILED_SCHEMA['SexualOrientation'].encode(df[sexual_orientation_column])
             # Rename the column to 'SexualOrientation' for consistency
-            df.rename(columns={sexual_orientation_column: 'SexualOrientation'}, inplace=True)
+            df = df.drop(columns=[sexual_orientation_column])
             if 'SexualOrientation' not in protected_attributes:
                 protected_attributes.append('SexualOrientation')
         else:
             logger.warning("'Sexual Orientation' column not found in the data. Skipping sexual orientation-specific processing.")
 
-        # Remove any rows that couldn't be mapped (i.e., contain NaN after mapping)
-        df = df.dropna()
-        logger.info(f"Shape after encoding and removing unmapped values: {df.shape}")
+        # Remove any rows that couldn't be mapped (i.e. got no code)
+        mapped = np.ones(len(df), dtype=bool)
+        for column_codes in codes.values():
+            mapped &= column_codes != MISSING
+        df = df.iloc[mapped].assign(**{col: column_codes[mapped] for col, column_codes in codes.items()})
+        logger.info("Shape after encoding and removing unmapped values: %s", df.shape)
+
+    # Numeric columns that are not part of the schema keep their old float encoding
+    for col in df.columns:
+        if col not in codes and df[col].dtype in ['int64', 'float64']:
+            df[col] = df[col].astype(float)
+
+    logger.debug("DataFrame after encoding:\n%s", Preview(df))
+
+    # Ensure all columns are present and in the correct order
+    required_columns = [col for col in protected_attributes + [target_column] if col in df.columns]
+    df = df[required_columns]
+
+    return df, categories, references
 
-        # Convert only numeric columns to float
-        for col in df.columns:
-            if df[col].dtype in ['int64', 'float64']:
-                df[col] = df[col].astype(float)
+# Columns encode_frame maps (and may drop rows for) whether or not they are protected attributes
+ENCODED_COLUMNS = ('Race', 'Gender', 'Age', 'Education', 'Disability', 'Religion', 'Sexual Orientation', 'SexualOrientation')
 
-        logger.info(f"DataFrame after encoding:\n{df.to_json(orient='records')}")
+# Number of original rows behind each line of an aggregated table
+ROW_COUNT_COLUMN = '__rows__'
 
-        # Ensure all columns are present and in the correct order
-        required_columns = [col for col in protected_attributes + [target_column] if col in df.columns]
-        df = df[required_columns]
+def relevant_columns(target_column, protected_attributes):
+    # Names of the columns encode_frame reads, with and without the space it restores
+    relevant = {target_column, *ENCODED_COLUMNS}
+    for attr in protected_attributes:
+        relevant.update((attr, attr.replace(' ', '')))
+    return relevant
+
+def aggregate_frame(dataset, target_column, protected_attributes):
+    # Collapses a raw frame to its distinct combinations of the columns encode_frame reads, with
+    # the number of rows behind each in ROW_COUNT_COLUMN. Encoding the aggregated table gives the
+    # same groups and labels as encoding every row. Frames that are already aggregated (e.g. the
+    # tables of several chunks concatenated) are merged by summing their counts.
+    df = pd.DataFrame(dataset)
+    if ROW_COUNT_COLUMN not in df.columns:
+        df[ROW_COUNT_COLUMN] = 1
+    relevant = relevant_columns(target_column, protected_attributes)
+    keys = [col for col in df.columns if col.lstrip('\ufeff') in relevant]
+
+    # encode_frame drops rows with an empty cell in any column, including the ones it then ignores
+    others = [col for col in df.columns if col not in keys and col != ROW_COUNT_COLUMN]
+    if others:
+        df = df[~df[others].replace('', pd.NA).isna().any(axis=1)]
+    if not keys:
+        return pd.DataFrame({ROW_COUNT_COLUMN: [df[ROW_COUNT_COLUMN].sum()]})
+    return df.groupby(keys, sort=False, dropna=False)[ROW_COUNT_COLUMN].sum().reset_index()
+
+def preprocess_frame(dataset, target_column, protected_attributes, dataset_type, reference_religion, reference_sexual_orientation,
+                     categorical_attributes=None):
+    # Same as preprocess_data, but 'original_data' is returned as a DataFrame and 'instance_weights' as an array.
+    # Religion and Sexual Orientation listed in categorical_attributes keep one code per category
+    # (reported in result['categories']) instead of being reduced to reference vs everyone else.
+    try:
+        df, categories, references = encode_frame(dataset, target_column, protected_attributes, reference_religion,
+                                                  reference_sexual_orientation, categorical_attributes)
 
         # Calculate raw data
-        raw_data = calculate_raw_data(df, target_column, [col for col in protected_attributes if col in df.columns])
+        with span('aggregate', rows=len(df)):
+            raw_data = calculate_raw_data(df, target_column, [col for col in protected_attributes if col in df.columns], categories)
 
-        # Convert the DataFrame into an AIF360 dataset
-        dataset = BinaryLabelDataset(favorable_label=1.0, unfavorable_label=0.0,
-                                     df=df,
-                                     label_names=[target_column],
-                                     protected_attribute_names=[col for col in protected_attributes if col in df.columns])
+            # Validated label / protected attribute arrays, as aif360's BinaryLabelDataset would give
+            dataset = LabelDataset(df, [target_column], [col for col in protected_attributes if col in df.columns],
+                                   favorable_label=1.0, unfavorable_label=0.0)
 
-        logger.info(f"AIF360 dataset:\n{dataset.convert_to_dataframe()[0].to_json(orient='records')}")
+            logger.debug("Encoded dataset:\n%s", Preview(df))
 
-        # Calculate outcome rates
-        outcome_rates = calculate_outcome_rates(dataset, [col for col in protected_attributes if col in df.columns])
+            # Calculate outcome rates
+            outcome_rates = calculate_outcome_rates(dataset, [col for col in protected_attributes if col in df.columns], categories, references)
 
-        # Perform reweighting if dataset type is training data
+        # Perform reweighting if dataset type is training data. Only the weight of each
+        # (privileged, unprivileged, label) cell changes, so the result is the compact weight
+        # table plus a per-row weight vector, not a re-serialized copy of the dataset.
+        reweighing = None
+        instance_weights = None
         if dataset_type == 'training':
-            privileged_groups = [{attr: 1.0} for attr in dataset.protected_attribute_names]
-            unprivileged_groups = [{attr: 0.0} for attr in dataset.protected_attribute_names]
-            reweighing = Reweighing(privileged_groups=privileged_groups,
-                                    unprivileged_groups=unprivileged_groups)
-            dataset_transf = reweighing.fit_transform(dataset)
-
-            # Convert the preprocessed dataset back to a JSON-serializable format
-            preprocessed_data = dataset_transf.convert_to_dataframe()[0].to_dict(orient='records')
-            logger.info(f"Reweighed dataset:\n{json.dumps(preprocessed_data[:5])}") # Log first 5 rows
-
-            result = {
-                'original_data': df.to_dict(orient='records'),
-                'reweighed_data': preprocessed_data,
-                'outcome_rates': outcome_rates,
-                'raw_data': raw_data,
-                'error': None
-            }
-        else:
-            # If not training data, just return the original dataset
-            result = {
-                'original_data': df.to_dict(orient='records'),
-                'reweighed_data': None,
-                'outcome_rates': outcome_rates,
-                'raw_data': raw_data,
-                'error': None
-            }
-        
-        logger.info(f"Preprocessing result:\n{json.dumps(result, indent=2)}")
-        return result
+            with span('reweigh', rows=len(df)):
+                cells = reweighing_cells_for(df, target_column, dataset.protected_attribute_names, categories, references)
+                cell_totals = np.bincount(cells, minlength=REWEIGHING_CELLS).astype(np.float64)
+                factors = reweighing_factors(cell_totals)
+                reweighing = reweighing_summary(cell_totals, factors)
+                instance_weights = factors[cells]
+            logger.info("Reweighing weights: %s", Preview(reweighing))
+
+        return {
+            'original_data': df,
+            'reweighing': reweighing,
+            'instance_weights': instance_weights,
+            'outcome_rates': outcome_rates,
+            'raw_data': raw_data,
+            'categories': categories,
+            'references': references,
+            'error': None
+        }
     except Exception as e:
         logger.error(f"Error in preprocessing: {str(e)}")
-        return {'original_data': None, 'reweighed_data': None, 'outcome_rates': None, 'raw_data': None, 'error': str(e)}
+        return {'original_data': None, 'reweighing': None, 'instance_weights': None, 'outcome_rates': None, 'raw_data': None, 'error': str(e)}
+
+def preprocess_data(dataset, target_column, protected_attributes, dataset_type, reference_religion, reference_sexual_orientation,
+                    categorical_attributes=None, include_rows=False):
+    # JSON-serializable result. The encoded rows (as records) and their per-row weights are only
+    # included with include_rows; otherwise reweighing is the weight table of the 16 cells.
+    # Everything the results show is aggregated, and row_export writes rows to a file page by page.
+    result = preprocess_frame(dataset, target_column, protected_attributes, dataset_type, reference_religion, reference_sexual_orientation,
+                              categorical_attributes)
+    if result['error'] is None:
+        result['original_data'] = result['original_data'].to_dict(orient='records') if include_rows else None
+        if include_rows and result['instance_weights'] is not None:
+            result['instance_weights'] = result['instance_weights'].tolist()
+        else:
+            result['instance_weights'] = None
+        logger.debug("Preprocessing result:\n%s", Preview(result))
+    return result
 
-def calculate_raw_data(df, target_column, protected_attributes):
+def calculate_raw_data(df, target_column, protected_attributes, categories=None):
+    categories = categories or {}
     raw_data = {}
     for attr in protected_attributes:
         raw_data[attr] = {}
@@ -197,7 +311,7 @@ def calculate_raw_data(df, target_column, protected_attributes):
                 group_data = df[df[attr] == religion]
                 approved = group_data[group_data[target_column] == 1.0].shape[0]
                 total = group_data.shape[0]
-                raw_data[attr][religion] = {
+                raw_data[attr][categories[attr][int(religion)] if attr in categories else code_value(religion)] = {
                     'approved': int(approved),
                     'total': int(total)
                 }
@@ -218,32 +332,62 @@ def calculate_raw_data(df, target_column, protected_attributes):
                 group_data = df[df[attr] == group]
                 approved = group_data[group_data[target_column] == 1.0].shape[0]
                 total = group_data.shape[0]
-                raw_data[attr][str(group)] = {
+                raw_data[attr][categories[attr][int(group)] if attr in categories else str(code_value(group))] = {
                     'approved': int(approved),
                     'total': int(total)
                 }
-    logger.info(f"Raw data calculated: {json.dumps(raw_data, indent=2)}")
+    logger.debug("Raw data calculated: %s", Preview(raw_data))
     return raw_data
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Encode a dataset and compute outcome rates and reweighing for bias detection.')
+    parser.add_argument('--input', default=STDIO, help="Dataset file path, or '-' to read from stdin")
+    parser.add_argument('--input-format', choices=SUPPORTED_FORMATS, help='Defaults to the file extension, or csv')
+    parser.add_argument('--target-column', required=True)
+    parser.add_argument('--protected-attributes', default='[]', help='JSON list of protected attribute columns')
+    parser.add_argument('--dataset-type', default='testing')
+    parser.add_argument('--reference-religion')
+    parser.add_argument('--reference-sexual-orientation')
+    parser.add_argument('--categorical-attributes', default='[]',
+                        help='JSON list of attributes (Religion, Sexual Orientation) to keep one category per value')
+    parser.add_argument('--output', default=STDIO, help="Where to write the JSON result, '-' for stdout")
+    parser.add_argument('--original-output', help='Write the encoded dataset here; the JSON result gets its path')
+    parser.add_argument('--include-rows', action='store_true', help='Embed the encoded dataset in the JSON result, as records')
+    parser.add_argument('--weights-output', help='Also write the per-row reweighing weights here, as an instance_weights column')
+    parser.add_argument('--data-format', choices=SUPPORTED_FORMATS, help='Format of the dataset outputs, defaults to their file extension')
+    return parser.parse_args(argv)
+
 if __name__ == '__main__':
     try:
-        data_json = sys.argv[1]
-        target_column = sys.argv[2]
-        protected_attributes_json = sys.argv[3]
-        dataset_type = sys.argv[4]
-        reference_religion = sys.argv[5]
-        reference_sexual_orientation = sys.argv[6] if len(sys.argv) > 6 else None
-
-        data = json.loads(data_json)
-        protected_attributes = json.loads(protected_attributes_json)
-
-        logger.info(f"Input data: {json.dumps(data[:5], indent=2)}")  # Log first 5 rows
-        logger.info(f"Target column: {target_column}")
+        args = parse_args()
+        protected_attributes = json.loads(args.protected_attributes)
+
+        logger.info(f"Input: {args.input}")
+        logger.info(f"Target column: {args.target_column}")
         logger.info(f"Protected attributes: {protected_attributes}")
-        logger.info(f"Dataset type: {dataset_type}")
-        logger.info(f"Reference religion: {reference_religion}")
-        logger.info(f"Reference sexual orientation: {reference_sexual_orientation}")
+        logger.info(f"Dataset type: {args.dataset_type}")
+        logger.info(f"Reference religion: {args.reference_religion}")
+        logger.info(f"Reference sexual orientation: {args.reference_sexual_orientation}")
+
+        data = read_dataset(args.input, args.input_format)
+        logger.debug("Input data: %s", Preview(data))
 
-        preprocessed_data = preprocess_data(data, target_column, protected_attributes, dataset_type, reference_religion, reference_sexual_orientation)
-        print(json.dumps(preprocessed_data))
+        result = preprocess_frame(data, args.target_column, protected_attributes, args.dataset_type,
+                                  args.reference_religion, args.reference_sexual_orientation,
+                                  json.loads(args.categorical_attributes))
+        if result['error'] is None:
+            if args.original_output:
+                write_dataset(result['original_data'], args.original_output, args.data_format)
+                result['original_data'] = None
+                result['original_data_path'] = args.original_output
+            elif args.include_rows:
+                result['original_data'] = result['original_data'].to_dict(orient='records')
+            else:
+                result['original_data'] = None
+            if args.weights_output and result['instance_weights'] is not None:
+                write_dataset(pd.DataFrame({'instance_weights': result['instance_weights']}), args.weights_output, args.data_format)
+                result['instance_weights_path'] = args.weights_output
+            result['instance_weights'] = None
+        write_json(result, args.output)
     except Exception as e:
-        print(json.dumps({'error': str(e)}))
\ No newline at end of file
+        print(json.dumps({'error': str(e)}))
@@ -0,0 +1,229 @@
+import os
+import json
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from aif360_preprocessing import relevant_columns
+from chunked_analysis import AnalysisTotals, DEFAULT_CHUNKSIZE
+from group_metrics import GroupLabelCounts, REWEIGHING_CELLS
+from instrumentation import span, spanned
+from dataset_io import iter_dataset_chunks, write_json, SUPPORTED_FORMATS, STDIO
+
+logger = logging.getLogger(__name__)
+
+# Bias metrics of many datasets that share a schema (e.g. one decision file per model version),
+# given as several files or as one file with a partition column.
+#
+# Rows of all datasets are encoded together, batch by batch, and counted in one grouped pass:
+# a single bincount per attribute over (partition x group value x reweighing cell). Each
+# partition ends up with the same totals an AnalysisTotals fed only its rows would have, so its
+# metrics (and reweighing) are exactly those of a separate run, without the fixed cost of one.
+
+PARTITION_COLUMN = '__partition__'
+
+class PartitionedTotals:
+    def __init__(self, target_column, protected_attributes, reference_religion, reference_sexual_orientation,
+                 categorical_attributes=None):
+        # Encodes every batch; its own totals are not used
+        self.encoder = AnalysisTotals(target_column, protected_attributes, reference_religion,
+                                      reference_sexual_orientation, categorical_attributes)
+        self.partitions = {}
+
+    def partition(self, name):
+        if name not in self.partitions:
+            self.partitions[name] = self.encoder.empty_like()
+        return self.partitions[name]
+
+    def add(self, chunk, partitions, weights=None):
+        # partitions (aligned with the chunk's index) names the dataset of every row; rows
+        # without one are skipped
+        df, chunk_categories, chunk_references, weights = self.encoder.encode(chunk, weights)
+        partition_codes, names = pd.factorize(np.asarray(partitions.loc[df.index], dtype=object))
+        names = [str(name) for name in names]
+        for name in names:
+            self.partition(name).references.update(chunk_references)
+        kept = partition_codes >= 0
+        if not kept.all():
+            df, partition_codes = df[kept], partition_codes[kept]
+            weights = weights[kept] if weights is not None else None
+        if len(df) == 0:
+            return self
+
+        with span('aggregate', rows=len(df)):
+            cells = self.encoder.cells(df, chunk_categories, chunk_references)
+            n_partitions = len(names)
+            cell_totals = np.bincount(partition_codes * REWEIGHING_CELLS + cells, weights=weights,
+                                      minlength=n_partitions * REWEIGHING_CELLS).reshape(n_partitions, REWEIGHING_CELLS)
+            rows = np.bincount(partition_codes, weights=weights, minlength=n_partitions)
+            for index, name in enumerate(names):
+                totals = self.partition(name)
+                totals.cell_totals += cell_totals[index]
+                totals.rows += int(rows[index])
+
+            for col, values in self.encoder.group_values(df, chunk_categories):
+                group_codes, group_values = pd.factorize(values, sort=False)
+                n_groups = len(group_values)
+                counts = np.bincount((partition_codes * n_groups + group_codes) * REWEIGHING_CELLS + cells, weights=weights,
+                                     minlength=n_partitions * n_groups * REWEIGHING_CELLS)
+                counts = counts.reshape(n_partitions, n_groups, REWEIGHING_CELLS)
+                # Only the groups that occur in a partition are added to it, as if it had been counted alone
+                occurrences = np.bincount(partition_codes * n_groups + group_codes,
+                                          minlength=n_partitions * n_groups).reshape(n_partitions, n_groups)
+                for index, name in enumerate(names):
+                    present = np.flatnonzero(occurrences[index])
+                    if len(present) == 0:
+                        continue
+                    totals = self.partition(name)
+                    present_values = [group_values[group] for group in present]
+                    if col in chunk_categories:
+                        totals.category_labels.setdefault(col, set()).update(present_values)
+                    totals.attribute_counts.setdefault(col, GroupLabelCounts(REWEIGHING_CELLS)).add_counts(
+                        present_values, counts[index, present])
+        return self
+
+    def overall(self):
+        # Totals of every row of every partition
+        merged = self.encoder.empty_like()
+        for totals in self.partitions.values():
+            merged.merge(totals)
+        return merged
+
+    def results(self, dataset_type, uncertainty=None):
+        partitions = {name: totals.results(dataset_type, uncertainty) for name, totals in self.partitions.items()}
+        return {
+            'partitions': partitions,
+            'comparison': comparison_table(partitions),
+            'overall': self.overall().results(dataset_type, uncertainty),
+            'error': None
+        }
+
+def comparison_table(partitions):
+    # One line per (attribute, partition) with its metrics side by side; categorical attributes
+    # are summarised by their reference-vs-rest ('overall') values
+    table = []
+    for name, result in partitions.items():
+        for attr, metrics in (result['original'] or {}).items():
+            row = {'attribute': attr, 'partition': name, 'rows': result['rows']}
+            row.update(_headline(metrics))
+            reweighed = (result['reweighed'] or {}).get(attr)
+            if reweighed is not None:
+                row.update({f'reweighed_{key}': value for key, value in _headline(reweighed).items()})
+            table.append(row)
+    table.sort(key=lambda row: row['attribute'])
+    return table
+
+def _headline(metrics):
+    values = metrics['overall'] if 'overall' in metrics else metrics
+    return {key: values.get(key) for key in ('statistical_parity_difference', 'disparate_impact')}
+
+def trim_chunk(chunk, columns):
+    # Keeps the given columns. Rows with an empty cell in any other column are dropped first,
+    # as encode_frame would drop them in a separate run of the file.
+    chunk.columns = chunk.columns.str.lstrip('\ufeff')
+    kept = [col for col in chunk.columns if col in columns]
+    others = [col for col in chunk.columns if col not in columns]
+    if others:
+        chunk = chunk[~chunk[others].replace('', pd.NA).isna().any(axis=1)]
+    return chunk[kept]
+
+def iter_batches(sources, target_column, protected_attributes, input_format=None, chunksize=DEFAULT_CHUNKSIZE,
+                 partition_column=None):
+    # sources: [(name, path)]. Yields frames of about chunksize rows, with a PARTITION_COLUMN,
+    # that may span several small files so that no file costs a pass of its own. Only the
+    # columns the analysis reads (and the partition column) are kept, and every file must have
+    # the same ones: a column missing from some files would be empty for their rows once the
+    # files are concatenated, and those rows would be dropped.
+    columns = relevant_columns(target_column, protected_attributes)
+    if partition_column is not None:
+        columns.add(partition_column)
+    expected = None
+    pending = []
+    pending_rows = 0
+    for name, source in sources:
+        for chunk in iter_dataset_chunks(source, input_format, chunksize):
+            chunk = trim_chunk(chunk, columns)
+            if expected is None:
+                expected = (name, set(chunk.columns))
+            if target_column not in chunk.columns:
+                raise ValueError(f"'{target_column}' column not found in dataset '{name}'")
+            if set(chunk.columns) != expected[1]:
+                missing = sorted(expected[1] - set(chunk.columns))
+                extra = sorted(set(chunk.columns) - expected[1])
+                raise ValueError(f"Dataset '{name}' does not have the same columns as '{expected[0]}'"
+                                 + (f", missing: {', '.join(missing)}" if missing else '')
+                                 + (f", extra: {', '.join(extra)}" if extra else ''))
+            chunk[PARTITION_COLUMN] = name
+            pending.append(chunk)
+            pending_rows += len(chunk)
+            if pending_rows >= chunksize:
+                yield pd.concat(pending, ignore_index=True)
+                pending = []
+                pending_rows = 0
+    if pending:
+        yield pd.concat(pending, ignore_index=True)
+
+def source_names(paths):
+    # File names without their extension, made unique if needed
+    names = []
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        names.append(name if name not in names else f'{name} ({len(names) + 1})')
+    return names
+
+def analyze_batch(sources, target_column, protected_attributes, dataset_type, reference_religion,
+                  reference_sexual_orientation, categorical_attributes=None, partition_column=None,
+                  chunksize=DEFAULT_CHUNKSIZE, input_format=None, uncertainty=None):
+    # sources: [(name, path)]. With a partition_column, the datasets are that column's values
+    # (across all files); otherwise every file is one dataset.
+    try:
+        names = [name for name, _ in sources]
+        if partition_column is None and len(set(names)) < len(names):
+            # Files with the same name would be counted as one dataset
+            duplicates = sorted({name for name in names if names.count(name) > 1})
+            raise ValueError(f"Dataset names must be unique: {', '.join(duplicates)}")
+        totals = PartitionedTotals(target_column, protected_attributes, reference_religion, reference_sexual_orientation,
+                                   categorical_attributes)
+        for batch in spanned('parse', iter_batches(sources, target_column, protected_attributes, input_format, chunksize,
+                                                   partition_column)):
+            if partition_column is not None:
+                if partition_column not in batch.columns:
+                    raise ValueError(f"Partition column '{partition_column}' not found in the data")
+                partitions = batch[partition_column].replace('', np.nan)
+            else:
+                partitions = batch[PARTITION_COLUMN]
+            totals.add(batch.drop(columns=[PARTITION_COLUMN]), partitions)
+        if not totals.partitions:
+            raise ValueError("No rows left after preprocessing")
+        logger.info("Analysed %s partitions", len(totals.partitions))
+        return totals.results(dataset_type, uncertainty)
+    except Exception as e:
+        logger.error(f"Error in batch analysis: {str(e)}")
+        return {'partitions': None, 'comparison': None, 'overall': None, 'error': str(e)}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Compute and compare the bias metrics of several datasets in one pass.')
+    parser.add_argument('--input', nargs='+', default=[STDIO], help="Dataset files (one dataset each), or '-' for stdin")
+    parser.add_argument('--input-format', choices=SUPPORTED_FORMATS, help='Defaults to the file extension, or csv')
+    parser.add_argument('--partition-column', help='Column naming the dataset of every row, e.g. model version or region')
+    parser.add_argument('--target-column', required=True)
+    parser.add_argument('--protected-attributes', default='[]', help='JSON list of protected attribute columns')
+    parser.add_argument('--dataset-type', default='testing')
+    parser.add_argument('--reference-religion')
+    parser.add_argument('--reference-sexual-orientation')
+    parser.add_argument('--categorical-attributes', default='[]',
+                        help='JSON list of attributes (Religion, Sexual Orientation) to keep one category per value')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='Rows encoded and counted per batch')
+    parser.add_argument('--output', default=STDIO, help="Where to write the JSON result, '-' for stdout")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    try:
+        args = parse_args()
+        result = analyze_batch(list(zip(source_names(args.input), args.input)), args.target_column,
+                               json.loads(args.protected_attributes), args.dataset_type, args.reference_religion,
+                               args.reference_sexual_orientation, json.loads(args.categorical_attributes),
+                               args.partition_column, args.chunksize, args.input_format)
+        write_json(result, args.output)
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Benchmarks of the fairness worker on synthetic data.
+#
+# Every (size, engine) case runs in a fresh interpreter so its peak RSS is its own, and goes
+# through fairness_worker.handle_request exactly as an upload would, with the result cache off.
+# Stage timings are the worker's own spans (parse, clean, encode, aggregate, reweigh, metrics).
+# Engines:
+#   frame    the generated DataFrame is passed in directly (no parsing)
+#   file     the data is written to a CSV file first and read by the worker
+#   chunked  as file, read and aggregated chunk by chunk (the out-of-core path)
+# Cases up to --check-max-rows rows are also checked against metrics computed with aif360's
+# BinaryLabelDatasetMetric and Reweighing on the same encoded rows.
+
+ENGINES = ('frame', 'file', 'chunked')
+STAGES = ('parse', 'clean', 'encode', 'aggregate', 'reweigh', 'metrics')
+DEFAULT_SIZES = '1000,10000,100000,1000000'
+DEFAULT_CHUNKSIZE = 250000
+# Whole-frame engines hold every row as Python strings; above this they are skipped
+DEFAULT_IN_MEMORY_MAX_ROWS = 2000000
+DEFAULT_CHECK_MAX_ROWS = 100000
+
+def benchmark_request(case):
+    import synthetic_data
+    return {
+        'id': f"{case['engine']}-{case['rows']}",
+        'target_column': synthetic_data.TARGET_COLUMN,
+        'protected_attributes': list(synthetic_data.PROTECTED_ATTRIBUTES),
+        'dataset_type': 'training',
+        'reference_religion': synthetic_data.PRIVILEGED['Religion'],
+        'reference_sexual_orientation': None,
+        'categorical_attributes': case.get('categorical_attributes') or [],
+    }
+
+def generated_frames(case, chunk_rows):
+    import synthetic_data
+    return synthetic_data.iter_frames(case['rows'], chunk_rows, case['seed'], case.get('cardinalities'),
+                                      case.get('bias'), case.get('base_rate', synthetic_data.DEFAULT_BASE_RATE))
+
+def generated_frame(case):
+    import pandas as pd
+    return pd.concat(list(generated_frames(case, case['chunksize'])), ignore_index=True)
+
+def run_case(case):
+    # Runs one case in this process and returns its report
+    import fairness_worker
+    import synthetic_data
+    from instrumentation import peak_rss_mb
+    from aif360_preprocessing import encode_frame
+    from aif360_check import cross_check
+
+    request = benchmark_request(case)
+    directory = tempfile.mkdtemp(prefix='fairness-benchmark-')
+    path = os.path.join(directory, 'data.csv')
+    try:
+        if case['engine'] == 'frame':
+            request['data'] = generated_frame(case)
+        else:
+            synthetic_data.write_frames(generated_frames(case, case['chunksize']), path, 'csv')
+            request.update({'input': path, 'input_format': 'csv'})
+            if case['engine'] == 'chunked':
+                request['chunksize'] = case['chunksize']
+        baseline_rss_mb = peak_rss_mb()
+
+        response = fairness_worker.handle_request(request)
+        if response.get('error'):
+            return {**case, 'error': response['error']}
+
+        spans = {record['span']: record for record in response['timing']['spans']}
+        total_ms = response['timing']['total_ms']
+        report = {
+            **case,
+            'total_ms': round(total_ms, 3),
+            'rows_per_s': _throughput(case['rows'], total_ms),
+            'import_ms': round(fairness_worker.STARTUP_MS, 3),
+            'baseline_rss_mb': baseline_rss_mb,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': {name: {'wall_ms': record['wall_ms'], 'calls': record['calls'],
+                              'rows_per_s': _throughput(case['rows'], record['wall_ms']),
+                              'rss_growth_mb': record['rss_growth_mb']}
+                       for name, record in spans.items()},
+        }
+        if case['rows'] <= case['check_max_rows']:
+            frame = request['data'] if case['engine'] == 'frame' else generated_frame(case)
+            df, categories, references = encode_frame(frame, request['target_column'], list(request['protected_attributes']),
+                                                      request['reference_religion'], request['reference_sexual_orientation'],
+                                                      request['categorical_attributes'])
+            report['check'] = cross_check(response, df, request['target_column'], categories, references)
+        return report
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rmdir(directory)
+
+def _throughput(rows, wall_ms):
+    return round(rows / (wall_ms / 1000.0)) if wall_ms > 0 else None
+
+def run_isolated(case):
+    # Runs a case in a fresh interpreter; the report is the last line it prints
+    env = {**os.environ, 'FAIRNESS_CACHE_BYTES': '0', 'FAIRNESS_LOG_LEVEL': os.environ.get('FAIRNESS_LOG_LEVEL', 'WARNING')}
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', json.dumps(case)],
+                               cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, text=True)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {**case, 'error': f'benchmark process exited with status {completed.returncode}'}
+    return json.loads(lines[-1])
+
+def format_report(reports):
+    header = ['rows', 'engine', 'import ms', 'total s', 'rows/s', 'peak MB'] + [f'{stage} ms' for stage in STAGES] + ['aif360 check']
+    lines = [header]
+    for report in reports:
+        if 'error' in report or report.get('skipped'):
+            lines.append([str(report['rows']), report['engine'], report.get('error') or report['skipped']])
+            continue
+        stages = report['stages']
+        check = report.get('check')
+        lines.append([
+            str(report['rows']), report['engine'], f"{report['import_ms']:.0f}", f"{report['total_ms'] / 1000.0:.3f}", str(report['rows_per_s']),
+            str(report['peak_rss_mb']),
+            *[f"{stages[stage]['wall_ms']:.1f}" if stage in stages else '-' for stage in STAGES],
+            '-' if check is None else 'no aif360' if check['ok'] is None
+            else f"{'ok' if check['ok'] else 'MISMATCH'} ({check['compared']}, max {check['max_abs_diff']:.1e})",
+        ])
+    widths = [max(len(line[index]) for line in lines if index < len(line)) for index in range(len(header))]
+    return '\n'.join('  '.join(cell.rjust(widths[index]) for index, cell in enumerate(line)) for line in lines)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Time and memory-profile the fairness pipeline on synthetic data.')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma-separated row counts, e.g. 1000,100000,10000000')
+    parser.add_argument('--engines', default=','.join(ENGINES), help=f"Comma-separated subset of {', '.join(ENGINES)}")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cardinalities', default='{}', help='JSON object of column -> number of values, e.g. {"Religion": 20}')
+    parser.add_argument('--bias', default='{"Gender": 0.1, "Race": 0.05}', help='JSON object of column -> approval-rate penalty')
+    parser.add_argument('--categorical-attributes', default='[]', help='JSON list, e.g. ["Religion"], for one group per category')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='Rows per chunk, for generation and the chunked engine')
+    parser.add_argument('--in-memory-max-rows', type=int, default=DEFAULT_IN_MEMORY_MAX_ROWS,
+                        help='Largest size run with the frame and file engines')
+    parser.add_argument('--check-max-rows', type=int, default=DEFAULT_CHECK_MAX_ROWS,
+                        help='Largest size checked against aif360 (0 disables the check)')
+    parser.add_argument('--output', help='Also write the full reports as JSON to this file')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.case:
+        # Imported before anything that loads pandas / numpy, so STARTUP_MS is the worker's cold start
+        import fairness_worker  # noqa: F401
+        import logging
+        from instrumentation import log_level_from_env
+        logging.basicConfig(level=log_level_from_env(), format='%(message)s', stream=sys.stderr)
+        # stdout carries the report; anything else that prints goes to stderr
+        report_output = sys.stdout
+        sys.stdout = sys.stderr
+        report_output.write(json.dumps(run_case(json.loads(args.case))) + '\n')
+        sys.exit(0)
+
+    engines = args.engines.split(',')
+    for engine in engines:
+        if engine not in ENGINES:
+            sys.exit(f"Unknown engine '{engine}'. Expected one of: {', '.join(ENGINES)}")
+
+    reports = []
+    for rows in (int(size) for size in args.sizes.split(',')):
+        for engine in engines:
+            case = {'rows': rows, 'engine': engine, 'seed': args.seed, 'chunksize': args.chunksize,
+                    'cardinalities': json.loads(args.cardinalities), 'bias': json.loads(args.bias),
+                    'categorical_attributes': json.loads(args.categorical_attributes),
+                    'check_max_rows': args.check_max_rows}
+            if engine != 'chunked' and rows > args.in_memory_max_rows:
+                report = {**case, 'skipped': f'skipped (over --in-memory-max-rows {args.in_memory_max_rows})'}
+            else:
+                report = run_isolated(case)
+            reports.append(report)
+            print(f"{rows} rows, {engine}: {report.get('error') or report.get('skipped') or str(report['total_ms']) + ' ms'}",
+                  file=sys.stderr)
+
+    print(format_report(reports))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(reports, output, indent=2)
+    if any(report.get('check', {}).get('ok') is False for report in reports):
+        sys.exit(1)
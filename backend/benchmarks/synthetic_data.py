@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_io import write_dataset, infer_format, SUPPORTED_FORMATS, STDIO
+
+# Synthetic uploads with the columns the pipeline expects.
+#
+# Every categorical column draws from its first n known values (n = its cardinality), with
+# group sizes falling off as 1 / (rank + 1) so groups are unbalanced as in real data. Bias is
+# injected as an approval-rate penalty for the rows on the unprivileged side of an attribute:
+# the outcome of a row is Approved with probability base_rate minus the penalties it collects.
+# The same seed and chunk size always produce the same rows.
+
+VALUES = {
+    'Gender': ['Male', 'Female'],
+    'Race': ['White', 'Black', 'Hispanic', 'Asian'],
+    'Education': ['Bachelor', 'High School', 'Master', 'PhD'],
+    'Disability': ['No', 'Yes'],
+    'Religion': ['Christian', 'Muslim', 'Jewish', 'Hindu', 'Buddhist', 'Sikh', 'None', 'Other'],
+    'Sexual Orientation': ['Heterosexual', 'Gay', 'Lesbian', 'Bisexual', 'Asexual', 'Queer', 'Pansexual'],
+}
+
+COLUMNS = ['Gender', 'Race', 'Age', 'Education', 'Disability', 'Religion', 'Sexual Orientation', 'Outcome']
+PROTECTED_ATTRIBUTES = COLUMNS[:-1]
+TARGET_COLUMN = 'Outcome'
+
+# Value every other value of the attribute is compared against
+PRIVILEGED = {
+    'Gender': 'Male',
+    'Race': 'White',
+    'Education': 'PhD',
+    'Disability': 'No',
+    'Religion': 'Christian',
+    'Sexual Orientation': 'Heterosexual',
+}
+
+AGE_RANGE = (18, 80)
+AGE_THRESHOLD = 40
+DEFAULT_BASE_RATE = 0.6
+DEFAULT_CHUNK_ROWS = 1000000
+
+def column_values(column, cardinality=None):
+    values = VALUES[column]
+    if cardinality is None:
+        return values
+    if column == 'Religion':
+        # Religion is the only open-ended column; extra groups get generic names
+        return (values + [f'Religion {i}' for i in range(len(values), cardinality)])[:cardinality]
+    return values[:max(1, min(cardinality, len(values)))]
+
+def group_probabilities(count):
+    weights = 1.0 / np.arange(1, count + 1)
+    return weights / weights.sum()
+
+def generate_frame(rows, seed=0, cardinalities=None, bias=None, base_rate=DEFAULT_BASE_RATE, missing_rate=0.0):
+    # cardinalities: {column: number of values}, bias: {column: approval-rate penalty of its
+    # unprivileged rows}, missing_rate: share of cells left empty (dropped by preprocessing)
+    return next(iter_frames(rows, rows, seed, cardinalities, bias, base_rate, missing_rate), _empty_frame())
+
+def _empty_frame():
+    return pd.DataFrame({column: pd.Series(dtype=object) for column in COLUMNS})
+
+def iter_frames(rows, chunk_rows=DEFAULT_CHUNK_ROWS, seed=0, cardinalities=None, bias=None,
+                base_rate=DEFAULT_BASE_RATE, missing_rate=0.0):
+    cardinalities = cardinalities or {}
+    bias = bias or {}
+    chunk_rows = max(1, int(chunk_rows))
+    seeds = np.random.SeedSequence(seed)
+    for start in range(0, rows, chunk_rows):
+        rng = np.random.default_rng(seeds.spawn(1)[0])
+        yield _frame(min(chunk_rows, rows - start), rng, cardinalities, bias, base_rate, missing_rate)
+
+def _frame(rows, rng, cardinalities, bias, base_rate, missing_rate):
+    frame = {}
+    approval = np.full(rows, base_rate)
+    for column in COLUMNS:
+        if column == TARGET_COLUMN:
+            continue
+        if column == 'Age':
+            ages = rng.integers(AGE_RANGE[0], AGE_RANGE[1] + 1, size=rows)
+            frame[column] = ages.astype(str).astype(object)
+            approval -= bias.get(column, 0.0) * (ages >= AGE_THRESHOLD)
+            continue
+        values = np.array(column_values(column, cardinalities.get(column)), dtype=object)
+        codes = rng.choice(len(values), size=rows, p=group_probabilities(len(values)))
+        frame[column] = values[codes]
+        approval -= bias.get(column, 0.0) * (values[codes] != PRIVILEGED[column])
+
+    approved = rng.random(rows) < np.clip(approval, 0.0, 1.0)
+    frame[TARGET_COLUMN] = np.where(approved, 'Approved', 'Denied').astype(object)
+
+    if missing_rate > 0:
+        for column in COLUMNS:
+            frame[column][rng.random(rows) < missing_rate] = ''
+    return pd.DataFrame(frame, columns=COLUMNS)
+
+def write_frames(frames, destination, fmt=None):
+    # CSV files are appended chunk by chunk; other formats need the whole frame at once
+    fmt = fmt or infer_format(destination)
+    if fmt == 'csv' and destination != STDIO:
+        with open(destination, 'w', newline='') as output:
+            for index, frame in enumerate(frames):
+                frame.to_csv(output, index=False, header=index == 0)
+        return
+    write_dataset(pd.concat(list(frames), ignore_index=True), destination, fmt)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic dataset with the columns the fairness pipeline expects.')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cardinalities', default='{}', help='JSON object of column -> number of values, e.g. {"Religion": 20}')
+    parser.add_argument('--bias', default='{}', help='JSON object of column -> approval-rate penalty, e.g. {"Gender": 0.1}')
+    parser.add_argument('--base-rate', type=float, default=DEFAULT_BASE_RATE, help='Approval rate without any penalty')
+    parser.add_argument('--missing-rate', type=float, default=0.0, help='Share of cells left empty')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help='Rows generated (and held in memory) at a time')
+    parser.add_argument('--output-format', choices=SUPPORTED_FORMATS, help='Defaults to the file extension, or csv')
+    parser.add_argument('--output', default=STDIO, help="Where to write the dataset, '-' for stdout")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    frames = iter_frames(args.rows, args.chunk_rows, args.seed, json.loads(args.cardinalities), json.loads(args.bias),
+                         args.base_rate, args.missing_rate)
+    write_frames(frames, args.output, args.output_format)
@@ -2,17 +2,56 @@ import sys
 import json
 import pandas as pd
 import numpy as np
-from aif360.datasets import BinaryLabelDataset
-from aif360.metrics import BinaryLabelDatasetMetric
-
-def detect_bias(preprocessed_data, label_names, protected_attribute_names, dataset_type, reference_religion):
+import logging
+import argparse
+from label_dataset import LabelDataset
+from group_metrics import statistical_parity_difference, disparate_impact, pairwise_matrices
+from dataset_io import read_dataset, write_json, SUPPORTED_FORMATS, STDIO
+from parallel import count_tables, executor_from_env, EXECUTORS
+from instrumentation import span, Preview, log_level_from_env
+from uncertainty import uncertainty_options, reweighed_uncertainty, group_uncertainty, matrix_uncertainty
+from encoding_schema import require_reference
+
+logger = logging.getLogger(__name__)
+
+# Declared category dictionaries for attributes that are compared group by group.
+# The encoded value of each category is its index in the list.
+CATEGORY_LABELS = {
+    'Race': ['Black', 'Hispanic', 'Asian', 'White'],
+    'Education': ['High School', 'Bachelor', 'Master', 'PhD'],
+}
+
+# Group that the 'overall' comparison of a categorical attribute is made against
+CATEGORY_REFERENCES = {
+    'Race': 'White',
+    'Education': 'PhD',
+}
+
+def _lookup_attribute(mapping, attr):
+    # Attribute names reach us both with and without spaces ('Sexual Orientation' / 'SexualOrientation')
+    if attr in mapping:
+        return mapping[attr]
+    return mapping.get(attr.replace(' ', ''))
+
+def detect_bias(preprocessed_data, label_names, protected_attribute_names, dataset_type, reference_religion,
+                categories=None, references=None, instance_weights=None, executor=None, max_workers=None,
+                uncertainty=None):
+    return detect_bias_sets(preprocessed_data, label_names, protected_attribute_names, dataset_type, reference_religion,
+                            categories, references, [instance_weights], executor, max_workers, uncertainty)[0]
+
+def detect_bias_sets(preprocessed_data, label_names, protected_attribute_names, dataset_type, reference_religion,
+                     categories=None, references=None, weight_sets=(None,), executor=None, max_workers=None,
+                     uncertainty=None):
+    # Metrics of the same rows under several instance weightings (None = the dataset's own
+    # weights), e.g. original and reweighed. All count tables are scheduled together.
+    # uncertainty (True or a dict of options) adds confidence intervals and p-values.
     try:
-        print(f"Preprocessed data: {preprocessed_data[:5]}", file=sys.stderr)
-        print(f"Label names: {label_names}", file=sys.stderr)
-        print(f"Protected attribute names: {protected_attribute_names}", file=sys.stderr)
+        logger.debug("Preprocessed data: %s", Preview(preprocessed_data[:5]))
+        logger.info("Label names: %s", label_names)
+        logger.info("Protected attribute names: %s", protected_attribute_names)
         
         df = pd.DataFrame(preprocessed_data)
-        print(f"DataFrame columns: {df.columns.tolist()}", file=sys.stderr)
+        logger.info("DataFrame columns: %s", Preview(lambda: df.columns.tolist()))
         
         # Create a mapping for attributes with and without spaces
         attr_mapping = {attr.replace(' ', ''): attr for attr in protected_attribute_names}
@@ -23,189 +62,204 @@ def detect_bias(preprocessed_data, label_names, protected_attribute_names, datas
             attr_mapping['Religion_reference'] = 'Religion_reference'
 
         # Find available protected attributes in the dataframe
-        available_protected_attributes = [
-            attr for attr in protected_attribute_names 
-            if attr in df.columns or attr.replace(' ', '') in df.columns
-        ]
+        available_protected_attributes = find_available_attributes(df.columns, protected_attribute_names)
         
         # Rename columns if necessary
         df.rename(columns={attr.replace(' ', ''): attr for attr in available_protected_attributes}, inplace=True)
         
-        print(f"Available protected attributes: {available_protected_attributes}", file=sys.stderr)
+        logger.info("Available protected attributes: %s", available_protected_attributes)
         
-        dataset = BinaryLabelDataset(favorable_label=1, unfavorable_label=0,
-                                     df=df,
-                                     label_names=label_names,
-                                     protected_attribute_names=available_protected_attributes)
+        dataset = LabelDataset(df, label_names, available_protected_attributes, favorable_label=1, unfavorable_label=0)
+        # Reweighed metrics: same rows, counted with their reweighing weights
+        requested_weights = weight_sets
+        weight_sets = [dataset.instance_weights if weights is None else np.asarray(weights, dtype=np.float64).ravel()
+                       for weights in weight_sets]
 
-        metrics = {}
+        columns = {}
         for attr in available_protected_attributes:
-            print(f"Processing attribute: {attr}", file=sys.stderr)
+            logger.debug("Processing attribute: %s", attr)
             column_name = attr if attr in df.columns else attr.replace(' ', '')
-            if attr == 'Race':
-                metrics[attr] = calculate_race_metrics(dataset, column_name)
-            elif attr == 'Education':
-                metrics[attr] = calculate_education_metrics(dataset, column_name)
-            else:
-                metrics[attr] = calculate_binary_metrics(dataset, column_name)
-
-        print(f"Calculated bias metrics: {metrics}", file=sys.stderr)
-        return metrics
+            # Count on the encoded columns themselves (small integer codes) rather than a float64 copy
+            columns[attr] = df[column_name].to_numpy()
+        labels = df[label_names[0]].to_numpy()
+
+        if executor is None:
+            executor, max_workers = executor_from_env()
+        with span('aggregate', rows=len(df) * len(weight_sets)):
+            attribute_tables = count_tables(columns, labels, weight_sets, dataset.favorable_label, executor, max_workers)
+
+        with span('metrics'):
+            # Weighted sets are reweighings, which may go without intervals (see uncertainty_options)
+            all_metrics = [bias_metrics_from_counts(tables, categories, references,
+                                                    uncertainty if weights is None else reweighed_uncertainty(uncertainty))
+                           for tables, weights in zip(attribute_tables, requested_weights)]
+        logger.debug("Calculated bias metrics: %s", Preview(all_metrics))
+        return all_metrics
     except Exception as e:
-        print(f"Error in detect_bias: {str(e)}", file=sys.stderr)
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
-        return {'error': str(e)}
-
-def calculate_outcome_rates(dataset, protected_attributes):
-    outcome_rates = {}
-    for attr in protected_attributes:
-        privileged_mask = dataset.protected_attributes[:, dataset.protected_attribute_names.index(attr)] == 1.0
-        unprivileged_mask = dataset.protected_attributes[:, dataset.protected_attribute_names.index(attr)] == 0.0
-        
-        privileged_rate = np.mean(dataset.labels[privileged_mask] == dataset.favorable_label)
-        unprivileged_rate = np.mean(dataset.labels[unprivileged_mask] == dataset.favorable_label)
-        
-        outcome_rates[attr] = {
-            'privileged': float(privileged_rate),
-            'unprivileged': float(unprivileged_rate)
-        }
-    return outcome_rates
-
-def calculate_binary_metrics(dataset, attr):
-    privileged_groups = [{attr: 1.0}]
-    unprivileged_groups = [{attr: 0.0}]
-
-    binary_metric = BinaryLabelDatasetMetric(dataset, 
-                                             unprivileged_groups=unprivileged_groups, 
-                                             privileged_groups=privileged_groups)
-
-    metrics = {
-        'statistical_parity_difference': binary_metric.statistical_parity_difference(),
-        'disparate_impact': binary_metric.disparate_impact(),
-    }
-
-    return handle_nan_inf(metrics)
-
-def calculate_race_metrics(dataset, attr):
-    race_mapping = {0.0: 'Black', 1.0: 'Hispanic', 2.0: 'Asian', 3.0: 'White'}
-    race_values = sorted(set(dataset.protected_attributes[:, dataset.protected_attribute_names.index(attr)]))
-    metrics = {'overall': {}, 'group_metrics': {}}
-
-    for reference_race in race_values:
-        privileged_groups = [{attr: reference_race}]
-        other_races = [race for race in race_values if race != reference_race]
-
-        metrics['group_metrics'][race_mapping[reference_race]] = {}
-
-        for comparison_race in other_races:
-            unprivileged_groups = [{attr: comparison_race}]
-            binary_metric = BinaryLabelDatasetMetric(dataset, 
-                                                     unprivileged_groups=unprivileged_groups, 
-                                                     privileged_groups=privileged_groups)
-
-            race_pair_metrics = {
-                'statistical_parity_difference': binary_metric.statistical_parity_difference(),
-                'disparate_impact': binary_metric.disparate_impact(),
-            }
-
-            metrics['group_metrics'][race_mapping[reference_race]][race_mapping[comparison_race]] = handle_nan_inf(race_pair_metrics)
-
-    privileged_groups = [{attr: 3.0}]  # 3 corresponds to White
-    unprivileged_groups = [{attr: race} for race in race_values if race != 3.0]
+        logger.exception("Error in detect_bias: %s", e)
+        return [{'error': str(e)} for _ in weight_sets]
+
+def find_available_attributes(columns, protected_attribute_names):
+    return [
+        attr for attr in protected_attribute_names
+        if attr in columns or attr.replace(' ', '') in columns
+    ]
+
+def bias_metrics_from_counts(attribute_tables, categories=None, references=None, uncertainty=None):
+    # attribute_tables maps each attribute to its (group_values, counts) table
+    # Attributes with a category dictionary, declared here or detected during preprocessing,
+    # get the full pairwise treatment; everything else is a privileged (1) vs unprivileged (0) split
+    attribute_categories = {**CATEGORY_LABELS, **(categories or {})}
+    attribute_references = {**CATEGORY_REFERENCES, **(references or {})}
+    options = uncertainty_options(uncertainty) if uncertainty else None
+    # One generator per call, drawn in attribute order, so a seed reproduces every interval
+    rng = np.random.default_rng(options['seed']) if options else None
+
+    metrics = {}
+    for attr, (group_values, counts) in attribute_tables.items():
+        attr_categories = _lookup_attribute(attribute_categories, attr)
+        if attr_categories is not None:
+            metrics[attr] = categorical_metrics_from_counts(group_values, counts, attr_categories,
+                                                            require_reference(attr, _lookup_attribute(attribute_references, attr)),
+                                                            options, rng)
+            if _lookup_attribute(CATEGORY_LABELS, attr) is None:
+                # Views that render this attribute as binary read the reference-vs-rest values here
+                metrics[attr].update(metrics[attr]['overall'])
+        else:
+            metrics[attr] = binary_metrics_from_counts(group_values, counts, options, rng)
+    return metrics
 
-    overall_metric = BinaryLabelDatasetMetric(dataset, 
-                                              unprivileged_groups=unprivileged_groups, 
-                                              privileged_groups=privileged_groups)
+def binary_metrics_from_counts(group_values, counts, uncertainty=None, rng=None):
+    privileged = group_values == 1.0
+    unprivileged = group_values == 0.0
 
-    metrics['overall'] = handle_nan_inf({
-        'statistical_parity_difference': overall_metric.statistical_parity_difference(),
-        'disparate_impact': overall_metric.disparate_impact(),
+    metrics = handle_nan_inf({
+        'statistical_parity_difference': statistical_parity_difference(counts, privileged, unprivileged),
+        'disparate_impact': disparate_impact(counts, privileged, unprivileged),
     })
 
+    if uncertainty:
+        metrics['uncertainty'] = {
+            'options': uncertainty,
+            **group_uncertainty(counts, privileged, unprivileged, uncertainty, rng, json_number),
+        }
     return metrics
 
-def calculate_education_metrics(dataset, attr):
-    education_mapping = {0.0: 'High School', 1.0: 'Bachelor', 2.0: 'Master', 3.0: 'PhD'}
-    education_values = sorted(set(dataset.protected_attributes[:, dataset.protected_attribute_names.index(attr)]))
-    metrics = {'overall': {}, 'group_metrics': {}}
-
-    for reference_level in education_values:
-        privileged_groups = [{attr: reference_level}]
-        other_levels = [level for level in education_values if level != reference_level]
+def category_label(value, categories=None):
+    if categories is not None and float(value).is_integer() and 0 <= value < len(categories):
+        return categories[int(value)]
+    # Integer codes are reported in the same '1.0' form as float ones
+    return str(float(value)) if isinstance(value, (int, np.integer)) else str(value)
 
-        metrics['group_metrics'][education_mapping[reference_level]] = {}
+def categorical_metrics_from_counts(group_values, counts, categories=None, reference=None, uncertainty=None, rng=None):
+    labels = [category_label(value, categories) for value in group_values]
+    spd, di = pairwise_matrices(counts)
+    metrics = {'overall': {}, 'group_metrics': {}}
 
-        for comparison_level in other_levels:
-            unprivileged_groups = [{attr: comparison_level}]
-            binary_metric = BinaryLabelDatasetMetric(dataset, 
-                                                     unprivileged_groups=unprivileged_groups, 
-                                                     privileged_groups=privileged_groups)
+    for i, reference_label in enumerate(labels):
+        metrics['group_metrics'][reference_label] = {}
 
-            education_pair_metrics = {
-                'statistical_parity_difference': binary_metric.statistical_parity_difference(),
-                'disparate_impact': binary_metric.disparate_impact(),
+        for j, comparison_label in enumerate(labels):
+            if j == i:
+                continue
+            pair_metrics = {
+                'statistical_parity_difference': spd[i, j],
+                'disparate_impact': di[i, j],
             }
 
-            metrics['group_metrics'][education_mapping[reference_level]][education_mapping[comparison_level]] = handle_nan_inf(education_pair_metrics)
+            metrics['group_metrics'][reference_label][comparison_label] = handle_nan_inf(pair_metrics)
 
-    privileged_groups = [{attr: 3.0}]  # 3 corresponds to PhD
-    unprivileged_groups = [{attr: level} for level in education_values if level != 3.0]
-
-    overall_metric = BinaryLabelDatasetMetric(dataset, 
-                                              unprivileged_groups=unprivileged_groups, 
-                                              privileged_groups=privileged_groups)
+    privileged = np.array([label == reference for label in labels], dtype=bool)
+    unprivileged = ~privileged
 
     metrics['overall'] = handle_nan_inf({
-        'statistical_parity_difference': overall_metric.statistical_parity_difference(),
-        'disparate_impact': overall_metric.disparate_impact(),
+        'statistical_parity_difference': statistical_parity_difference(counts, privileged, unprivileged),
+        'disparate_impact': disparate_impact(counts, privileged, unprivileged),
     })
 
+    metrics['matrix'] = {
+        'categories': labels,
+        'reference': reference,
+        'statistical_parity_difference': [[json_number(value) for value in row] for row in spd],
+        'disparate_impact': [[json_number(value) for value in row] for row in di],
+    }
+
+    if uncertainty:
+        metrics['uncertainty'] = {
+            'options': uncertainty,
+            'overall': group_uncertainty(counts, privileged, unprivileged, uncertainty, rng, json_number),
+            'matrix': matrix_uncertainty(counts, uncertainty, rng, json_number),
+        }
     return metrics
 
+def json_number(value):
+    if np.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+    elif np.isnan(value):
+        return None
+    return float(value)
+
 def handle_nan_inf(metrics):
     for key, value in metrics.items():
-        if np.isinf(value):
-            metrics[key] = "Infinity" if value > 0 else "-Infinity"
-        elif np.isnan(value):
-            metrics[key] = None
-        else:
-            metrics[key] = float(value)
+        metrics[key] = json_number(value)
     return metrics
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Compute bias metrics for an encoded dataset and, optionally, its reweighed version.')
+    parser.add_argument('--original', default=STDIO, help="Encoded dataset file path, or '-' to read from stdin")
+    parser.add_argument('--weights', help='File with the instance_weights column written by preprocessing, for reweighed metrics')
+    parser.add_argument('--input-format', choices=SUPPORTED_FORMATS, help='Defaults to the file extension, or csv')
+    parser.add_argument('--label-names', required=True, help='JSON list of label columns')
+    parser.add_argument('--protected-attributes', default='[]', help='JSON list of protected attribute columns')
+    parser.add_argument('--dataset-type', default='false', help="'true' when the reweighed dataset should be evaluated too")
+    parser.add_argument('--reference-religion')
+    parser.add_argument('--categories', help='JSON object mapping attributes to their category labels, as returned by preprocessing')
+    parser.add_argument('--references', help='JSON object mapping categorical attributes to their reference category')
+    parser.add_argument('--executor', choices=EXECUTORS, help='Run the count tables serially or on a thread/process pool, '
+                        'defaults to FAIRNESS_EXECUTOR or serial')
+    parser.add_argument('--max-workers', type=int, help='Pool size, defaults to FAIRNESS_MAX_WORKERS or the CPU count')
+    parser.add_argument('--uncertainty', help='JSON options for confidence intervals and permutation p-values, '
+                        'e.g. {"replicates": 10000, "seed": 0}; omitted means no intervals')
+    parser.add_argument('--output', default=STDIO, help="Where to write the JSON metrics, '-' for stdout")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    logging.basicConfig(level=log_level_from_env(), format='%(message)s', stream=sys.stderr)
     try:
-        original_data_json = sys.argv[1]
-        reweighed_data_json = sys.argv[2]
-        label_names_json = sys.argv[3]
-        protected_attribute_names_json = sys.argv[4]
-        dataset_type = sys.argv[5]
-        reference_religion = sys.argv[6]
-
-        original_data = json.loads(original_data_json)
-        reweighed_data = json.loads(reweighed_data_json) if reweighed_data_json != 'null' else None
-        label_names = json.loads(label_names_json)
-        protected_attribute_names = json.loads(protected_attribute_names_json)
-
-        print(f"Label names: {label_names}", file=sys.stderr)
-        print(f"Protected attribute names: {protected_attribute_names}", file=sys.stderr)
-        print(f"Dataset type: {dataset_type}", file=sys.stderr)
-        print(f"Reference religion: {reference_religion}", file=sys.stderr)
-
-        original_metrics = detect_bias(original_data, label_names, protected_attribute_names, dataset_type, reference_religion)
-        
-        reweighed_metrics = {}
-        if dataset_type.lower() == 'true' and reweighed_data is not None:
-            reweighed_metrics = detect_bias(reweighed_data, label_names, protected_attribute_names, dataset_type, reference_religion)
+        args = parse_args()
+        label_names = json.loads(args.label_names)
+        protected_attribute_names = json.loads(args.protected_attributes)
+        dataset_type = args.dataset_type
+        reference_religion = args.reference_religion
+        categories = json.loads(args.categories) if args.categories else None
+        references = json.loads(args.references) if args.references else None
+        uncertainty = json.loads(args.uncertainty) if args.uncertainty else None
+
+        logger.debug("Label names: %s", label_names)
+        logger.debug("Protected attribute names: %s", protected_attribute_names)
+        logger.debug("Dataset type: %s", dataset_type)
+        logger.debug("Reference religion: %s", reference_religion)
+
+        original_data = read_dataset(args.original, args.input_format, as_strings=False)
+        instance_weights = None
+        if args.weights:
+            instance_weights = read_dataset(args.weights, args.input_format, as_strings=False)['instance_weights'].to_numpy()
+
+        # Original and reweighed metrics share the rows, so their tables are computed in one batch
+        weight_sets = [None]
+        if dataset_type.lower() == 'true' and instance_weights is not None:
+            weight_sets.append(instance_weights)
+        metrics = detect_bias_sets(original_data, label_names, list(protected_attribute_names), dataset_type, reference_religion,
+                                   categories, references, weight_sets, args.executor, args.max_workers, uncertainty)
+        original_metrics = metrics[0]
+        reweighed_metrics = metrics[1] if len(metrics) > 1 else {}
 
         combined_metrics = {
             'original': original_metrics,
             'reweighed': reweighed_metrics if dataset_type.lower() == 'true' else {}
         }
 
-        print(json.dumps(combined_metrics))
+        write_json(combined_metrics, args.output)
     except Exception as e:
-        print(f"Error in main: {str(e)}", file=sys.stderr)
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
-        print(json.dumps({'error': str(e)}))
\ No newline at end of file
+        logger.exception("Error in main: %s", e)
+        print(json.dumps({'error': str(e)}))
@@ -0,0 +1,209 @@
+import json
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from aif360_preprocessing import (encode_frame, outcome_rates_from_counts, raw_data_from_counts, reweighing_cells_for,
+                                  reweighing_summary, ROW_COUNT_COLUMN)
+from bias_detection import find_available_attributes, bias_metrics_from_counts
+from group_metrics import GroupLabelCounts, reweighing_factors, REWEIGHING_CELLS
+from instrumentation import span, spanned
+from uncertainty import reweighed_uncertainty
+from dataset_io import iter_dataset_chunks, write_json, SUPPORTED_FORMATS, STDIO
+
+logger = logging.getLogger(__name__)
+
+# Out-of-core version of preprocess_frame + detect_bias for uploads that do not fit in memory.
+# Each chunk is cleaned and encoded with the same rules as the in-memory path (encode_frame),
+# then folded into running (group value x reweighing cell) totals per attribute; raw data,
+# outcome rates, reweighing weights and bias metrics are derived from those totals at the end.
+# Peak memory is one chunk.
+
+DEFAULT_CHUNKSIZE = 100000
+
+class AnalysisTotals:
+    # Running totals of an analysis: one GroupLabelCounts per attribute with a column per
+    # reweighing cell, plus the overall cell totals the reweighing weights are derived from
+
+    def __init__(self, target_column, protected_attributes, reference_religion, reference_sexual_orientation,
+                 categorical_attributes=None):
+        self.target_column = target_column
+        self.protected_attributes = list(protected_attributes)
+        # encode_frame may append to the attribute list, detect_bias naming uses the list as given
+        self.encoding_attributes = list(protected_attributes)
+        self.reference_religion = reference_religion
+        self.reference_sexual_orientation = reference_sexual_orientation
+        self.categorical_attributes = categorical_attributes
+        self.attribute_counts = {}
+        self.category_labels = {}
+        self.references = {}
+        self.cell_totals = np.zeros(REWEIGHING_CELLS, dtype=np.float64)
+        self.rows = 0
+
+    def encode(self, chunk, weights=None):
+        # Cleans and encodes one raw chunk. Returns (df, categories, references, weights), with
+        # weights (aligned with the chunk's index) narrowed to the rows that were kept.
+        df, chunk_categories, chunk_references = encode_frame(chunk, self.target_column, self.encoding_attributes,
+                                                              self.reference_religion, self.reference_sexual_orientation,
+                                                              self.categorical_attributes)
+        if len(df) > 0 and not all(pd.api.types.is_numeric_dtype(df[col]) for col in df.columns):
+            raise ValueError("DataFrame values must be numerical.")
+        if weights is not None:
+            weights = np.asarray(weights.loc[df.index], dtype=np.float64)
+        return df, chunk_categories, chunk_references, weights
+
+    def cells(self, df, chunk_categories, chunk_references):
+        # Group membership only depends on the row itself, so the cells of a chunk are final
+        return reweighing_cells_for(df, self.target_column, [col for col in self.encoding_attributes if col in df.columns],
+                                    chunk_categories, chunk_references)
+
+    def group_values(self, df, chunk_categories):
+        # (column, values) of every attribute column; categorical codes index the chunk's own
+        # category list, so they are counted by label and recoded at the end
+        for col in df.columns:
+            if col == self.target_column:
+                continue
+            values = df[col].to_numpy()
+            if col in chunk_categories:
+                values = np.asarray(chunk_categories[col], dtype=object)[values.astype(np.intp)]
+            yield col, values
+
+    def add(self, chunk, weights=None):
+        # Folds one raw chunk in. weights (aligned with the chunk's index) is the number of
+        # rows each line stands for, as in an aggregated table.
+        df, chunk_categories, chunk_references, weights = self.encode(chunk, weights)
+        self.references.update(chunk_references)
+        if len(df) == 0:
+            return self
+
+        with span('aggregate', rows=len(df)):
+            cells = self.cells(df, chunk_categories, chunk_references)
+            self.cell_totals += np.bincount(cells, weights=weights, minlength=REWEIGHING_CELLS)
+            for col, values in self.group_values(df, chunk_categories):
+                if col in chunk_categories:
+                    self.category_labels.setdefault(col, set()).update(chunk_categories[col])
+                self.attribute_counts.setdefault(col, GroupLabelCounts(REWEIGHING_CELLS)).add_columns(values, cells, weights)
+        self.rows += len(df) if weights is None else int(weights.sum())
+        return self
+
+    def empty_like(self):
+        return AnalysisTotals(self.target_column, self.protected_attributes, self.reference_religion,
+                              self.reference_sexual_orientation, self.categorical_attributes)
+
+    def merge(self, other):
+        # Adds the totals of another instance built with the same settings (e.g. another chunk
+        # range or time bucket); the result is the same as if all rows had been added here
+        for col, counts in other.attribute_counts.items():
+            self.attribute_counts.setdefault(col, GroupLabelCounts(REWEIGHING_CELLS)).merge(counts)
+        for col, labels in other.category_labels.items():
+            self.category_labels.setdefault(col, set()).update(labels)
+        for attr in other.encoding_attributes:
+            if attr not in self.encoding_attributes:
+                self.encoding_attributes.append(attr)
+        self.references.update(other.references)
+        self.cell_totals += other.cell_totals
+        self.rows += other.rows
+        return self
+
+    def results(self, dataset_type, uncertainty=None):
+        with span('metrics'):
+            return self._results(dataset_type, uncertainty)
+
+    def _results(self, dataset_type, uncertainty=None):
+        if self.rows == 0:
+            raise ValueError("No rows left after preprocessing")
+
+        attribute_counts = dict(self.attribute_counts)
+        categories = {}
+        for col, labels in self.category_labels.items():
+            categories[col] = sorted(labels)
+            codes = {label: float(code) for code, label in enumerate(categories[col])}
+            attribute_counts[col] = attribute_counts[col].relabel(codes)
+        label_counts = {col: counts.label_counts() for col, counts in attribute_counts.items()}
+
+        raw_data = raw_data_from_counts(label_counts, categories)
+        outcome_rates = outcome_rates_from_counts(label_counts, categories, self.references)
+
+        available_attributes = find_available_attributes(label_counts, self.protected_attributes)
+        column_names = {attr: attr if attr in label_counts else attr.replace(' ', '') for attr in available_attributes}
+        attribute_tables = {attr: label_counts[column].sorted() for attr, column in column_names.items()}
+        original_metrics = bias_metrics_from_counts(attribute_tables, categories, self.references, uncertainty)
+
+        # Reweighed metrics: the same totals with every reweighing cell scaled by its weight
+        reweighing = None
+        reweighed_metrics = {}
+        if dataset_type == 'training':
+            factors = reweighing_factors(self.cell_totals)
+            reweighing = reweighing_summary(self.cell_totals, factors)
+            reweighed_tables = {attr: attribute_counts[column].label_counts(factors).sorted()
+                                for attr, column in column_names.items()}
+            reweighed_metrics = bias_metrics_from_counts(reweighed_tables, categories, self.references,
+                                                         reweighed_uncertainty(uncertainty))
+
+        return {
+            'original': original_metrics,
+            'reweighed': reweighed_metrics,
+            'outcome_rates': outcome_rates,
+            'raw_data': raw_data,
+            'reweighing': reweighing,
+            'categories': categories,
+            'references': self.references,
+            'rows': self.rows,
+            'error': None
+        }
+
+def analyze_in_chunks(source, target_column, protected_attributes, dataset_type, reference_religion,
+                      reference_sexual_orientation, categorical_attributes=None, chunksize=DEFAULT_CHUNKSIZE,
+                      input_format=None, uncertainty=None):
+    try:
+        totals = AnalysisTotals(target_column, protected_attributes, reference_religion, reference_sexual_orientation,
+                                categorical_attributes)
+        for chunk in spanned('parse', iter_dataset_chunks(source, input_format, chunksize)):
+            totals.add(chunk)
+            logger.info("Processed %s rows", totals.rows)
+        return totals.results(dataset_type, uncertainty)
+    except Exception as e:
+        logger.error(f"Error in chunked analysis: {str(e)}")
+        return {'original': None, 'reweighed': None, 'outcome_rates': None, 'raw_data': None, 'reweighing': None,
+                'error': str(e)}
+
+def analyze_aggregated(table, target_column, protected_attributes, dataset_type, reference_religion,
+                       reference_sexual_orientation, categorical_attributes=None, uncertainty=None):
+    # Same results from an aggregated table (see aggregate_frame), one line per distinct row
+    try:
+        totals = AnalysisTotals(target_column, protected_attributes, reference_religion, reference_sexual_orientation,
+                                categorical_attributes)
+        weights = table[ROW_COUNT_COLUMN]
+        totals.add(table.drop(columns=[ROW_COUNT_COLUMN]), weights)
+        return totals.results(dataset_type, uncertainty)
+    except Exception as e:
+        logger.error(f"Error in aggregated analysis: {str(e)}")
+        return {'original': None, 'reweighed': None, 'outcome_rates': None, 'raw_data': None, 'reweighing': None,
+                'error': str(e)}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Preprocess a large dataset chunk by chunk and compute its bias metrics.')
+    parser.add_argument('--input', default=STDIO, help="Dataset file path, or '-' to read from stdin")
+    parser.add_argument('--input-format', choices=SUPPORTED_FORMATS, help='Defaults to the file extension, or csv')
+    parser.add_argument('--target-column', required=True)
+    parser.add_argument('--protected-attributes', default='[]', help='JSON list of protected attribute columns')
+    parser.add_argument('--dataset-type', default='testing')
+    parser.add_argument('--reference-religion')
+    parser.add_argument('--reference-sexual-orientation')
+    parser.add_argument('--categorical-attributes', default='[]',
+                        help='JSON list of attributes (Religion, Sexual Orientation) to keep one category per value')
+    parser.add_argument('--uncertainty', help='JSON options for confidence intervals and permutation p-values')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='Rows read per chunk')
+    parser.add_argument('--output', default=STDIO, help="Where to write the JSON result, '-' for stdout")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    try:
+        args = parse_args()
+        result = analyze_in_chunks(args.input, args.target_column, json.loads(args.protected_attributes),
+                                   args.dataset_type, args.reference_religion, args.reference_sexual_orientation,
+                                   json.loads(args.categorical_attributes), args.chunksize, args.input_format,
+                                   json.loads(args.uncertainty) if args.uncertainty else None)
+        write_json(result, args.output)
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
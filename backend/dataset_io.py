@@ -0,0 +1,142 @@
+import io
+import os
+import sys
+import json
+import pandas as pd
+
+# File extensions recognised when no explicit format is given
+FORMAT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.json': 'json',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+}
+
+SUPPORTED_FORMATS = ('csv', 'ndjson', 'json', 'parquet', 'arrow')
+
+STDIO = '-'
+
+def infer_format(path, default='csv'):
+    if path in (None, STDIO):
+        return default
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), default)
+
+def _check_format(fmt):
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported data format '{fmt}'. Expected one of: {', '.join(SUPPORTED_FORMATS)}")
+
+def read_dataset(source, fmt=None, as_strings=True):
+    """Read a dataset from a file path or stdin ('-') straight into a DataFrame.
+
+    With ``as_strings`` every CSV cell is kept as the raw string (empty cells stay ''),
+    which is how uploads were parsed before they reached the Python side.
+    """
+    fmt = fmt or infer_format(source)
+    _check_format(fmt)
+
+    if source == STDIO:
+        # Binary formats need a seekable buffer; text formats can stream
+        source = io.BytesIO(sys.stdin.buffer.read()) if fmt in ('parquet', 'arrow') else sys.stdin.buffer
+
+    if fmt == 'csv':
+        if as_strings:
+            return pd.read_csv(source, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+        return pd.read_csv(source, encoding='utf-8-sig')
+    if fmt == 'ndjson':
+        return pd.read_json(source, orient='records', lines=True, dtype=not as_strings)
+    if fmt == 'json':
+        return pd.read_json(source, orient='records', dtype=not as_strings)
+    try:
+        if fmt == 'parquet':
+            return pd.read_parquet(source)
+        return pd.read_feather(source)
+    except ImportError as e:
+        raise ImportError(f"Reading {fmt} data requires pyarrow: {str(e)}")
+
+def iter_dataset_chunks(source, fmt=None, chunksize=100000, as_strings=True, skip_rows=0):
+    # Yields the dataset as DataFrames of at most chunksize rows, so only one chunk is held in
+    # memory at a time. JSON arrays and Arrow files cannot be split and come back as one chunk.
+    # The first skip_rows rows are left out; CSV and Parquet pass over them without building
+    # frames (skiprows / whole row groups), the other formats drop them after parsing.
+    fmt = fmt or infer_format(source)
+    _check_format(fmt)
+
+    if fmt not in ('csv', 'ndjson', 'parquet'):
+        yield from _skip_rows([read_dataset(source, fmt, as_strings)], skip_rows)
+        return
+
+    if source == STDIO:
+        source = io.BytesIO(sys.stdin.buffer.read()) if fmt == 'parquet' else sys.stdin.buffer
+
+    if fmt == 'csv':
+        options = {'dtype': str, 'keep_default_na': False} if as_strings else {}
+        if skip_rows:
+            # Row 0 is the header
+            options['skiprows'] = range(1, skip_rows + 1)
+        with pd.read_csv(source, chunksize=chunksize, encoding='utf-8-sig', **options) as reader:
+            yield from reader
+    elif fmt == 'ndjson':
+        with pd.read_json(source, orient='records', lines=True, chunksize=chunksize, dtype=not as_strings) as reader:
+            yield from _skip_rows(reader, skip_rows)
+    else:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(f"Reading parquet data requires pyarrow: {str(e)}")
+        parquet_file = pq.ParquetFile(source)
+        row_groups = []
+        for index in range(parquet_file.num_row_groups):
+            rows = parquet_file.metadata.row_group(index).num_rows
+            if not row_groups and rows <= skip_rows:
+                skip_rows -= rows
+            else:
+                row_groups.append(index)
+        if row_groups:
+            batches = parquet_file.iter_batches(batch_size=chunksize, row_groups=row_groups)
+            yield from _skip_rows((batch.to_pandas() for batch in batches), skip_rows)
+
+def _skip_rows(chunks, skip_rows):
+    for chunk in chunks:
+        if skip_rows >= len(chunk):
+            skip_rows -= len(chunk)
+            continue
+        yield chunk.iloc[skip_rows:] if skip_rows else chunk
+        skip_rows = 0
+
+def write_dataset(df, destination, fmt=None):
+    fmt = fmt or infer_format(destination)
+    _check_format(fmt)
+
+    if destination == STDIO:
+        target = sys.stdout.buffer if fmt in ('parquet', 'arrow') else sys.stdout
+    else:
+        target = destination
+
+    if fmt == 'csv':
+        df.to_csv(target, index=False)
+    elif fmt == 'ndjson':
+        df.to_json(target, orient='records', lines=True)
+    elif fmt == 'json':
+        df.to_json(target, orient='records')
+    else:
+        try:
+            if fmt == 'parquet':
+                df.to_parquet(target, index=False)
+            else:
+                df.reset_index(drop=True).to_feather(target)
+        except ImportError as e:
+            raise ImportError(f"Writing {fmt} data requires pyarrow: {str(e)}")
+
+    if destination == STDIO:
+        target.flush()
+
+def write_json(obj, destination=STDIO):
+    if destination == STDIO:
+        print(json.dumps(obj))
+        return
+    with open(destination, 'w') as f:
+        json.dump(obj, f)
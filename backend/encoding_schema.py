@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+# Declarative encoding of raw upload values into group codes, compiled once into vectorized
+# lookups. Every encoded column is a small signed integer array (int8 for up to 127 codes)
+# rather than float64, and rows whose value has no code get MISSING and are dropped.
+#
+# 'codes' columns map each known value to its code, anything else has no code. 'threshold'
+# columns are numeric: values below the threshold are coded 1, the others 0. Religion, and
+# sexual orientation in categorical mode or with a reference, depend on the request and are
+# compiled per call (reference_codes / category_codes).
+
+ENCODING_SCHEMA = {
+    'Race': {'codes': {'Black': 0, 'Hispanic': 1, 'Asian': 2, 'White': 3}},
+    'Gender': {'codes': {'Female': 0, 'Male': 1}},
+    # Young (< 40) is 1, Old (>= 40) is 0
+    'Age': {'threshold': 40},
+    'Education': {'codes': {'High School': 0, 'Bachelor': 1, 'Master': 2, 'PhD': 3}},
+    'Disability': {'codes': {'No': 1, 'Yes': 0}},
+    'SexualOrientation': {'codes': {
+        'Heterosexual': 1,  # Privileged group
+        'Lesbian': 0,
+        'Gay': 0,
+        'Bisexual': 0,
+        'Asexual': 0,
+        'Queer': 0,
+        'Pansexual': 0
+    }},
+}
+
+OUTCOME_SCHEMA = {'codes': {'Denied': 0, 'Approved': 1}}
+
+MISSING = -1
+
+def code_dtype(max_code):
+    for dtype in (np.int8, np.int16, np.int32):
+        if max_code <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+class ValueCodes:
+    # Exact-match lookup of values to codes, as Series.map(dict) but without Python per row
+    def __init__(self, mapping):
+        self.index = pd.Index(list(mapping.keys()))
+        dtype = code_dtype(max(mapping.values(), default=0))
+        # get_indexer returns -1 for unknown values, which picks the trailing MISSING entry
+        self.table = np.append(np.asarray(list(mapping.values()), dtype=dtype), MISSING).astype(dtype)
+
+    def encode(self, values):
+        return self.table[self.index.get_indexer(np.asarray(values))]
+
+class ThresholdCode:
+    def __init__(self, threshold):
+        self.threshold = threshold
+
+    def encode(self, values):
+        numbers = np.asarray(pd.to_numeric(values, errors='coerce'), dtype=np.float64)
+        codes = (numbers < self.threshold).astype(np.int8)
+        codes[np.isnan(numbers)] = MISSING
+        return codes
+
+def compile_encoding(spec):
+    if 'threshold' in spec:
+        return ThresholdCode(spec['threshold'])
+    return ValueCodes(spec['codes'])
+
+def compile_schema(schema):
+    return {column: compile_encoding(spec) for column, spec in schema.items()}
+
+COMPILED_SCHEMA = compile_schema(ENCODING_SCHEMA)
+OUTCOME_CODES = compile_encoding(OUTCOME_SCHEMA)
+
+def reference_codes(values, reference):
+    # 1 for the reference value, 0 for every other value
+    return (np.asarray(values) == reference).astype(np.int8)
+
+def require_reference(attr, reference):
+    # Categorical attributes are compared against a declared reference category. One picked from
+    # the data (e.g. the largest group) could differ between chunks, and so between the outcome
+    # rates, the reweighing cells and the metrics.
+    if reference is None:
+        raise ValueError(f"No reference category given for categorical attribute '{attr}'")
+    return reference
+
+def category_codes(values):
+    # One code per distinct value, in sorted order; returns (codes, categories)
+    categories = sorted(pd.unique(np.asarray(values)))
+    return ValueCodes({category: code for code, category in enumerate(categories)}).encode(values), categories
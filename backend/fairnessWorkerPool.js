@@ -0,0 +1,148 @@
+const { spawn } = require('child_process');
+const readline = require('readline');
+
+// Restart delay for a worker process that exited unexpectedly; doubled after
+// every restart that fails before the worker is ready, up to the maximum
+const RESTART_DELAY_MS = 1000;
+const MAX_RESTART_DELAY_MS = 60 * 1000;
+
+// A resident fairness_worker.py process. Requests and responses are
+// newline-delimited JSON objects matched up by their `id` field. Progress
+// events of a request carry its id too and are passed to its onProgress.
+class FairnessWorker {
+  constructor(pythonPath, scriptPath, name) {
+    this.pythonPath = pythonPath;
+    this.scriptPath = scriptPath;
+    this.name = name;
+    this.pending = new Map();
+    this.nextId = 1;
+    this.closed = false;
+    this.restartDelayMs = RESTART_DELAY_MS;
+    this.start();
+  }
+
+  start() {
+    const child = spawn(this.pythonPath, [this.scriptPath]);
+    this.process = child;
+    this.alive = true;
+
+    const lines = readline.createInterface({ input: this.process.stdout });
+    lines.on('line', (line) => this.handleLine(line));
+
+    this.process.stderr.on('data', (data) => {
+      console.log(`${this.name} log: ${data}`);
+    });
+
+    this.process.stdin.on('error', (error) => {
+      console.error(`${this.name} stdin error:`, error);
+    });
+
+    // Python missing or not executable (ENOENT, EACCES) is reported as 'error', often without 'exit'
+    this.process.on('error', (error) => {
+      this.stopped(child, new Error(`${this.name} failed: ${error.message}`));
+      child.kill();
+    });
+
+    this.process.on('exit', (code, signal) => {
+      this.stopped(child, new Error(`${this.name} exited with code ${code}${signal ? ` (${signal})` : ''}`));
+    });
+  }
+
+  // Fails the requests in flight and schedules a restart. Runs once per process,
+  // whichever of 'error' and 'exit' comes first.
+  stopped(child, error) {
+    if (child !== this.process || !this.alive) {
+      return;
+    }
+    this.alive = false;
+    for (const { reject } of this.pending.values()) {
+      reject(error);
+    }
+    this.pending.clear();
+
+    if (!this.closed) {
+      const delay = this.restartDelayMs;
+      this.restartDelayMs = Math.min(delay * 2, MAX_RESTART_DELAY_MS);
+      console.error(`${error.message}, restarting in ${delay} ms`);
+      this.restartTimer = setTimeout(() => this.start(), delay);
+    }
+  }
+
+  handleLine(line) {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (error) {
+      console.error(`${this.name} sent invalid output:`, line);
+      return;
+    }
+
+    if (message.event === 'ready') {
+      this.restartDelayMs = RESTART_DELAY_MS;
+      console.log(`${this.name} ready (pid ${message.pid}, startup ${message.startup_ms} ms)`);
+      return;
+    }
+
+    if (message.event === 'progress') {
+      const request = this.pending.get(message.id);
+      if (request && request.onProgress) {
+        request.onProgress(message);
+      }
+      return;
+    }
+
+    const request = this.pending.get(message.id);
+    if (!request) {
+      console.error(`${this.name} sent a response for unknown request ${message.id}`);
+      return;
+    }
+    this.pending.delete(message.id);
+    request.resolve(message);
+  }
+
+  run(payload, onProgress) {
+    return new Promise((resolve, reject) => {
+      if (!this.alive) {
+        return reject(new Error(`${this.name} is not running`));
+      }
+      const id = this.nextId++;
+      this.pending.set(id, { resolve, reject, onProgress });
+      this.process.stdin.write(JSON.stringify({ ...payload, id, progress: Boolean(onProgress) }) + '\n');
+    });
+  }
+
+  close() {
+    this.closed = true;
+    clearTimeout(this.restartTimer);
+    this.process.kill();
+  }
+}
+
+// Fixed-size pool of resident workers; each request goes to the least busy one.
+class FairnessWorkerPool {
+  constructor({ pythonPath, scriptPath, size = 1 }) {
+    this.workers = [];
+    for (let i = 0; i < Math.max(1, size); i++) {
+      this.workers.push(new FairnessWorker(pythonPath, scriptPath, `Fairness worker ${i + 1}`));
+    }
+  }
+
+  get alive() {
+    return this.workers.some((worker) => worker.alive);
+  }
+
+  run(payload, onProgress) {
+    const running = this.workers.filter((worker) => worker.alive);
+    const candidates = running.length > 0 ? running : this.workers;
+    const worker = candidates.reduce((best, candidate) => (
+      candidate.pending.size < best.pending.size ? candidate : best
+    ));
+    return worker.run(payload, onProgress);
+  }
+
+  close() {
+    this.workers.forEach((worker) => worker.close());
+  }
+}
+
+module.exports = { FairnessWorkerPool };
@@ -0,0 +1,349 @@
+import sys
+import json
+import math
+import os
+import time
+import logging
+
+# Started before pandas / numpy are imported, so STARTUP_MS is the worker's whole import cost
+_import_start = time.perf_counter()
+
+import pandas as pd
+from aif360_preprocessing import preprocess_frame, aggregate_frame, encode_frame, ROW_COUNT_COLUMN
+from bias_detection import detect_bias_sets
+from intersectional import detect_intersectional_bias
+from chunked_analysis import analyze_in_chunks, analyze_aggregated, DEFAULT_CHUNKSIZE
+from batch_analysis import analyze_batch, source_names
+from dataset_io import read_dataset, iter_dataset_chunks
+from instrumentation import span, trace, progress
+from result_cache import cache_from_env, file_digest, result_key, table_key
+from aif360_check import cross_check as aif360_cross_check
+from result_summary import summarize, summarize_batch
+from row_export import export_rows, DEFAULT_PAGE_ROWS
+
+STARTUP_MS = (time.perf_counter() - _import_start) * 1000.0
+
+logger = logging.getLogger(__name__)
+
+# Shared by all workers; FAIRNESS_CACHE_DIR / FAIRNESS_CACHE_BYTES configure it
+result_cache = cache_from_env(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'))
+
+# One request per line on stdin, one response per line on stdout. Requests look like
+# {"id": 1, "input": "uploads/abc", "input_format": "csv", "target_column": "Outcome",
+#  "protected_attributes": [...], "dataset_type": "training", "reference_religion": "...",
+#  "reference_sexual_orientation": "...", "categorical_attributes": ["Religion"],
+#  "intersectional": {"max_depth": 2, "min_support": 10, "top_k": 20},
+#  "uncertainty": {"replicates": 10000, "permutations": 10000, "confidence": 0.95, "seed": 0,
+#                  "reweighed": true}}
+# where "data": [...records...] may be sent instead of "input" for small inline datasets.
+# A "chunksize" (rows) alongside "input" switches to the out-of-core path for very large files.
+# Several datasets are compared in one pass with "inputs": [{"input": "uploads/a", "name": "v1"}, ...]
+# (one dataset per file) and/or a "partition_column" naming the dataset of every row.
+# "cross_check": true (or FAIRNESS_CROSS_CHECK=1) recomputes the metrics with aif360, which is
+# only imported then, and reports the comparison in "cross_check" (with an "error" there if aif360
+# is not installed); it always reads the whole file.
+# Every response echoes the request id. File inputs go through the result cache when it is on.
+# With "progress": true, every finished stage is reported before the response as
+# {"event": "progress", "id": 1, "stage": "parse", "rows": 100000, "elapsed_ms": 812.5}.
+# "format": "summary" answers with a compact versioned {"summary": ...} (result_summary) instead
+# of the full result. Encoded rows never go into a response: "export_rows": {"offset": 0,
+# "limit": 10000, "output": "uploads/abc.rows.csv", "weights": [...reweighing weights...]}
+# writes one page of them to the output file and answers with its position in "export".
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000.0, 3)
+
+def _json_safe(value):
+    # JSON.parse on the Node side rejects bare NaN/Infinity tokens
+    if isinstance(value, float) and not math.isfinite(value):
+        if math.isnan(value):
+            return None
+        return "Infinity" if value > 0 else "-Infinity"
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    return value
+
+def run_analysis(request):
+    start = time.perf_counter()
+    timing = {}
+
+    target_column = request['target_column']
+    protected_attributes = request.get('protected_attributes') or []
+    dataset_type = request.get('dataset_type')
+    reference_religion = request.get('reference_religion')
+    reference_sexual_orientation = request.get('reference_sexual_orientation')
+
+    cross_check = request.get('cross_check', os.environ.get('FAIRNESS_CROSS_CHECK') == '1')
+
+    if request.get('export_rows'):
+        return run_row_export(request)
+    if 'inputs' in request or request.get('partition_column'):
+        return run_batch_analysis(request)
+    if result_cache is not None and 'input' in request and not cross_check:
+        return run_cached_analysis(request)
+    if request.get('chunksize') and 'input' in request and not cross_check:
+        return run_chunked_analysis(request)
+
+    stage_start = time.perf_counter()
+    with span('parse') as parse_span:
+        if 'input' in request:
+            data = read_dataset(request['input'], request.get('input_format'))
+        else:
+            data = request['data']
+        parse_span['rows'] = len(data)
+    timing['read_ms'] = _elapsed_ms(stage_start)
+
+    # Both stages mutate the attribute list they are given, so each gets its own copy.
+    # The encoded frames are handed to detect_bias directly, never converted to records.
+    stage_start = time.perf_counter()
+    preprocessed = preprocess_frame(data, target_column, list(protected_attributes), dataset_type,
+                                    reference_religion, reference_sexual_orientation,
+                                    request.get('categorical_attributes'))
+    timing['preprocess_ms'] = _elapsed_ms(stage_start)
+
+    if preprocessed['error']:
+        timing['total_ms'] = _elapsed_ms(start)
+        return {'stage': 'preprocess', 'error': preprocessed['error'], 'timing': timing}
+
+    is_training = dataset_type == 'training'
+    detection_type = 'true' if is_training else 'false'
+
+    # Original and reweighed metrics share the rows; their count tables run as one batch
+    # (in parallel when FAIRNESS_EXECUTOR is set)
+    stage_start = time.perf_counter()
+    weight_sets = [None]
+    if is_training and preprocessed['instance_weights'] is not None:
+        weight_sets.append(preprocessed['instance_weights'])
+    metrics = detect_bias_sets(preprocessed['original_data'], [target_column], list(protected_attributes),
+                               detection_type, reference_religion,
+                               preprocessed['categories'], preprocessed['references'], weight_sets,
+                               uncertainty=request.get('uncertainty'))
+    original_metrics = metrics[0]
+    reweighed_metrics = metrics[1] if len(metrics) > 1 else {}
+    timing['detect_ms'] = _elapsed_ms(stage_start)
+
+    intersectional_metrics = None
+    if request.get('intersectional'):
+        options = request['intersectional'] if isinstance(request['intersectional'], dict) else {}
+        stage_start = time.perf_counter()
+        intersectional_metrics = detect_intersectional_bias(preprocessed['original_data'], [target_column],
+                                                            list(protected_attributes), preprocessed['categories'],
+                                                            **options)
+        timing['intersectional_ms'] = _elapsed_ms(stage_start)
+
+    response = {
+        'original': original_metrics,
+        'reweighed': reweighed_metrics,
+        'outcome_rates': preprocessed['outcome_rates'],
+        'raw_data': preprocessed['raw_data'],
+        'reweighing': preprocessed['reweighing'],
+        'intersectional': intersectional_metrics,
+        'error': None,
+        'timing': timing
+    }
+    if cross_check:
+        with span('cross_check'):
+            response['cross_check'] = aif360_cross_check(response, preprocessed['original_data'], target_column,
+                                                         preprocessed['categories'], preprocessed['references'])
+        if response['cross_check']['ok'] is False:
+            logger.warning("Metrics differ from aif360: %s", response['cross_check']['mismatches'])
+    timing['total_ms'] = _elapsed_ms(start)
+    return response
+
+def run_chunked_analysis(request):
+    start = time.perf_counter()
+    result = analyze_in_chunks(request['input'], request['target_column'], request.get('protected_attributes') or [],
+                               request.get('dataset_type'), request.get('reference_religion'),
+                               request.get('reference_sexual_orientation'), request.get('categorical_attributes'),
+                               int(request['chunksize']), request.get('input_format'), request.get('uncertainty'))
+    timing = {'total_ms': _elapsed_ms(start)}
+    if result['error']:
+        return {'stage': 'preprocess', 'error': result['error'], 'timing': timing}
+
+    return {
+        'original': result['original'],
+        'reweighed': result['reweighed'],
+        'outcome_rates': result['outcome_rates'],
+        'raw_data': result['raw_data'],
+        'reweighing': result['reweighing'],
+        'intersectional': None,
+        'rows': result['rows'],
+        'error': None,
+        'timing': timing
+    }
+
+def run_batch_analysis(request):
+    # Per-dataset results, the combined comparison table and the metrics of all rows together
+    start = time.perf_counter()
+    inputs = request.get('inputs') or [{'input': request['input']}]
+    paths = [item['input'] for item in inputs]
+    sources = [(item.get('name') or default, path) for item, default, path in zip(inputs, source_names(paths), paths)]
+    result = analyze_batch(sources, request['target_column'], request.get('protected_attributes') or [],
+                           request.get('dataset_type'), request.get('reference_religion'),
+                           request.get('reference_sexual_orientation'), request.get('categorical_attributes'),
+                           request.get('partition_column'), int(request.get('chunksize') or DEFAULT_CHUNKSIZE),
+                           request.get('input_format'), request.get('uncertainty'))
+    timing = {'total_ms': _elapsed_ms(start)}
+    if result['error']:
+        return {'stage': 'preprocess', 'error': result['error'], 'timing': timing}
+
+    return {
+        'partitions': result['partitions'],
+        'comparison': result['comparison'],
+        'overall': result['overall'],
+        'error': None,
+        'timing': timing
+    }
+
+def run_row_export(request):
+    start = time.perf_counter()
+    options = request['export_rows']
+    result = export_rows(request['input'], request['target_column'], request.get('protected_attributes') or [],
+                         request.get('dataset_type'), request.get('reference_religion'),
+                         request.get('reference_sexual_orientation'), request.get('categorical_attributes'),
+                         options.get('offset', 0), options.get('limit', DEFAULT_PAGE_ROWS), request.get('input_format'),
+                         options['output'], options.get('output_format', 'csv'), options.get('weights'))
+    timing = {'total_ms': _elapsed_ms(start)}
+    if result['error']:
+        return {'stage': 'export', 'error': result['error'], 'timing': timing}
+    return {'export': {key: value for key, value in result.items() if key != 'error'}, 'error': None, 'timing': timing}
+
+def summary_response(response):
+    # Replaces the full result by its summary, keeping the response metadata
+    summary = summarize_batch(response) if 'partitions' in response else summarize(response)
+    return {'summary': summary, 'error': None,
+            **{key: response[key] for key in ('cache', 'cross_check', 'timing') if key in response}}
+
+def read_aggregated(request):
+    # Aggregated table of the input, built chunk by chunk when a chunksize is given
+    target_column = request['target_column']
+    protected_attributes = request.get('protected_attributes') or []
+    if not request.get('chunksize'):
+        return aggregate_frame(read_dataset(request['input'], request.get('input_format')), target_column,
+                               protected_attributes)
+    tables = [aggregate_frame(chunk, target_column, protected_attributes)
+              for chunk in iter_dataset_chunks(request['input'], request.get('input_format'), int(request['chunksize']))]
+    return aggregate_frame(pd.concat(tables, ignore_index=True), target_column, protected_attributes)
+
+def run_cached_analysis(request):
+    start = time.perf_counter()
+    timing = {}
+
+    digest = file_digest(request['input'])
+    key = result_key(digest, request)
+    cached = result_cache.get(key)
+    if cached is not None:
+        timing['total_ms'] = _elapsed_ms(start)
+        return {**cached, 'cache': 'result', 'timing': timing}
+
+    stage_start = time.perf_counter()
+    cache_status = 'table'
+    table_cache_key = table_key(digest, request)
+    table = result_cache.get_table(table_cache_key)
+    if table is None:
+        cache_status = 'miss'
+        with span('parse') as parse_span:
+            table = read_aggregated(request)
+            parse_span['rows'] = int(table[ROW_COUNT_COLUMN].sum())
+        result_cache.put_table(table_cache_key, table)
+    timing['read_ms'] = _elapsed_ms(stage_start)
+
+    target_column = request['target_column']
+    protected_attributes = request.get('protected_attributes') or []
+    stage_start = time.perf_counter()
+    result = analyze_aggregated(table, target_column, protected_attributes, request.get('dataset_type'),
+                                request.get('reference_religion'), request.get('reference_sexual_orientation'),
+                                request.get('categorical_attributes'), request.get('uncertainty'))
+    timing['detect_ms'] = _elapsed_ms(stage_start)
+    if result['error']:
+        timing['total_ms'] = _elapsed_ms(start)
+        return {'stage': 'preprocess', 'error': result['error'], 'cache': cache_status, 'timing': timing}
+
+    intersectional_metrics = None
+    if request.get('intersectional'):
+        options = request['intersectional'] if isinstance(request['intersectional'], dict) else {}
+        stage_start = time.perf_counter()
+        # The distinct rows are few, so encoding them again is cheap; each counts as its row count
+        encoded, categories, _ = encode_frame(table.drop(columns=[ROW_COUNT_COLUMN]), target_column,
+                                              list(protected_attributes), request.get('reference_religion'),
+                                              request.get('reference_sexual_orientation'),
+                                              request.get('categorical_attributes'))
+        intersectional_metrics = detect_intersectional_bias(encoded, [target_column], list(protected_attributes),
+                                                            categories, instance_weights=table[ROW_COUNT_COLUMN].loc[encoded.index],
+                                                            **options)
+        timing['intersectional_ms'] = _elapsed_ms(stage_start)
+
+    response = {
+        'original': result['original'],
+        'reweighed': result['reweighed'],
+        'outcome_rates': result['outcome_rates'],
+        'raw_data': result['raw_data'],
+        'reweighing': result['reweighing'],
+        'intersectional': intersectional_metrics,
+        'rows': result['rows'],
+        'error': None
+    }
+    result_cache.put(key, response)
+    timing['total_ms'] = _elapsed_ms(start)
+    return {**response, 'cache': cache_status, 'timing': timing}
+
+def handle_request(request, on_progress=None):
+    # Per-stage spans (wall time, rows, peak RSS) are returned in timing['spans']
+    start = time.perf_counter()
+
+    def report(record):
+        event = {'event': 'progress', 'id': request.get('id'), 'stage': record['span'], 'elapsed_ms': _elapsed_ms(start)}
+        if 'rows' in record:
+            event['rows'] = record['rows']
+        on_progress(event)
+
+    with trace() as spans, progress(report if on_progress else None):
+        try:
+            response = run_analysis(request)
+            if request.get('format') == 'summary' and not response.get('error') and 'export' not in response:
+                response = summary_response(response)
+        except Exception as e:
+            logger.exception("Error in fairness worker")
+            response = {'stage': 'worker', 'error': str(e)}
+    response.setdefault('timing', {})['spans'] = spans
+    response['id'] = request.get('id')
+    return response
+
+def serve(input_stream, output_stream):
+    def write(line):
+        output_stream.write(line + '\n')
+        output_stream.flush()
+
+    def send(message):
+        with span('serialize'):
+            line = json.dumps(_json_safe(message))
+        write(line)
+
+    def send_progress(event):
+        # Not timed: progress is reported from inside spans
+        write(json.dumps(event))
+
+    # aif360 is not needed to serve requests; 'aif360_loaded' shows if something imported it anyway
+    send({'event': 'ready', 'pid': os.getpid(), 'startup_ms': round(STARTUP_MS, 3), 'aif360_loaded': 'aif360' in sys.modules})
+
+    for line in input_stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            send({'id': None, 'stage': 'worker', 'error': f"Invalid request: {str(e)}"})
+            continue
+        if not isinstance(request, dict):
+            send({'id': None, 'stage': 'worker', 'error': f"Invalid request: expected a JSON object, got {type(request).__name__}"})
+            continue
+        send(handle_request(request, send_progress if request.get('progress') else None))
+
+if __name__ == '__main__':
+    # stdout carries the framed protocol; anything else that prints goes to stderr
+    protocol_output = sys.stdout
+    sys.stdout = sys.stderr
+    serve(sys.stdin, protocol_output)
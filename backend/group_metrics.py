@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+# Count-table engine for the group fairness metrics.
+#
+# Every metric reported by detect_bias is a function of one weighted contingency table per
+# protected attribute: counts[g, 0] is the summed instance weight of unfavorable rows in
+# group g and counts[g, 1] that of favorable rows. The table is built with a single
+# bincount over the rows, after which any privileged/unprivileged comparison (a pair of
+# groups, or a group against the union of the others) costs O(k) instead of a rescan.
+# Results match aif360's BinaryLabelDatasetMetric: base rate = favorable weight / total
+# weight, SPD = rate(unprivileged) - rate(privileged), DI = rate(unprivileged) / rate(privileged).
+
+UNFAVORABLE = 0
+FAVORABLE = 1
+
+def group_label_counts(values, labels, weights=None, favorable_label=1.0):
+    # Returns (group_values, counts): the sorted distinct values of the attribute and the
+    # (k x 2) table of weighted unfavorable/favorable counts, row i belonging to group_values[i]
+    values = np.asarray(values).ravel()
+    codes, group_values = pd.factorize(values, sort=True)
+    favorable = (np.asarray(labels).ravel() == favorable_label).astype(np.intp)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64).ravel()
+
+    n_groups = len(group_values)
+    counts = np.bincount(codes * 2 + favorable, weights=weights, minlength=2 * n_groups)
+    return np.asarray(group_values), counts.astype(np.float64).reshape(n_groups, 2)
+
+def base_rates(counts):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return counts[:, FAVORABLE] / counts.sum(axis=1)
+
+def selection_rate(counts, groups):
+    # Base rate of the union of the selected groups (boolean mask or index array)
+    selected = counts[groups]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.float64(selected[:, FAVORABLE].sum()) / np.float64(selected.sum())
+
+def statistical_parity_difference(counts, privileged, unprivileged):
+    return selection_rate(counts, unprivileged) - selection_rate(counts, privileged)
+
+def disparate_impact(counts, privileged, unprivileged):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return selection_rate(counts, unprivileged) / selection_rate(counts, privileged)
+
+def pairwise_matrices(counts):
+    # Entry [i, j] compares group j (unprivileged) against reference group i (privileged)
+    rates = base_rates(counts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spd = rates[np.newaxis, :] - rates[:, np.newaxis]
+        di = rates[np.newaxis, :] / rates[:, np.newaxis]
+    return spd, di
+
+# Reweighing (Kamiran & Calders, as implemented by aif360's Reweighing) in closed form.
+# Every row falls in one of 16 cells given by four flags: in a privileged group, in an
+# unprivileged group, favorable label, unfavorable label. The weight of a row only depends
+# on its cell, so the weights follow from the 16 cell totals and reweighed metrics are the
+# same count tables with each cell scaled by its weight.
+
+PRIVILEGED_CELL = 1
+UNPRIVILEGED_CELL = 2
+FAVORABLE_CELL = 4
+UNFAVORABLE_CELL = 8
+REWEIGHING_CELLS = 16
+
+def reweighing_cells(privileged, unprivileged, labels, favorable_label=1.0, unfavorable_label=0.0):
+    labels = np.asarray(labels).ravel()
+    return (np.asarray(privileged, dtype=np.intp) * PRIVILEGED_CELL
+            + np.asarray(unprivileged, dtype=np.intp) * UNPRIVILEGED_CELL
+            + (labels == favorable_label).astype(np.intp) * FAVORABLE_CELL
+            + (labels == unfavorable_label).astype(np.intp) * UNFAVORABLE_CELL)
+
+def reweighing_factors(cell_totals):
+    # Weight multiplier for each of the 16 cells, from the summed instance weight per cell
+    cells = np.arange(REWEIGHING_CELLS)
+    privileged = (cells & PRIVILEGED_CELL) > 0
+    unprivileged = (cells & UNPRIVILEGED_CELL) > 0
+    favorable = (cells & FAVORABLE_CELL) > 0
+    unfavorable = (cells & UNFAVORABLE_CELL) > 0
+
+    n = cell_totals.sum()
+    n_p = cell_totals[privileged].sum()
+    n_up = cell_totals[unprivileged].sum()
+    n_fav = cell_totals[favorable].sum()
+    n_unfav = cell_totals[unfavorable].sum()
+
+    factors = np.ones(REWEIGHING_CELLS, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for group, n_group in ((privileged, n_p), (unprivileged, n_up)):
+            for label, n_label in ((favorable, n_fav), (unfavorable, n_unfav)):
+                cell = group & label
+                factors[cell] *= n_label * n_group / (n * cell_totals[cell].sum())
+    return factors
+
+def label_counts_from_cells(cell_counts, factors=None):
+    # Collapses (group x reweighing cell) counts into the (group x label) table, scaling each
+    # cell by its reweighing factor when given
+    cell_counts = np.asarray(cell_counts, dtype=np.float64)
+    if factors is not None:
+        # An empty cell can have an undefined factor; it contributes nothing either way
+        with np.errstate(invalid='ignore'):
+            cell_counts = np.where(cell_counts != 0, cell_counts * factors, 0.0)
+    favorable = (np.arange(REWEIGHING_CELLS) & FAVORABLE_CELL) > 0
+    return np.stack([cell_counts[:, ~favorable].sum(axis=1), cell_counts[:, favorable].sum(axis=1)], axis=1)
+
+class GroupLabelCounts:
+    # Running (group value x label) totals for one attribute that can be fed batch by batch
+    # or merged with another instance. Groups are kept in the order they were first seen.
+    # With width=REWEIGHING_CELLS the columns are reweighing cells instead of labels.
+
+    def __init__(self, width=2):
+        self.width = width
+        self.values = []
+        self.counts = np.zeros((0, width), dtype=np.float64)
+        self._index = {}
+
+    def _rows_for(self, values):
+        rows = []
+        for value in values:
+            if value not in self._index:
+                self._index[value] = len(self.values)
+                self.values.append(value)
+            rows.append(self._index[value])
+        if len(self.values) > len(self.counts):
+            self.counts = np.vstack([self.counts, np.zeros((len(self.values) - len(self.counts), self.width))])
+        return np.asarray(rows, dtype=np.intp)
+
+    def add(self, values, labels, weights=None, favorable_label=1.0):
+        favorable = (np.asarray(labels).ravel() == favorable_label).astype(np.intp)
+        return self.add_columns(values, favorable, weights)
+
+    def add_columns(self, values, columns, weights=None):
+        # columns holds the column (label, or reweighing cell) of every row
+        values = np.asarray(values).ravel()
+        codes, group_values = pd.factorize(values, sort=False)
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64).ravel()
+        n_groups = len(group_values)
+        batch = np.bincount(codes * self.width + np.asarray(columns, dtype=np.intp).ravel(), weights=weights,
+                            minlength=self.width * n_groups).reshape(n_groups, self.width)
+        return self.add_counts(list(group_values), batch)
+
+    def add_counts(self, group_values, counts):
+        rows = self._rows_for(group_values)
+        np.add.at(self.counts, rows, np.asarray(counts, dtype=np.float64))
+        return self
+
+    def merge(self, other):
+        return self.add_counts(other.values, other.counts)
+
+    def relabel(self, mapping):
+        # Replaces every group value with mapping[value], keeping the first-seen order
+        relabelled = GroupLabelCounts(self.width)
+        return relabelled.add_counts([mapping[value] for value in self.values], self.counts)
+
+    def label_counts(self, factors=None):
+        # Label totals of a cell-width instance, optionally reweighed
+        return GroupLabelCounts().add_counts(self.values, label_counts_from_cells(self.counts, factors))
+
+    def sorted(self):
+        # (group_values, counts) ordered by group value, as returned by group_label_counts
+        order = sorted(range(len(self.values)), key=lambda row: self.values[row])
+        return np.asarray([self.values[row] for row in order]), self.counts[order]
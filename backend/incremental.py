@@ -0,0 +1,146 @@
+import json
+import pickle
+import logging
+import argparse
+import pandas as pd
+from chunked_analysis import AnalysisTotals
+from dataset_io import read_dataset, write_json, SUPPORTED_FORMATS, STDIO
+
+logger = logging.getLogger(__name__)
+
+# Incremental bias metrics for a decision log that keeps growing.
+#
+# The monitor keeps the sufficient statistics of detect_bias (weighted counts per attribute
+# value x reweighing cell, see AnalysisTotals) instead of the rows. A new batch is encoded
+# and folded in in O(batch); metrics are then derived from the totals in O(groups). With a
+# time column every row also lands in a time bucket, and sliding or tumbling windows are
+# merges of whole buckets, so no window ever touches the rows again.
+
+DEFAULT_BUCKET = '1D'
+
+class IncrementalMonitor:
+    def __init__(self, target_column, protected_attributes, reference_religion=None, reference_sexual_orientation=None,
+                 categorical_attributes=None, time_column=None, bucket=DEFAULT_BUCKET, retention=None):
+        self.time_column = time_column
+        self.bucket = pd.Timedelta(bucket)
+        # Buckets older than this (relative to the newest) are dropped; the overall totals keep them
+        self.retention = pd.Timedelta(retention) if retention else None
+        self.totals = AnalysisTotals(target_column, protected_attributes, reference_religion,
+                                     reference_sexual_orientation, categorical_attributes)
+        self.buckets = {}
+
+    def update(self, batch):
+        df = pd.DataFrame(batch)
+        if self.time_column is None:
+            self.totals.add(df)
+            return self
+
+        timestamps = pd.to_datetime(df[self.time_column], errors='coerce', utc=True)
+        if timestamps.isna().any():
+            logger.warning(f"Skipping {int(timestamps.isna().sum())} rows without a valid {self.time_column}")
+        starts = timestamps.dt.floor(self.bucket)
+        df = df.drop(columns=[self.time_column])
+        for start, rows in df.groupby(starts, sort=True):
+            bucket_totals = self.totals.empty_like().add(rows)
+            if start in self.buckets:
+                self.buckets[start].merge(bucket_totals)
+            else:
+                self.buckets[start] = bucket_totals
+            self.totals.merge(bucket_totals)
+        self._expire()
+        return self
+
+    def merge(self, other):
+        # Combines monitors fed with different batches (e.g. one per log shard)
+        self.totals.merge(other.totals)
+        for start, bucket_totals in other.buckets.items():
+            if start in self.buckets:
+                self.buckets[start].merge(bucket_totals)
+            else:
+                self.buckets[start] = self.totals.empty_like().merge(bucket_totals)
+        self._expire()
+        return self
+
+    def _expire(self):
+        if self.retention is None or not self.buckets:
+            return
+        oldest = max(self.buckets) - self.retention
+        for start in [start for start in self.buckets if start <= oldest]:
+            del self.buckets[start]
+
+    def metrics(self, dataset_type='testing'):
+        # Metrics over every row seen so far
+        return self.totals.results(dataset_type)
+
+    def _merged(self, starts):
+        merged = self.totals.empty_like()
+        for start in starts:
+            merged.merge(self.buckets[start])
+        return merged
+
+    def window(self, length, end=None, dataset_type='testing'):
+        # Sliding window: the buckets starting in (end - length, end], end defaulting to the newest bucket
+        if not self.buckets:
+            raise ValueError("No time buckets yet")
+        end = max(self.buckets) if end is None else pd.to_datetime(end, utc=True).floor(self.bucket)
+        start = end - pd.Timedelta(length)
+        return self._merged(bucket for bucket in sorted(self.buckets) if start < bucket <= end).results(dataset_type)
+
+    def tumbling(self, length, dataset_type='testing'):
+        # Consecutive non-overlapping windows of the given length, aligned to the epoch
+        length = pd.Timedelta(length)
+        windows = {}
+        for start in sorted(self.buckets):
+            windows.setdefault(start.floor(length), []).append(start)
+        return [{'start': window_start.isoformat(), 'metrics': self._merged(starts).results(dataset_type)}
+                for window_start, starts in windows.items()]
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Fold a new batch of decisions into saved monitor state and report bias metrics.')
+    parser.add_argument('--state', required=True, help='Monitor state file; created on the first run')
+    parser.add_argument('--input', default=STDIO, help="New batch file path, or '-' to read from stdin")
+    parser.add_argument('--input-format', choices=SUPPORTED_FORMATS, help='Defaults to the file extension, or csv')
+    parser.add_argument('--target-column', required=True)
+    parser.add_argument('--protected-attributes', default='[]', help='JSON list of protected attribute columns')
+    parser.add_argument('--dataset-type', default='testing')
+    parser.add_argument('--reference-religion')
+    parser.add_argument('--reference-sexual-orientation')
+    parser.add_argument('--categorical-attributes', default='[]',
+                        help='JSON list of attributes (Religion, Sexual Orientation) to keep one category per value')
+    parser.add_argument('--time-column', help='Timestamp column used to bucket rows')
+    parser.add_argument('--bucket', default=DEFAULT_BUCKET, help='Time bucket width, e.g. 1h or 1D')
+    parser.add_argument('--retention', help='Drop buckets older than this, e.g. 90D')
+    parser.add_argument('--window', help='Also report a sliding window of this length ending at the newest bucket')
+    parser.add_argument('--tumbling', help='Also report consecutive windows of this length')
+    parser.add_argument('--output', default=STDIO, help="Where to write the JSON result, '-' for stdout")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    try:
+        args = parse_args()
+        try:
+            monitor = IncrementalMonitor.load(args.state)
+        except FileNotFoundError:
+            monitor = IncrementalMonitor(args.target_column, json.loads(args.protected_attributes), args.reference_religion,
+                                         args.reference_sexual_orientation, json.loads(args.categorical_attributes),
+                                         args.time_column, args.bucket, args.retention)
+        monitor.update(read_dataset(args.input, args.input_format))
+        monitor.save(args.state)
+
+        result = {'overall': monitor.metrics(args.dataset_type)}
+        if args.window:
+            result['window'] = monitor.window(args.window, dataset_type=args.dataset_type)
+        if args.tumbling:
+            result['tumbling'] = monitor.tumbling(args.tumbling, args.dataset_type)
+        write_json(result, args.output)
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Diagnostics that cost nothing unless they are emitted.
+#
+# Log messages take Preview objects as %-style arguments, so a frame or result is only turned
+# into a (row- and length-capped) string when the record passes the level check. Pipeline
+# stages run inside span() blocks, which record wall time, rows and how much the resident set
+# grew during the stage (rss_growth_mb; the largest growth of any call for repeated stages).
+# process_peak_rss_mb is the peak over the whole life of the process, so in a resident worker
+# it only tells the largest request so far. The spans of a request are collected by trace()
+# and logged as one JSON line on the 'fairness.spans' logger.
+#
+# A callback installed with progress() is also told about every finished span, which is how the
+# worker streams stage-level progress events while a request runs.
+#
+# FAIRNESS_LOG_LEVEL (DEBUG, INFO, WARNING, ...) is the verbosity switch: INFO logs shapes,
+# categories and spans, DEBUG adds the frame previews, WARNING keeps only problems.
+
+PREVIEW_ROWS = 5
+PREVIEW_CHARS = 2000
+
+span_logger = logging.getLogger('fairness.spans')
+
+_local = threading.local()
+
+def log_level_from_env(default='INFO'):
+    return os.environ.get('FAIRNESS_LOG_LEVEL', default).upper()
+
+class Preview:
+    # Lazily rendered view of a frame, array or JSON-like value. A callable is only called
+    # when the message is actually emitted.
+    def __init__(self, value, rows=PREVIEW_ROWS, chars=PREVIEW_CHARS):
+        self.value = value
+        self.rows = rows
+        self.chars = chars
+
+    def __str__(self):
+        value = self.value() if callable(self.value) else self.value
+        if isinstance(value, pd.DataFrame):
+            text = f"{value.head(self.rows).to_json(orient='records')} ({len(value)} rows x {len(value.columns)} columns)"
+        elif isinstance(value, np.ndarray):
+            text = f"{np.array2string(value.ravel()[:self.rows])} ({value.size} values)"
+        elif isinstance(value, (dict, list)):
+            text = json.dumps(value, default=str)
+        else:
+            text = str(value)
+        if len(text) > self.chars:
+            text = f"{text[:self.chars]}... ({len(text)} characters)"
+        return text
+
+def peak_rss_mb():
+    # Peak resident set size over the lifetime of the process
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def current_rss_mb():
+    # Resident set size right now, where /proc is available (Linux)
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+@contextmanager
+def span(name, rows=None):
+    # Times one stage. The yielded dict can be updated inside the block, e.g. span['rows'] = len(df).
+    record = {'span': name}
+    if rows is not None:
+        record['rows'] = rows
+    start = time.perf_counter()
+    start_rss_mb = current_rss_mb()
+    try:
+        yield record
+    finally:
+        record['wall_ms'] = round((time.perf_counter() - start) * 1000.0, 3)
+        end_rss_mb = current_rss_mb()
+        record['rss_growth_mb'] = round(max(0.0, end_rss_mb - start_rss_mb), 1) if start_rss_mb is not None and end_rss_mb is not None else None
+        record['process_peak_rss_mb'] = peak_rss_mb()
+        spans = getattr(_local, 'spans', None)
+        if spans is not None:
+            _merge_span(spans, record)
+        span_logger.debug('%s', Preview(record))
+        callback = getattr(_local, 'progress', None)
+        if callback is not None:
+            # Rows so far for repeated stages, e.g. the chunks read of a large file
+            callback(spans.get(name, record) if spans is not None else record)
+
+def _merge_span(spans, record):
+    # Repeated stages (one per chunk) are folded into one entry with a call count
+    existing = spans.get(record['span'])
+    if existing is None:
+        spans[record['span']] = {**record, 'calls': 1}
+        return
+    existing['calls'] += 1
+    existing['wall_ms'] = round(existing['wall_ms'] + record['wall_ms'], 3)
+    if 'rows' in record:
+        existing['rows'] = existing.get('rows', 0) + record['rows']
+    if record['rss_growth_mb'] is not None:
+        existing['rss_growth_mb'] = max(existing['rss_growth_mb'] or 0.0, record['rss_growth_mb'])
+    existing['process_peak_rss_mb'] = record['process_peak_rss_mb']
+
+@contextmanager
+def trace():
+    # Collects the spans run in this thread; the yielded list is filled in when the block exits
+    previous = getattr(_local, 'spans', None)
+    _local.spans = {}
+    collected = []
+    try:
+        yield collected
+    finally:
+        collected.extend(_local.spans.values())
+        _local.spans = previous
+        span_logger.info('%s', Preview({'spans': collected}, chars=sys.maxsize))
+
+@contextmanager
+def progress(callback):
+    # Calls callback(span record) whenever a span of this thread finishes inside the block
+    previous = getattr(_local, 'progress', None)
+    _local.progress = callback
+    try:
+        yield
+    finally:
+        _local.progress = previous
+
+def spanned(name, iterable):
+    # Times the production of every item of an iterable, e.g. reading a file chunk by chunk
+    iterator = iter(iterable)
+    while True:
+        with span(name) as record:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            record['rows'] = len(item)
+        yield item
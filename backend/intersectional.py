@@ -0,0 +1,159 @@
+import logging
+import itertools
+import numpy as np
+import pandas as pd
+from group_metrics import FAVORABLE
+from bias_detection import CATEGORY_LABELS, category_label, json_number
+from instrumentation import Preview
+
+logger = logging.getLogger(__name__)
+
+# Intersectional subgroup metrics (e.g. Gender x Race x Age).
+#
+# The rows are scanned once to build the finest cube: one cell per observed combination of
+# all protected attributes, holding weighted unfavorable/favorable counts. Every coarser
+# subgroup is a roll-up of cells, and each marginal is computed from the smallest already
+# computed superset in the lattice, so the work after the first pass depends on the number
+# of cells, not rows. Each subgroup is compared against everyone outside it.
+
+DEFAULT_MAX_DEPTH = 2
+DEFAULT_MIN_SUPPORT = 10
+DEFAULT_TOP_K = 20
+
+def _radix_keys(codes, cardinalities):
+    # Packs one code column per attribute into a single int64 key per row/cell
+    if np.prod([float(k) for k in cardinalities]) >= 2 ** 62:
+        raise ValueError("Too many attribute combinations for an intersectional cube")
+    keys = np.zeros(codes.shape[0], dtype=np.int64)
+    for column, cardinality in enumerate(cardinalities):
+        keys = keys * cardinality + codes[:, column]
+    return keys
+
+def _aggregate(codes, counts, cardinalities):
+    # Groups rows (or cells) with the same code combination and sums their counts
+    cell_ids, keys = pd.factorize(_radix_keys(codes, cardinalities), sort=True)
+    n_cells = len(keys)
+    cell_counts = np.stack([
+        np.bincount(cell_ids, weights=counts[:, 0], minlength=n_cells),
+        np.bincount(cell_ids, weights=counts[:, 1], minlength=n_cells),
+    ], axis=1)
+
+    cell_codes = np.empty((n_cells, len(cardinalities)), dtype=np.int64)
+    remainder = np.asarray(keys, dtype=np.int64)
+    for column in range(len(cardinalities) - 1, -1, -1):
+        cell_codes[:, column] = remainder % cardinalities[column]
+        remainder = remainder // cardinalities[column]
+    return cell_codes, cell_counts
+
+class SubgroupLattice:
+    def __init__(self, attributes, levels, cell_codes, cell_counts):
+        self.attributes = list(attributes)
+        self.levels = levels
+        self.cardinalities = [len(level) for level in levels]
+        # Lattice cache: attribute index tuple -> (codes of each cell, counts of each cell)
+        self._marginals = {tuple(range(len(self.attributes))): (cell_codes, cell_counts)}
+        self.totals = cell_counts.sum(axis=0)
+
+    @classmethod
+    def from_frame(cls, df, attributes, label_column, instance_weights=None, favorable_label=1.0):
+        levels = []
+        codes = np.empty((len(df), len(attributes)), dtype=np.int64)
+        for column, attr in enumerate(attributes):
+            codes[:, column], level = pd.factorize(df[attr], sort=True)
+            levels.append(np.asarray(level))
+
+        weights = np.ones(len(df)) if instance_weights is None else np.asarray(instance_weights, dtype=np.float64).ravel()
+        favorable = df[label_column].to_numpy() == favorable_label
+        row_counts = np.stack([np.where(favorable, 0.0, weights), np.where(favorable, weights, 0.0)], axis=1)
+
+        cell_codes, cell_counts = _aggregate(codes, row_counts, [len(level) for level in levels])
+        return cls(attributes, levels, cell_codes, cell_counts)
+
+    def marginal(self, subset):
+        subset = tuple(sorted(subset))
+        if subset in self._marginals:
+            return self._marginals[subset]
+
+        # Roll up from the cached superset with the fewest cells
+        parent = min((key for key in self._marginals if set(subset) <= set(key)),
+                     key=lambda key: len(self._marginals[key][1]))
+        parent_codes, parent_counts = self._marginals[parent]
+        columns = [parent.index(attr) for attr in subset]
+        marginal = _aggregate(parent_codes[:, columns], parent_counts, [self.cardinalities[attr] for attr in subset])
+        self._marginals[subset] = marginal
+        return marginal
+
+    def subgroups(self, max_depth=DEFAULT_MAX_DEPTH, min_support=DEFAULT_MIN_SUPPORT):
+        # Yields (attribute indices, cell codes, counts) for every subgroup with enough support.
+        # Deeper levels are built first so shallower marginals roll up from them.
+        max_depth = min(max_depth, len(self.attributes))
+        results = []
+        for depth in range(max_depth, 0, -1):
+            for subset in itertools.combinations(range(len(self.attributes)), depth):
+                codes, counts = self.marginal(subset)
+                supported = counts.sum(axis=1) >= min_support
+                results.append((subset, codes[supported], counts[supported]))
+        return results[::-1]
+
+def rank_subgroups(lattice, max_depth=DEFAULT_MAX_DEPTH, min_support=DEFAULT_MIN_SUPPORT, top_k=DEFAULT_TOP_K,
+                   categories=None):
+    total_unfavorable, total_favorable = lattice.totals
+    total = total_unfavorable + total_favorable
+    categories = categories or {}
+
+    candidates = []
+    for subset, codes, counts in lattice.subgroups(max_depth, min_support):
+        size = counts.sum(axis=1)
+        rest_size = total - size
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = counts[:, FAVORABLE] / size
+            rest_rate = (total_favorable - counts[:, FAVORABLE]) / rest_size
+            spd = rate - rest_rate
+            di = rate / rest_rate
+        for row in range(len(codes)):
+            candidates.append((subset, codes[row], size[row], rate[row], rest_rate[row], spd[row], di[row]))
+
+    # Largest absolute parity gap first; subgroups without a comparison group go last
+    candidates.sort(key=lambda candidate: -abs(candidate[5]) if np.isfinite(candidate[5]) else np.inf)
+
+    ranked = []
+    for subset, codes, size, rate, rest_rate, spd, di in candidates[:top_k]:
+        subgroup = {}
+        for attr, code in zip(subset, codes):
+            name = lattice.attributes[attr]
+            attr_categories = categories.get(name, categories.get(name.replace(' ', '')))
+            subgroup[name] = category_label(lattice.levels[attr][code], attr_categories)
+        ranked.append({
+            'subgroup': subgroup,
+            'depth': len(subset),
+            'size': float(size),
+            'favorable_rate': json_number(rate),
+            'rest_favorable_rate': json_number(rest_rate),
+            'statistical_parity_difference': json_number(spd),
+            'disparate_impact': json_number(di),
+        })
+    return ranked
+
+def detect_intersectional_bias(preprocessed_data, label_names, protected_attribute_names, categories=None,
+                               max_depth=DEFAULT_MAX_DEPTH, min_support=DEFAULT_MIN_SUPPORT, top_k=DEFAULT_TOP_K,
+                               instance_weights=None):
+    try:
+        df = pd.DataFrame(preprocessed_data)
+        attributes = []
+        for attr in protected_attribute_names:
+            column = attr if attr in df.columns else attr.replace(' ', '')
+            if column in df.columns and column not in attributes:
+                attributes.append(column)
+        logger.debug("Intersectional attributes: %s", Preview(attributes))
+
+        lattice = SubgroupLattice.from_frame(df, attributes, label_names[0], instance_weights)
+        subgroups = rank_subgroups(lattice, max_depth, min_support, top_k, {**CATEGORY_LABELS, **(categories or {})})
+        return {
+            'attributes': attributes,
+            'max_depth': max_depth,
+            'min_support': min_support,
+            'subgroups': subgroups,
+        }
+    except Exception as e:
+        logger.exception("Error in detect_intersectional_bias: %s", e)
+        return {'error': str(e)}
@@ -0,0 +1,140 @@
+const crypto = require('crypto');
+
+// Keep at most this many progress events per job for late pollers
+const MAX_PROGRESS_EVENTS = 200;
+
+class JobQueueError extends Error {
+  constructor(message, statusCode, retryAfterSeconds) {
+    super(message);
+    this.statusCode = statusCode;
+    this.retryAfterSeconds = retryAfterSeconds;
+  }
+}
+
+// Bounded queue of analysis jobs in front of the worker pool. At most
+// `concurrency` jobs run at once (one per resident worker by default, so a
+// burst of uploads never starts more Python work than the pool can hold) and
+// at most `maxQueued` wait behind them; submissions beyond that are refused
+// so the caller can answer 429 instead of piling up requests in memory.
+// Finished jobs are kept for `ttlMs` so clients can collect their result.
+class JobQueue {
+  constructor({ pool, concurrency = 1, maxQueued = 20, ttlMs = 60 * 60 * 1000, finish = (analysis) => analysis }) {
+    this.pool = pool;
+    this.concurrency = Math.max(1, concurrency);
+    this.maxQueued = Math.max(0, maxQueued);
+    this.ttlMs = ttlMs;
+    // Turns a worker response into the job result; throwing marks the job failed
+    this.finish = finish;
+    this.jobs = new Map();
+    this.queued = [];
+    this.running = 0;
+    this.listeners = new Map();
+  }
+
+  submit(payload, context = {}) {
+    if (!this.pool.alive) {
+      throw new JobQueueError('No fairness worker is available, try again shortly', 503, 5);
+    }
+    if (this.queued.length >= this.maxQueued && this.running >= this.concurrency) {
+      throw new JobQueueError('Too many analyses are waiting, try again later', 429, 30);
+    }
+
+    const job = {
+      id: crypto.randomUUID(),
+      status: 'queued',
+      // Kept after the job finishes (file paths and options only) for row exports
+      payload,
+      context,
+      progress: [],
+      result: null,
+      error: null,
+      createdAt: new Date().toISOString(),
+      startedAt: null,
+      finishedAt: null
+    };
+    this.jobs.set(job.id, job);
+    this.queued.push(job);
+    this.drain();
+    return job;
+  }
+
+  get(id) {
+    return this.jobs.get(id);
+  }
+
+  position(job) {
+    return job.status === 'queued' ? this.queued.indexOf(job) + 1 : 0;
+  }
+
+  // listener(type, data) gets 'progress', 'status' and finally 'done' or 'failed'.
+  // Returns a function that removes the listener.
+  subscribe(id, listener) {
+    if (!this.listeners.has(id)) {
+      this.listeners.set(id, new Set());
+    }
+    this.listeners.get(id).add(listener);
+    return () => {
+      const listeners = this.listeners.get(id);
+      if (listeners) {
+        listeners.delete(listener);
+        if (listeners.size === 0) {
+          this.listeners.delete(id);
+        }
+      }
+    };
+  }
+
+  notify(job, type, data) {
+    for (const listener of this.listeners.get(job.id) || []) {
+      listener(type, data);
+    }
+  }
+
+  drain() {
+    while (this.running < this.concurrency && this.queued.length > 0) {
+      this.start(this.queued.shift());
+    }
+    // Everyone still waiting moved up
+    this.queued.forEach((job) => this.notify(job, 'status', { status: job.status, position: this.position(job) }));
+  }
+
+  start(job) {
+    this.running++;
+    job.status = 'running';
+    job.startedAt = new Date().toISOString();
+    this.notify(job, 'status', { status: job.status, position: 0 });
+
+    const onProgress = (event) => {
+      const { id, event: type, ...progress } = event;
+      job.progress.push(progress);
+      if (job.progress.length > MAX_PROGRESS_EVENTS) {
+        job.progress.shift();
+      }
+      this.notify(job, 'progress', progress);
+    };
+
+    this.pool.run(job.payload, onProgress)
+      .then((analysis) => {
+        job.result = this.finish(analysis, job);
+        job.status = 'done';
+      })
+      .catch((error) => {
+        job.error = error.details || { message: 'Error processing data', error: error.toString() };
+        job.status = 'failed';
+      })
+      .finally(() => {
+        job.finishedAt = new Date().toISOString();
+        this.running--;
+        this.notify(job, job.status, job.status === 'done' ? job.result : job.error);
+        this.listeners.delete(job.id);
+        setTimeout(() => this.jobs.delete(job.id), this.ttlMs).unref();
+        this.drain();
+      });
+  }
+
+  stats() {
+    return { running: this.running, queued: this.queued.length, concurrency: this.concurrency, maxQueued: this.maxQueued };
+  }
+}
+
+module.exports = { JobQueue, JobQueueError };
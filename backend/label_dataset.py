@@ -0,0 +1,44 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# The parts of aif360's BinaryLabelDataset the pipeline uses, with numpy and pandas only.
+#
+# Metrics and reweighing are computed from count tables (group_metrics), so all a dataset
+# object still provided was its validation and the label / protected attribute arrays. This
+# class raises the same errors for the same frames (NA values, non-numeric values, labels other
+# than the favorable and unfavorable ones) without importing aif360, which takes seconds.
+# aif360 itself is only imported by the cross-check (aif360_check).
+
+class LabelDataset:
+    def __init__(self, df, label_names, protected_attribute_names, favorable_label=1.0, unfavorable_label=0.0):
+        if df is None:
+            raise TypeError("Must provide a pandas DataFrame representing "
+                            "the data (features, labels, protected attributes)")
+        if df.isna().any().any():
+            raise ValueError("Input DataFrames cannot contain NA values.")
+        for col in df.columns:
+            if pd.api.types.is_numeric_dtype(df[col]):
+                continue
+            try:
+                df[col].astype(np.float64)
+            except ValueError as e:
+                logger.error("ValueError: %s", e)
+                raise ValueError("DataFrame values must be numerical.")
+
+        self.favorable_label = float(favorable_label)
+        self.unfavorable_label = float(unfavorable_label)
+        self.label_names = [str(name) for name in label_names]
+        self.protected_attribute_names = [str(name) for name in protected_attribute_names]
+        self.labels = df[self.label_names].to_numpy(dtype=np.float64)
+        self.protected_attributes = df.loc[:, self.protected_attribute_names].to_numpy(dtype=np.float64)
+        self.instance_weights = np.ones(len(df), dtype=np.float64)
+
+        if self.labels.shape[1] != 1:
+            raise ValueError("BinaryLabelDataset only supports single-column "
+                             "labels:\n\tlabels.shape = {}".format(self.labels.shape))
+        if not np.isin(self.labels, [self.favorable_label, self.unfavorable_label]).all():
+            raise ValueError("The favorable and unfavorable labels provided do "
+                             "not match the labels in the dataset.")
@@ -0,0 +1,128 @@
+import os
+import atexit
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from group_metrics import group_label_counts
+
+# Execution layer for the per-attribute / per-dataset count tables.
+#
+# Every (attribute, weight set) table is an independent pass over a few columns, so they can
+# run on a thread or process pool. Tasks are always submitted and collected in the same order
+# and each one runs exactly the serial code, so results are bit-identical to serial mode. The
+# process pool never receives the arrays themselves: columns are copied once into shared
+# memory blocks and workers map them by name.
+
+EXECUTORS = ('serial', 'thread', 'process')
+
+_pools = {}
+
+def executor_from_env():
+    # FAIRNESS_EXECUTOR=serial|thread|process, FAIRNESS_MAX_WORKERS=<n> (default: CPU count)
+    executor = os.environ.get('FAIRNESS_EXECUTOR', 'serial')
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor '{executor}'. Expected one of: {', '.join(EXECUTORS)}")
+    max_workers = os.environ.get('FAIRNESS_MAX_WORKERS')
+    return executor, int(max_workers) if max_workers else None
+
+def _pool(executor, max_workers):
+    # Pools are kept for the life of the process so resident workers do not pay startup per request
+    key = (executor, max_workers)
+    if key not in _pools:
+        pool_class = ThreadPoolExecutor if executor == 'thread' else ProcessPoolExecutor
+        _pools[key] = pool_class(max_workers=max_workers)
+    return _pools[key]
+
+@atexit.register
+def _shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+
+class SharedArrays:
+    # Owns the shared memory blocks of one call; they are released when the block exits
+    def __init__(self):
+        self.blocks = []
+
+    def share(self, array):
+        if array is None:
+            return None
+        array = np.ascontiguousarray(array)
+        block = SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.blocks.append(block)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        return block.name, array.shape, array.dtype.str
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+def _attach(handle):
+    name, shape, dtype = handle
+    try:
+        block = SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching always registers the block with the resource tracker,
+        # which then tries to unlink it as well; only the owner (SharedArrays) should
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            block = SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+    return block, np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+def _shared_counts_task(values_handle, labels_handle, weights_handle, favorable_label):
+    blocks = []
+    arrays = []
+    for handle in (values_handle, labels_handle, weights_handle):
+        if handle is None:
+            arrays.append(None)
+            continue
+        block, array = _attach(handle)
+        blocks.append(block)
+        arrays.append(array)
+    try:
+        group_values, counts = group_label_counts(*arrays, favorable_label=favorable_label)
+        # Copy out before the views into shared memory are closed
+        return np.array(group_values), counts
+    finally:
+        del arrays
+        for block in blocks:
+            block.close()
+
+def count_tables(columns, labels, weight_sets, favorable_label=1.0, executor='serial', max_workers=None):
+    # columns: {attribute: values}. Returns one {attribute: (group_values, counts)} per weight set,
+    # as group_label_counts would for each pair in turn.
+    tasks = [(attr, index) for index in range(len(weight_sets)) for attr in columns]
+
+    if executor == 'serial' or len(tasks) <= 1:
+        results = [group_label_counts(columns[attr], labels, weight_sets[index], favorable_label) for attr, index in tasks]
+    elif executor == 'thread':
+        results = list(_pool(executor, max_workers).map(
+            lambda task: group_label_counts(columns[task[0]], labels, weight_sets[task[1]], favorable_label), tasks))
+    elif executor == 'process':
+        with SharedArrays() as shared:
+            column_handles = {attr: shared.share(values) for attr, values in columns.items()}
+            labels_handle = shared.share(labels)
+            weight_handles = [shared.share(weights) for weights in weight_sets]
+            futures = [_pool(executor, max_workers).submit(_shared_counts_task, column_handles[attr], labels_handle,
+                                                            weight_handles[index], favorable_label)
+                       for attr, index in tasks]
+            try:
+                results = [future.result() for future in futures]
+            finally:
+                # If a task failed, the others may still be reading the blocks; release them after
+                wait(futures)
+    else:
+        raise ValueError(f"Unknown executor '{executor}'. Expected one of: {', '.join(EXECUTORS)}")
+
+    tables = [{} for _ in weight_sets]
+    for (attr, index), table in zip(tasks, results):
+        tables[index][attr] = table
+    return tables
@@ -0,0 +1,53 @@
+const zlib = require('zlib');
+
+// MessagePack is optional and not in package.json: install @msgpack/msgpack
+// on the server to offer it. Without it, clients that prefer it in their Accept
+// header get JSON, and an explicit ?encoding=msgpack is answered with 406.
+let msgpack = null;
+try {
+  msgpack = require('@msgpack/msgpack');
+} catch (error) {
+  msgpack = null;
+}
+
+const MSGPACK_TYPE = 'application/msgpack';
+// Bodies smaller than this are sent as they are
+const GZIP_MIN_BYTES = 1024;
+
+const acceptsGzip = (req) => req.query.encoding === 'gzip' || /\bgzip\b/.test(req.headers['accept-encoding'] || '');
+
+const wantsMsgpack = (req) => {
+  if (req.query.encoding) {
+    return req.query.encoding === 'msgpack';
+  }
+  return msgpack !== null && req.accepts(['application/json', MSGPACK_TYPE]) === MSGPACK_TYPE;
+};
+
+// Sends body as JSON, or MessagePack when asked for with ?encoding=msgpack or
+// an Accept header preferring application/msgpack. Either is gzipped when the
+// client accepts it (Accept-Encoding, or ?encoding=gzip).
+const sendEncoded = (req, res, status, body) => {
+  const useMsgpack = wantsMsgpack(req);
+  if (useMsgpack && !msgpack) {
+    return res.status(406).json({
+      message: 'MessagePack responses are not available on this server (optional package @msgpack/msgpack is not installed)'
+    });
+  }
+
+  const data = useMsgpack ? Buffer.from(msgpack.encode(body)) : Buffer.from(JSON.stringify(body));
+  res.status(status).type(useMsgpack ? MSGPACK_TYPE : 'application/json');
+  res.vary('Accept').vary('Accept-Encoding');
+  if (data.length < GZIP_MIN_BYTES || !acceptsGzip(req)) {
+    return res.send(data);
+  }
+  zlib.gzip(data, (error, compressed) => {
+    if (error) {
+      console.error('Response compression failed:', error);
+      return res.send(data);
+    }
+    res.set('Content-Encoding', 'gzip');
+    res.send(compressed);
+  });
+};
+
+module.exports = { sendEncoded, acceptsGzip };
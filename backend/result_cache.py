@@ -0,0 +1,130 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# On-disk cache for repeated analyses of the same upload.
+#
+# Entries are keyed by the SHA-256 of the dataset bytes plus the request parameters that can
+# change the answer, so re-uploading a byte-identical file is a lookup. Two kinds of entries
+# are kept: finished responses (<key>.json) and aggregated tables (<key>.pkl, see
+# aggregate_frame) keyed by content and column selection only, so a change of reference
+# religion or sexual orientation re-derives the metrics from the distinct rows instead of
+# re-reading the file. The directory is shared by all workers; least recently used entries
+# are removed once it grows past max_bytes.
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bump when the analysis output changes so stale entries are never served
+CACHE_VERSION = 1
+
+def file_digest(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _attribute_names(attributes):
+    return [attr.replace(' ', '') for attr in attributes or []]
+
+def _key(*parts):
+    return hashlib.sha256(json.dumps([CACHE_VERSION, *parts]).encode('utf-8')).hexdigest()
+
+def table_key(digest, request):
+    # The aggregated table only depends on which columns are kept
+    return _key('table', digest, request.get('input_format'), request['target_column'],
+                list(request.get('protected_attributes') or []))
+
+def result_key(digest, request):
+    protected_attributes = list(request.get('protected_attributes') or [])
+    # The reference religion only matters when Religion is analysed; Sexual Orientation is
+    # encoded whenever the column exists, so its reference always counts
+    reference_religion = request.get('reference_religion') if 'Religion' in _attribute_names(protected_attributes) else None
+    categorical_attributes = sorted(set(_attribute_names(request.get('categorical_attributes'))))
+    return _key('result', digest, request.get('input_format'), request['target_column'], protected_attributes,
+                request.get('dataset_type'), reference_religion, request.get('reference_sexual_orientation'),
+                categorical_attributes, request.get('intersectional') or None, request.get('uncertainty') or None)
+
+class ResultCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def _read(self, path, reader):
+        try:
+            value = reader(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # A corrupt or truncated entry is treated as a miss and replaced on the next put
+            logger.warning(f"Ignoring unreadable cache entry {path}: {str(e)}")
+            return None
+        # The modification time doubles as the last access time for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _write(self, path, writer):
+        # Write to a temporary file first so other workers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            writer(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+
+    def get(self, key):
+        def read_json(path):
+            with open(path) as f:
+                return json.load(f)
+        return self._read(self._path(key, 'json'), read_json)
+
+    def put(self, key, value):
+        def write_json(path):
+            with open(path, 'w') as f:
+                json.dump(value, f)
+        self._write(self._path(key, 'json'), write_json)
+
+    def get_table(self, key):
+        return self._read(self._path(key, 'pkl'), pd.read_pickle)
+
+    def put_table(self, key, table):
+        self._write(self._path(key, 'pkl'), table.to_pickle)
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        return total
+
+def cache_from_env(default_directory):
+    # FAIRNESS_CACHE_BYTES=0 turns the cache off
+    max_bytes = int(os.environ.get('FAIRNESS_CACHE_BYTES', DEFAULT_MAX_BYTES))
+    if max_bytes <= 0:
+        return None
+    return ResultCache(os.environ.get('FAIRNESS_CACHE_DIR', default_directory), max_bytes)
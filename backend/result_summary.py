@@ -0,0 +1,114 @@
+import sys
+import gzip
+import json
+import argparse
+from dataset_io import STDIO
+
+# Compact, versioned form of an analysis result, for clients that only need what the charts
+# show: per-group counts, outcome rates, reweighing weights and metrics.
+#
+# Group counts are columnar ({'labels', 'approved', 'total'} per attribute) instead of one
+# object per group, and categorical attributes keep their metric matrices but not the
+# 'group_metrics' dict that repeats every matrix cell under two labels. No row ever appears in
+# a summary; encoded rows are exported page by page on request (row_export).
+#
+# Bump SUMMARY_VERSION whenever a key changes meaning or moves.
+#
+# The msgpack encoding is optional: it needs the msgpack package (pip install msgpack), which
+# nothing else uses; without it that encoding raises ImportError and JSON / gzip still work.
+
+SUMMARY_VERSION = 1
+SUMMARY_ENCODINGS = ('json', 'gzip', 'msgpack')
+
+def summarize(result):
+    # result: a response of run_analysis / analyze_in_chunks / analyze_aggregated
+    reweighing = result.get('reweighing')
+    groups = group_counts(result.get('raw_data') or {})
+    rows = result.get('rows')
+    if rows is None and groups:
+        # Every attribute's groups cover all rows
+        rows = sum(next(iter(groups.values()))['total'])
+    summary = {
+        'version': SUMMARY_VERSION,
+        'rows': rows,
+        'groups': groups,
+        'rates': result.get('outcome_rates'),
+        'weights': reweighing['weights'] if reweighing else None,
+        'metrics': {
+            'original': compact_metrics(result.get('original')),
+            'reweighed': compact_metrics(result.get('reweighed')),
+        },
+    }
+    if result.get('intersectional'):
+        summary['intersectional'] = result['intersectional']
+    return summary
+
+def summarize_batch(result):
+    # result: a response of analyze_batch; every dataset and the overall totals get a summary
+    return {
+        'version': SUMMARY_VERSION,
+        'partitions': {name: summarize(partition) for name, partition in result['partitions'].items()},
+        'comparison': result['comparison'],
+        'overall': summarize(result['overall']),
+    }
+
+def group_counts(raw_data):
+    groups = {}
+    for attr, counts in raw_data.items():
+        labels = list(counts)
+        groups[attr] = {
+            'labels': labels,
+            'approved': [counts[label]['approved'] for label in labels],
+            'total': [counts[label]['total'] for label in labels],
+        }
+    return groups
+
+def compact_metrics(metrics):
+    if not metrics:
+        return metrics
+    # 'matrix' holds every pairwise value of 'group_metrics', indexed by its 'categories'
+    return {attr: {key: value for key, value in values.items() if key != 'group_metrics'} if 'matrix' in values else values
+            for attr, values in metrics.items()}
+
+def encode_summary(summary, encoding='json'):
+    # Bytes of the summary as JSON, gzipped JSON or MessagePack
+    if encoding not in SUMMARY_ENCODINGS:
+        raise ValueError(f"Unsupported summary encoding '{encoding}'. Expected one of: {', '.join(SUMMARY_ENCODINGS)}")
+    if encoding == 'msgpack':
+        try:
+            import msgpack
+        except ImportError as e:
+            raise ImportError(f"Writing msgpack summaries requires the msgpack package: {str(e)}")
+        return msgpack.packb(summary, use_bin_type=True)
+    data = json.dumps(summary, separators=(',', ':')).encode('utf-8')
+    return gzip.compress(data) if encoding == 'gzip' else data
+
+def write_summary(summary, destination=STDIO, encoding='json'):
+    data = encode_summary(summary, encoding)
+    if destination == STDIO:
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+        return
+    with open(destination, 'wb') as f:
+        f.write(data)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Turn a JSON analysis result into a compact summary.')
+    parser.add_argument('--input', default=STDIO, help="JSON result of an analysis, or '-' to read from stdin")
+    parser.add_argument('--encoding', choices=SUMMARY_ENCODINGS, default='json')
+    parser.add_argument('--output', default=STDIO, help="Where to write the summary, '-' for stdout")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    try:
+        args = parse_args()
+        if args.input == STDIO:
+            result = json.load(sys.stdin)
+        else:
+            with open(args.input) as f:
+                result = json.load(f)
+        if result.get('error'):
+            raise ValueError(result['error'])
+        write_summary(summarize_batch(result) if 'partitions' in result else summarize(result), args.output, args.encoding)
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
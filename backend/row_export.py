@@ -0,0 +1,129 @@
+import json
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from chunked_analysis import AnalysisTotals
+from group_metrics import reweighing_factors, PRIVILEGED_CELL, UNPRIVILEGED_CELL, FAVORABLE_CELL, UNFAVORABLE_CELL, REWEIGHING_CELLS
+from instrumentation import span, spanned
+from dataset_io import iter_dataset_chunks, write_dataset, write_json, SUPPORTED_FORMATS, STDIO
+
+logger = logging.getLogger(__name__)
+
+# Opt-in export of encoded rows, one page at a time, for clients that need more than the
+# aggregated results. A page is a range of source rows; it is read chunk by chunk, encoded
+# with the same rules as the analysis and written as a data file (CSV by default), never
+# embedded in a JSON response.
+#
+# Categorical attributes are written as their labels, since their codes depend on which
+# categories a page happens to contain. For training data every row also gets its
+# reweighing weight, from the analysis' weight table when one is given and otherwise from a
+# pass over the whole file.
+
+DEFAULT_PAGE_ROWS = 10000
+ROW_COLUMN = 'row'
+WEIGHT_COLUMN = 'instance_weight'
+
+def factors_from_weights(weights):
+    # Weight multiplier per reweighing cell from a reweighing_summary table
+    factors = np.ones(REWEIGHING_CELLS, dtype=np.float64)
+    for entry in weights:
+        cell = ((PRIVILEGED_CELL if entry['privileged'] else 0) + (UNPRIVILEGED_CELL if entry['unprivileged'] else 0)
+                + (FAVORABLE_CELL if entry['favorable'] else UNFAVORABLE_CELL))
+        factors[cell] = entry['weight']
+    return factors
+
+def read_page(source, input_format, offset, limit):
+    # Source rows [offset, offset + limit), with their source row numbers as index. The rows
+    # before the page are skipped by the reader (see iter_dataset_chunks) without being turned
+    # into frames, but are still read, so a page costs time linear in its offset.
+    parts = []
+    rows = 0
+    for chunk in spanned('parse', iter_dataset_chunks(source, input_format, limit, skip_rows=offset)):
+        parts.append(chunk.iloc[:limit - rows])
+        rows += len(parts[-1])
+        if rows >= limit:
+            break
+    if not rows:
+        return None
+    page = pd.concat(parts)
+    page.index = pd.RangeIndex(offset, offset + rows)
+    return page
+
+def export_rows(source, target_column, protected_attributes, dataset_type, reference_religion, reference_sexual_orientation,
+                categorical_attributes=None, offset=0, limit=DEFAULT_PAGE_ROWS, input_format=None, output=STDIO,
+                output_format='csv', weights=None):
+    # Writes one page of encoded rows to output. Returns where the next page starts (None
+    # after the last one) and how many rows were written; rows dropped by cleaning are skipped.
+    try:
+        offset = max(0, int(offset))
+        limit = max(1, int(limit))
+        totals = AnalysisTotals(target_column, protected_attributes, reference_religion, reference_sexual_orientation,
+                                categorical_attributes)
+        page = read_page(source, input_format, offset, limit)
+        read_rows = 0 if page is None else len(page)
+        if page is None:
+            df = pd.DataFrame(columns=[ROW_COLUMN])
+        else:
+            df, categories, references, _ = totals.encode(page)
+            with span('export', rows=len(df)):
+                if dataset_type == 'training':
+                    if weights is None:
+                        factors = reweighing_factors(_file_totals(source, input_format, totals).cell_totals)
+                    else:
+                        factors = factors_from_weights(weights)
+                    cells = totals.cells(df, categories, references)
+                for col, labels in categories.items():
+                    df[col] = np.asarray(labels, dtype=object)[df[col].to_numpy().astype(np.intp)]
+                df.insert(0, ROW_COLUMN, df.index)
+                if dataset_type == 'training':
+                    df[WEIGHT_COLUMN] = factors[cells]
+        write_dataset(df, output, output_format)
+        logger.info("Exported %s rows from row %s", len(df), offset)
+        return {
+            'offset': offset,
+            'rows': len(df),
+            'next_offset': offset + limit if read_rows == limit else None,
+            'output': output,
+            'format': output_format,
+            'error': None
+        }
+    except Exception as e:
+        logger.error(f"Error in row export: {str(e)}")
+        return {'offset': offset, 'rows': 0, 'next_offset': None, 'output': None, 'format': output_format, 'error': str(e)}
+
+def _file_totals(source, input_format, totals):
+    file_totals = totals.empty_like()
+    for chunk in spanned('parse', iter_dataset_chunks(source, input_format)):
+        file_totals.add(chunk)
+    return file_totals
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Write one page of encoded rows of a dataset, with their reweighing weights.')
+    parser.add_argument('--input', required=True, help='Dataset file path')
+    parser.add_argument('--input-format', choices=SUPPORTED_FORMATS, help='Defaults to the file extension, or csv')
+    parser.add_argument('--target-column', required=True)
+    parser.add_argument('--protected-attributes', default='[]', help='JSON list of protected attribute columns')
+    parser.add_argument('--dataset-type', default='testing')
+    parser.add_argument('--reference-religion')
+    parser.add_argument('--reference-sexual-orientation')
+    parser.add_argument('--categorical-attributes', default='[]',
+                        help='JSON list of attributes (Religion, Sexual Orientation) to keep one category per value')
+    parser.add_argument('--offset', type=int, default=0, help='First source row of the page')
+    parser.add_argument('--limit', type=int, default=DEFAULT_PAGE_ROWS, help='Source rows per page')
+    parser.add_argument('--output', default=STDIO, help="Where to write the rows, '-' for stdout")
+    parser.add_argument('--output-format', choices=SUPPORTED_FORMATS, default='csv')
+    parser.add_argument('--summary-output', help='Also write the page position (next offset, rows) here as JSON')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    try:
+        args = parse_args()
+        result = export_rows(args.input, args.target_column, json.loads(args.protected_attributes), args.dataset_type,
+                             args.reference_religion, args.reference_sexual_orientation,
+                             json.loads(args.categorical_attributes), args.offset, args.limit, args.input_format,
+                             args.output, args.output_format)
+        if args.summary_output:
+            write_json(result, args.summary_output)
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
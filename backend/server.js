@@ -3,10 +3,12 @@ const cors = require('cors');
 const bcrypt = require('bcrypt');
 const jwt = require('jsonwebtoken');
 const multer = require('multer');
-const { spawn } = require('child_process');
 const fs = require('fs');
-const csv = require('csv-parse');
 const path = require('path');
+const { FairnessWorkerPool } = require('./fairnessWorkerPool');
+const { JobQueue, JobQueueError } = require('./jobQueue');
+const { sendEncoded, acceptsGzip } = require('./responseEncoding');
+const zlib = require('zlib');
 
 const app = express();
 
@@ -49,11 +51,26 @@ if (process.env.NODE_ENV === 'production' && !process.env.JWT_SECRET_KEY) {
 const pythonPath = 'python3';
 
 // Check if Python scripts exist
-if (!fs.existsSync(path.join(__dirname, 'aif360_preprocessing.py')) || !fs.existsSync(path.join(__dirname, 'bias_detection.py'))) {
+if (!fs.existsSync(path.join(__dirname, 'aif360_preprocessing.py')) || !fs.existsSync(path.join(__dirname, 'bias_detection.py')) || !fs.existsSync(path.join(__dirname, 'fairness_worker.py'))) {
   console.error('Python scripts not found');
   process.exit(1);
 }
 
+// Uploads larger than this are analysed chunk by chunk instead of being loaded into memory at once
+const chunkedAnalysisBytes = parseInt(process.env.CHUNKED_ANALYSIS_BYTES || String(256 * 1024 * 1024), 10);
+const chunkRows = parseInt(process.env.CHUNK_ROWS || '100000', 10);
+
+// Row export pages (GET /api/jobs/:id/rows): default and largest number of source rows
+const exportPageRows = parseInt(process.env.EXPORT_PAGE_ROWS || '10000', 10);
+const exportMaxRows = parseInt(process.env.EXPORT_MAX_ROWS || '100000', 10);
+
+// Resident Python workers that keep pandas/aif360 loaded between uploads
+const workerPool = new FairnessWorkerPool({
+  pythonPath,
+  scriptPath: path.join(__dirname, 'fairness_worker.py'),
+  size: parseInt(process.env.FAIRNESS_WORKERS || '1', 10)
+});
+
 // User registration endpoint
 app.post('/api/register', async (req, res) => {
   const { email, password } = req.body;
@@ -92,177 +109,379 @@ app.post('/api/login', async (req, res) => {
   }
 });
 
-// File upload endpoint
+// Analysis options of an upload form, in worker request form
+const analysisOptions = (req) => {
+  const targetColumn = req.body.targetColumn;
+  const protectedAttributes = JSON.parse(req.body.protectedAttributes || '[]');
+  if (protectedAttributes.includes('SexualOrientation')) {
+    protectedAttributes[protectedAttributes.indexOf('SexualOrientation')] = 'Sexual Orientation';
+  }
+  const datasetType = req.body.datasetType;
+  const referenceReligion = req.body.referenceReligion;
+  const referenceSexualOrientation = req.body.referenceSexualOrientation;
+  // Attributes (Religion, Sexual Orientation) to report per category instead of reference vs rest
+  const categoricalAttributes = JSON.parse(req.body.categoricalAttributes || '[]');
+  // Optional intersectional subgroup analysis, e.g. {"max_depth": 3, "min_support": 30}
+  const intersectional = req.body.intersectional ? JSON.parse(req.body.intersectional) : null;
+  // 'summary' for the compact versioned result (group counts, rates, weights, metric matrices)
+  const format = (req.body.format || req.query.format) === 'summary' ? 'summary' : undefined;
+
+  console.log("Target Column:", targetColumn);
+  console.log("Protected Attributes:", protectedAttributes);
+  console.log("Dataset Type:", datasetType);
+  console.log("Reference Religion:", referenceReligion);
+  console.log("Reference Sexual Orientation:", referenceSexualOrientation);
+
+  return {
+    target_column: targetColumn,
+    protected_attributes: protectedAttributes,
+    dataset_type: datasetType,
+    reference_religion: referenceReligion,
+    reference_sexual_orientation: referenceSexualOrientation,
+    categorical_attributes: categoricalAttributes,
+    intersectional,
+    format
+  };
+};
+
+// Worker request for an uploaded file
+const analysisRequest = (req) => ({
+  // The worker reads the uploaded CSV straight from disk
+  input: req.file.path,
+  input_format: 'csv',
+  chunksize: req.file.size > chunkedAnalysisBytes ? chunkRows : undefined,
+  ...analysisOptions(req)
+});
+
+// Dataset name of every uploaded file; repeated file names get their position as a suffix,
+// as the worker's source_names does, so each file stays its own dataset
+const uploadNames = (files) => {
+  const names = [];
+  files.forEach((file, index) => {
+    names.push(names.includes(file.originalname) ? `${file.originalname} (${index + 1})` : file.originalname);
+  });
+  return names;
+};
+
+// Worker request comparing several uploaded files (one dataset each), or the datasets named
+// by a partition column, in one pass
+const batchRequest = (req) => {
+  const names = uploadNames(req.files);
+  return {
+    inputs: req.files.map((file, index) => ({ input: file.path, name: names[index] })),
+    input_format: 'csv',
+    partition_column: req.body.partitionColumn || undefined,
+    chunksize: chunkRows,
+    ...analysisOptions(req)
+  };
+};
+
+const batchResult = (analysis, datasetType) => {
+  if (analysis.error) {
+    console.error('Batch analysis error:', analysis.error);
+    const error = new Error(analysis.error);
+    error.details = { message: 'Error analysing datasets', error: analysis.error };
+    throw error;
+  }
+  if (analysis.summary) {
+    console.log("Batch analysis timing:", analysis.timing, `(${Object.keys(analysis.summary.partitions).length} datasets)`);
+    return { message: 'Files uploaded and processed successfully', summary: analysis.summary, datasetType };
+  }
+  console.log("Batch analysis timing:", analysis.timing, `(${Object.keys(analysis.partitions).length} datasets)`);
+  return {
+    message: 'Files uploaded and processed successfully',
+    partitions: analysis.partitions,
+    comparison: analysis.comparison,
+    overall: analysis.overall,
+    datasetType
+  };
+};
+
+// Response body for a finished analysis; throws (with the error body in `details`) if it failed
+const analysisResult = (analysis, datasetType) => {
+  if (analysis.error) {
+    const error = new Error(analysis.error);
+    if (analysis.stage === 'preprocess') {
+      console.error('Preprocessing error:', analysis.error);
+      error.details = { message: 'Error preprocessing data', error: analysis.error };
+    } else {
+      console.error('Bias detection error:', analysis.error);
+      error.details = { message: 'Error detecting bias', error: analysis.error };
+    }
+    throw error;
+  }
+
+  if (analysis.summary) {
+    console.log("Analysis timing:", analysis.timing, analysis.cache ? `(cache: ${analysis.cache})` : '');
+    return { message: 'File uploaded and processed successfully', summary: analysis.summary, datasetType };
+  }
+
+  const rawData = analysis.raw_data;
+  console.log("Raw Data:", rawData);
+  console.log("Analysis timing:", analysis.timing, analysis.cache ? `(cache: ${analysis.cache})` : '');
+
+  const biasMetrics = {
+    original: analysis.original,
+    reweighed: analysis.reweighed
+  };
+
+  // Convert "NaN" strings to null for better JSON compatibility
+  for (let key in biasMetrics.original) {
+    if (biasMetrics.original[key] === "NaN") {
+      biasMetrics.original[key] = null;
+    }
+  }
+  if (biasMetrics.reweighed) {
+    for (let key in biasMetrics.reweighed) {
+      if (biasMetrics.reweighed[key] === "NaN") {
+        biasMetrics.reweighed[key] = null;
+      }
+    }
+  }
+
+  // Include outcome rates and raw_data from preprocessing data
+  biasMetrics.original.outcome_rates = analysis.outcome_rates;
+  biasMetrics.original.raw_data = rawData;
+  if (biasMetrics.reweighed) {
+    biasMetrics.reweighed.outcome_rates = analysis.outcome_rates;
+    biasMetrics.reweighed.raw_data = rawData;
+  }
+
+  console.log('Bias Metrics:', JSON.stringify(biasMetrics, null, 2));
+
+  const response = {
+    message: 'File uploaded and processed successfully',
+    biasMetrics,
+    datasetType
+  };
+  if (analysis.intersectional) {
+    response.intersectionalMetrics = analysis.intersectional;
+  }
+  return response;
+};
+
+const exportResult = (analysis) => {
+  if (analysis.error) {
+    console.error('Row export error:', analysis.error);
+    const error = new Error(analysis.error);
+    error.details = { message: 'Error exporting rows', error: analysis.error };
+    throw error;
+  }
+  return analysis.export;
+};
+
+// Reweighing weight table of a finished analysis, so row exports need not recompute it
+const analysisWeights = (analysis) => {
+  if (analysis.summary) {
+    return analysis.summary.weights || null;
+  }
+  return analysis.reweighing ? analysis.reweighing.weights : null;
+};
+
+// Analyses run as jobs: at most FAIRNESS_JOB_CONCURRENCY at once (default: one per worker),
+// with up to FAIRNESS_MAX_QUEUED_JOBS waiting; further uploads get 429 until the queue drains
+const jobQueue = new JobQueue({
+  pool: workerPool,
+  concurrency: parseInt(process.env.FAIRNESS_JOB_CONCURRENCY || process.env.FAIRNESS_WORKERS || '1', 10),
+  maxQueued: parseInt(process.env.FAIRNESS_MAX_QUEUED_JOBS || '20', 10),
+  ttlMs: parseInt(process.env.FAIRNESS_JOB_TTL_MS || String(60 * 60 * 1000), 10),
+  finish: (analysis, job) => {
+    if (job.context.export) {
+      return exportResult(analysis);
+    }
+    if (!job.context.batch) {
+      job.context.weights = analysisWeights(analysis);
+    }
+    return (job.context.batch ? batchResult : analysisResult)(analysis, job.context.datasetType);
+  }
+});
+
+const submitJob = (req, res, batch = false) => {
+  try {
+    return jobQueue.submit(batch ? batchRequest(req) : analysisRequest(req), { datasetType: req.body.datasetType, batch });
+  } catch (error) {
+    if (!(error instanceof JobQueueError)) {
+      throw error;
+    }
+    console.warn(`Analysis refused (${error.statusCode}):`, error.message, jobQueue.stats());
+    res.set('Retry-After', String(error.retryAfterSeconds));
+    res.status(error.statusCode).json({ message: error.message });
+    return null;
+  }
+};
+
+const jobReceipt = (job) => ({
+  jobId: job.id,
+  status: job.status,
+  position: jobQueue.position(job),
+  statusUrl: `/api/jobs/${job.id}`,
+  eventsUrl: `/api/jobs/${job.id}/events`
+});
+
+const jobView = (job) => ({
+  jobId: job.id,
+  status: job.status,
+  position: jobQueue.position(job),
+  progress: job.progress,
+  createdAt: job.createdAt,
+  startedAt: job.startedAt,
+  finishedAt: job.finishedAt,
+  result: job.result,
+  error: job.error
+});
+
+// File upload endpoint: waits for the analysis and answers with its result
 app.post('/api/upload', upload.single('file'), (req, res) => {
   if (!req.file) {
     return res.status(400).json({ message: 'No file uploaded' });
   }
 
-  const protectedAttributes = JSON.parse(req.body.protectedAttributes || '[]');
-  const protectedAttributesSet = new Set([
-    ...protectedAttributes,
-    ...protectedAttributes.map(attr => attr.replace(' ', ''))
-  ]);
-  const filePath = req.file.path;
-
-  fs.readFile(filePath, 'utf8', (err, fileData) => {
-    if (err) {
-      return res.status(500).json({ message: 'Error reading file' });
+  const job = submitJob(req, res);
+  if (!job) {
+    return;
+  }
+  const unsubscribe = jobQueue.subscribe(job.id, (type, data) => {
+    if (type === 'done') {
+      sendEncoded(req, res, 200, data);
+    } else if (type === 'failed') {
+      console.error('Fairness worker error:', data);
+      sendEncoded(req, res, 500, data);
     }
+  });
+  // Nobody is waiting for the response any more; the job still finishes for /api/jobs
+  res.on('close', unsubscribe);
+});
 
-    csv.parse(fileData, { columns: true }, (err, parsedData) => {
-      if (err) {
-        return res.status(500).json({ message: 'Error parsing CSV' });
-      }
+// Asynchronous upload: answers 202 with a job id right away. Poll /api/jobs/:id or
+// stream /api/jobs/:id/events for progress and the result.
+app.post('/api/jobs', upload.single('file'), (req, res) => {
+  if (!req.file) {
+    return res.status(400).json({ message: 'No file uploaded' });
+  }
 
-      const targetColumn = req.body.targetColumn;
-      const protectedAttributes = JSON.parse(req.body.protectedAttributes || '[]');
-      if (protectedAttributes.includes('SexualOrientation')) {
-        protectedAttributes[protectedAttributes.indexOf('SexualOrientation')] = 'Sexual Orientation';
-      }
-      const datasetType = req.body.datasetType;
-      const referenceReligion = req.body.referenceReligion;
-      const referenceSexualOrientation = req.body.referenceSexualOrientation;
-
-      console.log("Target Column:", targetColumn);
-      console.log("Protected Attributes:", protectedAttributes);
-      console.log("Dataset Type:", datasetType);
-      console.log("Reference Religion:", referenceReligion);
-      console.log("Reference Sexual Orientation:", referenceSexualOrientation);
-
-      const preprocessingProcess = spawn(pythonPath, [
-        path.join(__dirname, 'aif360_preprocessing.py'),
-        JSON.stringify(parsedData),
-        targetColumn,
-        JSON.stringify(protectedAttributes),
-        datasetType,
-        referenceReligion,
-        referenceSexualOrientation
-      ]);
-
-      let preprocessingResult = '';
-
-      preprocessingProcess.stdout.on('data', (data) => {
-        preprocessingResult += data.toString();
-      });
-
-      preprocessingProcess.stderr.on('data', (data) => {
-        console.log(`Preprocessing log: ${data}`);
-      });
-
-      preprocessingProcess.on('close', (code) => {
-        if (code !== 0) {
-          return res.status(500).json({ message: 'Error preprocessing data' });
-        }
-
-        try {
-          const preprocessingData = JSON.parse(preprocessingResult);
-
-          if (preprocessingData.error) {
-            console.error('Preprocessing error:', preprocessingData.error);
-            return res.status(500).json({ message: 'Error preprocessing data', error: preprocessingData.error });
-          }
-
-          const originalData = preprocessingData.original_data;
-          const reweighedData = preprocessingData.reweighed_data || null;
-          const rawData = preprocessingData.raw_data;
-          const labelNames = [targetColumn];
-
-          console.log("Original Data Sample:", originalData.slice(0, 5));
-          if (reweighedData) {
-            console.log("Reweighed Data Sample:", reweighedData.slice(0, 5));
-          }
-          console.log("Raw Data:", rawData);
-
-          const biasDetectionProcessArgs = [
-            JSON.stringify(originalData),
-            JSON.stringify(reweighedData),
-            JSON.stringify(labelNames),
-            JSON.stringify(protectedAttributes),
-            datasetType === 'training' ? 'true' : 'false',
-            referenceReligion,
-            referenceSexualOrientation 
-          ];
-
-          const biasDetectionProcess = spawn(pythonPath, [
-            path.join(__dirname, 'bias_detection.py'),
-            ...biasDetectionProcessArgs
-          ]);
-
-          let biasDetectionResult = '';
-          let biasDetectionError = '';
-
-          biasDetectionProcess.stdout.on('data', (data) => {
-            biasDetectionResult += data.toString();
-          });
-
-          biasDetectionProcess.stderr.on('data', (data) => {
-            biasDetectionError += data.toString();
-            console.error(`Error from bias detection script: ${data}`);
-          });
-
-          biasDetectionProcess.on('close', (code) => {
-            if (code !== 0) {
-              console.error(`Bias detection process exited with code ${code}`);
-              console.error(`Bias detection error output: ${biasDetectionError}`);
-              return res.status(500).json({ message: 'Error detecting bias', error: biasDetectionError });
-            }
-          
-            try {
-              const trimmedResult = biasDetectionResult.trim();
-              const biasMetrics = JSON.parse(trimmedResult);
-          
-              // Convert "NaN" strings to null for better JSON compatibility
-              for (let key in biasMetrics.original) {
-                if (biasMetrics.original[key] === "NaN") {
-                  biasMetrics.original[key] = null;
-                }
-              }
-              if (biasMetrics.reweighed) {
-                for (let key in biasMetrics.reweighed) {
-                  if (biasMetrics.reweighed[key] === "NaN") {
-                    biasMetrics.reweighed[key] = null;
-                  }
-                }
-              }
-          
-              // Include outcome rates and raw_data from preprocessing data
-              biasMetrics.original.outcome_rates = preprocessingData.outcome_rates;
-              biasMetrics.original.raw_data = rawData;
-              if (biasMetrics.reweighed) {
-                biasMetrics.reweighed.outcome_rates = preprocessingData.outcome_rates;
-                biasMetrics.reweighed.raw_data = rawData;
-              }
-          
-              console.log('Bias Metrics:', JSON.stringify(biasMetrics, null, 2));
-          
-              res.status(200).json({
-                message: 'File uploaded and processed successfully',
-                biasMetrics,
-                datasetType
-              });
-            } catch (error) {
-              console.error('JSON parse error:', error);
-              console.error('Raw biasDetectionResult:', biasDetectionResult);
-              res.status(500).json({
-                message: 'Error processing bias detection results',
-                error: error.toString(),
-                rawResult: biasDetectionResult
-              });
-            }
-          });
-        } catch (error) {
-          console.error('JSON parse error:', error);
-          console.error('Raw preprocessingResult:', preprocessingResult);
-          res.status(500).json({
-            message: 'Error processing preprocessing results',
-            error: error.toString(),
-            rawResult: preprocessingResult
-          });
-        }
-      });
+  const job = submitJob(req, res);
+  if (!job) {
+    return;
+  }
+  res.status(202).json(jobReceipt(job));
+});
+
+// Batch evaluation: several files with the same schema (field 'files'), or one file and a
+// partitionColumn (e.g. model version or region). Runs as a job like /api/jobs; the result
+// has the metrics of every dataset, a combined comparison table and the metrics of all rows.
+app.post('/api/batch', upload.array('files'), (req, res) => {
+  if (!req.files || req.files.length === 0) {
+    return res.status(400).json({ message: 'No files uploaded' });
+  }
+
+  const job = submitJob(req, res, true);
+  if (!job) {
+    return;
+  }
+  res.status(202).json(jobReceipt(job));
+});
+
+app.get('/api/jobs/:id', (req, res) => {
+  const job = jobQueue.get(req.params.id);
+  if (!job) {
+    return res.status(404).json({ message: 'Job not found' });
+  }
+  sendEncoded(req, res, 200, jobView(job));
+});
+
+// Opt-in export of a finished analysis' encoded rows, one page at a time:
+// ?offset=0&limit=10000&format=csv|ndjson. The worker writes the page to a file
+// that is streamed back (gzipped if accepted); X-Next-Offset is empty after the
+// last page. Training data rows carry their reweighing weight.
+app.get('/api/jobs/:id/rows', (req, res) => {
+  const job = jobQueue.get(req.params.id);
+  if (!job) {
+    return res.status(404).json({ message: 'Job not found' });
+  }
+  if (job.context.batch || job.context.export) {
+    return res.status(400).json({ message: 'Rows can only be exported for single-file analyses' });
+  }
+  if (job.status !== 'done') {
+    return res.status(409).json({ message: `Job is ${job.status}, rows are exported once it is done` });
+  }
+
+  const offset = Math.max(0, parseInt(req.query.offset || '0', 10) || 0);
+  const limit = Math.min(exportMaxRows, Math.max(1, parseInt(req.query.limit || String(exportPageRows), 10) || exportPageRows));
+  const format = req.query.format === 'ndjson' ? 'ndjson' : 'csv';
+  const output = path.join(path.dirname(job.payload.input), `${job.id}-${offset}-${Date.now()}.${format}`);
+  const removeOutput = () => fs.unlink(output, () => {});
+
+  let exportJob;
+  try {
+    exportJob = jobQueue.submit({
+      ...job.payload,
+      export_rows: { offset, limit, output, output_format: format, weights: job.context.weights }
+    }, { export: true });
+  } catch (error) {
+    if (!(error instanceof JobQueueError)) {
+      throw error;
+    }
+    res.set('Retry-After', String(error.retryAfterSeconds));
+    return res.status(error.statusCode).json({ message: error.message });
+  }
+
+  // Stays subscribed if the client goes away, so the page file is still removed
+  jobQueue.subscribe(exportJob.id, (type, data) => {
+    if (type === 'failed') {
+      removeOutput();
+      return res.status(500).json(data);
+    }
+    if (type !== 'done') {
+      return;
+    }
+    if (res.destroyed) {
+      return removeOutput();
+    }
+    res.set({
+      'X-Row-Offset': String(data.offset),
+      'X-Row-Count': String(data.rows),
+      'X-Next-Offset': data.next_offset === null ? '' : String(data.next_offset)
     });
+    res.type(format === 'ndjson' ? 'application/x-ndjson' : 'text/csv');
+    let stream = fs.createReadStream(output);
+    stream.on('close', removeOutput);
+    if (acceptsGzip(req)) {
+      res.set('Content-Encoding', 'gzip');
+      stream = stream.pipe(zlib.createGzip());
+    }
+    stream.pipe(res);
+  });
+});
+
+// Server-sent events: 'status' and 'progress' while the job runs, then 'done' or 'failed'
+app.get('/api/jobs/:id/events', (req, res) => {
+  const job = jobQueue.get(req.params.id);
+  if (!job) {
+    return res.status(404).json({ message: 'Job not found' });
+  }
+
+  res.set({
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    Connection: 'keep-alive'
+  });
+  res.flushHeaders();
+  const send = (type, data) => res.write(`event: ${type}\ndata: ${JSON.stringify(data)}\n\n`);
+
+  if (job.status === 'done' || job.status === 'failed') {
+    send(job.status, job.status === 'done' ? job.result : job.error);
+    return res.end();
+  }
+  send('status', { status: job.status, position: jobQueue.position(job) });
+  job.progress.forEach((progress) => send('progress', progress));
+
+  const unsubscribe = jobQueue.subscribe(job.id, (type, data) => {
+    send(type, data);
+    if (type === 'done' || type === 'failed') {
+      res.end();
+    }
   });
+  res.on('close', unsubscribe);
 });
 
 
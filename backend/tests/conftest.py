@@ -0,0 +1,47 @@
+import os
+import sys
+import math
+
+import pytest
+
+# The worker's shared result cache stays off unless a test sets one up
+os.environ['FAIRNESS_CACHE_BYTES'] = '0'
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+
+import synthetic_data
+
+TARGET_COLUMN = synthetic_data.TARGET_COLUMN
+PROTECTED_ATTRIBUTES = ['Gender', 'Race', 'Age', 'Religion']
+
+def analysis_args(dataset_type='training', categorical_attributes=None):
+    # Positional arguments shared by preprocess_frame, analyze_in_chunks and friends, after the data
+    return (TARGET_COLUMN, list(PROTECTED_ATTRIBUTES), dataset_type, synthetic_data.PRIVILEGED['Religion'], None,
+            categorical_attributes)
+
+def assert_close(actual, expected, path='result'):
+    # Same structure and values, with float tolerance and dict order ignored
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and set(actual) == set(expected), f"{path}: keys {sorted(actual)} != {sorted(expected)}"
+        for key in expected:
+            assert_close(actual[key], expected[key], f"{path}.{key}")
+    elif isinstance(expected, (list, tuple)):
+        assert isinstance(actual, (list, tuple)) and len(actual) == len(expected), f"{path}: {actual} != {expected}"
+        for index, (a, e) in enumerate(zip(actual, expected)):
+            assert_close(a, e, f"{path}[{index}]")
+    elif isinstance(expected, float) and not isinstance(actual, bool) and isinstance(actual, (int, float)):
+        assert math.isclose(actual, expected, rel_tol=1e-9, abs_tol=1e-12), f"{path}: {actual} != {expected}"
+    else:
+        assert actual == expected, f"{path}: {actual!r} != {expected!r}"
+
+@pytest.fixture
+def frame():
+    return synthetic_data.generate_frame(3000, seed=1, bias={'Gender': 0.1, 'Race': 0.05}, missing_rate=0.01)
+
+@pytest.fixture
+def csv_path(tmp_path, frame):
+    path = tmp_path / 'data.csv'
+    frame.to_csv(path, index=False)
+    return str(path)
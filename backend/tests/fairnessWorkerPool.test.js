@@ -0,0 +1,39 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const path = require('path');
+const { FairnessWorkerPool } = require('../fairnessWorkerPool');
+
+const scriptPath = path.join(__dirname, '..', 'fairness_worker.py');
+
+test('a missing Python executable fails requests instead of crashing', async () => {
+  const pool = new FairnessWorkerPool({ pythonPath: path.join(__dirname, 'no-such-python'), scriptPath });
+  try {
+    await assert.rejects(pool.run({ target_column: 'Outcome' }), /not running|failed/);
+    await new Promise((resolve) => setTimeout(resolve, 50));
+    assert.strictEqual(pool.alive, false);
+    assert.ok(pool.workers[0].restartDelayMs > 1000);
+  } finally {
+    pool.close();
+  }
+});
+
+test('the worker answers requests and reports progress', async () => {
+  const pool = new FairnessWorkerPool({ pythonPath: 'python3', scriptPath });
+  try {
+    const progress = [];
+    const response = await pool.run({
+      data: [
+        { Gender: 'Male', Outcome: 'Approved' }, { Gender: 'Female', Outcome: 'Denied' },
+        { Gender: 'Male', Outcome: 'Denied' }, { Gender: 'Female', Outcome: 'Approved' }
+      ],
+      target_column: 'Outcome',
+      protected_attributes: ['Gender'],
+      dataset_type: 'training'
+    }, (event) => progress.push(event.stage));
+    assert.strictEqual(response.error, null);
+    assert.strictEqual(response.original.Gender.statistical_parity_difference, 0);
+    assert.ok(progress.includes('parse'));
+  } finally {
+    pool.close();
+  }
+});
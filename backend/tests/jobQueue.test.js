@@ -0,0 +1,89 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const { JobQueue, JobQueueError } = require('../jobQueue');
+
+// Pool double: every run waits until the test settles it
+class FakePool {
+  constructor() {
+    this.alive = true;
+    this.runs = [];
+  }
+
+  run(payload, onProgress) {
+    return new Promise((resolve, reject) => this.runs.push({ payload, onProgress, resolve, reject }));
+  }
+}
+
+const settle = () => new Promise((resolve) => setImmediate(resolve));
+
+test('jobs beyond the running and queued limits are refused with 429', () => {
+  const pool = new FakePool();
+  const queue = new JobQueue({ pool, concurrency: 1, maxQueued: 1 });
+  const running = queue.submit({ n: 1 });
+  const waiting = queue.submit({ n: 2 });
+  assert.strictEqual(running.status, 'running');
+  assert.strictEqual(queue.position(waiting), 1);
+  assert.throws(() => queue.submit({ n: 3 }), (error) => error instanceof JobQueueError
+    && error.statusCode === 429 && error.retryAfterSeconds > 0);
+  assert.strictEqual(pool.runs.length, 1);
+});
+
+test('jobs are refused with 503 while no worker is alive', () => {
+  const pool = new FakePool();
+  pool.alive = false;
+  const queue = new JobQueue({ pool });
+  assert.throws(() => queue.submit({}), (error) => error.statusCode === 503);
+});
+
+test('progress, completion and the next queued job', async () => {
+  const pool = new FakePool();
+  const queue = new JobQueue({ pool, finish: (analysis) => ({ value: analysis.value * 2 }) });
+  const first = queue.submit({ n: 1 });
+  const second = queue.submit({ n: 2 });
+  const events = [];
+  queue.subscribe(first.id, (type, data) => events.push([type, data]));
+
+  pool.runs[0].onProgress({ event: 'progress', id: 1, stage: 'parse', rows: 10 });
+  pool.runs[0].resolve({ value: 21 });
+  await settle();
+
+  assert.deepStrictEqual(events, [['progress', { stage: 'parse', rows: 10 }], ['done', { value: 42 }]]);
+  assert.strictEqual(first.status, 'done');
+  assert.deepStrictEqual(first.result, { value: 42 });
+  assert.strictEqual(second.status, 'running');
+  assert.strictEqual(pool.runs.length, 2);
+});
+
+test('failed runs and failing finish() mark the job failed', async () => {
+  const pool = new FakePool();
+  const queue = new JobQueue({
+    pool,
+    concurrency: 2,
+    finish: () => {
+      const error = new Error('bad result');
+      error.details = { message: 'Error detecting bias', error: 'bad result' };
+      throw error;
+    }
+  });
+  const crashed = queue.submit({});
+  const rejected = queue.submit({});
+  pool.runs[0].reject(new Error('worker exited'));
+  pool.runs[1].resolve({});
+  await settle();
+
+  assert.strictEqual(crashed.status, 'failed');
+  assert.strictEqual(crashed.error.message, 'Error processing data');
+  assert.deepStrictEqual(rejected.error, { message: 'Error detecting bias', error: 'bad result' });
+  assert.strictEqual(queue.stats().running, 0);
+});
+
+test('finished jobs are forgotten after their TTL', async () => {
+  const pool = new FakePool();
+  const queue = new JobQueue({ pool, ttlMs: 20 });
+  const job = queue.submit({});
+  pool.runs[0].resolve({});
+  await settle();
+  assert.strictEqual(queue.get(job.id), job);
+  await new Promise((resolve) => setTimeout(resolve, 40));
+  assert.strictEqual(queue.get(job.id), undefined);
+});
@@ -0,0 +1,59 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const zlib = require('zlib');
+const { sendEncoded } = require('../responseEncoding');
+
+const request = (query = {}, headers = {}, accepted = 'application/json') => ({
+  query,
+  headers,
+  accepts: (types) => (types.includes(accepted) ? accepted : types[0])
+});
+
+// Resolves with what sendEncoded sent
+const send = (req, body) => new Promise((resolve) => {
+  const res = {
+    headers: {},
+    status(code) { this.statusCode = code; return this; },
+    type(type) { this.contentType = type; return this; },
+    vary() { return this; },
+    set(name, value) { this.headers[name] = value; return this; },
+    send(data) { resolve({ ...this, body: data }); },
+    json(data) { resolve({ ...this, body: Buffer.from(JSON.stringify(data)) }); }
+  };
+  sendEncoded(req, res, 200, body);
+});
+
+const large = { values: Array.from({ length: 500 }, (_, i) => i) };
+
+test('JSON by default, gzipped when the client accepts it', async () => {
+  const plain = await send(request(), large);
+  assert.strictEqual(plain.contentType, 'application/json');
+  assert.deepStrictEqual(JSON.parse(plain.body), large);
+
+  const gzipped = await send(request({}, { 'accept-encoding': 'gzip, deflate, br' }), large);
+  assert.strictEqual(gzipped.headers['Content-Encoding'], 'gzip');
+  assert.deepStrictEqual(JSON.parse(zlib.gunzipSync(gzipped.body)), large);
+
+  const small = await send(request({}, { 'accept-encoding': 'gzip' }), { ok: true });
+  assert.strictEqual(small.headers['Content-Encoding'], undefined);
+});
+
+test('MessagePack is optional', async () => {
+  let available = true;
+  try {
+    require.resolve('@msgpack/msgpack');
+  } catch (error) {
+    available = false;
+  }
+  const explicit = await send(request({ encoding: 'msgpack' }), large);
+  const negotiated = await send(request({}, {}, 'application/msgpack'), large);
+  if (available) {
+    assert.strictEqual(explicit.contentType, 'application/msgpack');
+    assert.strictEqual(negotiated.contentType, 'application/msgpack');
+  } else {
+    assert.strictEqual(explicit.statusCode, 406);
+    // An Accept header is a preference, so JSON is fine
+    assert.strictEqual(negotiated.statusCode, 200);
+    assert.strictEqual(negotiated.contentType, 'application/json');
+  }
+});
@@ -0,0 +1,43 @@
+import sys
+
+import pytest
+
+import fairness_worker
+from aif360_check import cross_check, check_metrics
+from conftest import analysis_args, TARGET_COLUMN
+
+@pytest.fixture
+def without_aif360(monkeypatch):
+    # Imports of aif360 fail as if it was not installed
+    for name in [name for name in sys.modules if name.startswith('aif360')]:
+        monkeypatch.delitem(sys.modules, name)
+    for name in ('aif360', 'aif360.datasets', 'aif360.metrics', 'aif360.algorithms', 'aif360.algorithms.preprocessing'):
+        monkeypatch.setitem(sys.modules, name, None)
+
+def request(frame):
+    target_column, protected_attributes, dataset_type, reference_religion, reference_sexual_orientation, categorical = \
+        analysis_args(categorical_attributes=['Religion'])
+    return {'id': 1, 'data': frame.to_dict(orient='records'), 'target_column': target_column,
+            'protected_attributes': protected_attributes, 'dataset_type': dataset_type,
+            'reference_religion': reference_religion, 'reference_sexual_orientation': reference_sexual_orientation,
+            'categorical_attributes': categorical, 'cross_check': True}
+
+def test_cross_check_without_aif360_reports_it_and_keeps_the_metrics(without_aif360, frame):
+    response = fairness_worker.handle_request(request(frame))
+    assert response['error'] is None
+    assert response['original'] and response['reweighed']
+    check = response['cross_check']
+    assert check['ok'] is None and check['compared'] == 0
+    assert 'requires aif360' in check['error']
+
+def test_cross_check_without_aif360_directly(without_aif360):
+    result = cross_check({'original': {}, 'reweighed': {}}, None, TARGET_COLUMN)
+    assert result['ok'] is None and result['error']
+
+def test_check_metrics_flags_values_that_differ():
+    reference = {'original': {'Gender': {'binary': (-0.1, 0.8)}}, 'reweighed': {}}
+    same = {'original': {'Gender': {'statistical_parity_difference': -0.1, 'disparate_impact': 0.8}}}
+    assert check_metrics(same, reference) == {'compared': 2, 'max_abs_diff': 0.0, 'ok': True, 'mismatches': []}
+    different = {'original': {'Gender': {'statistical_parity_difference': -0.1, 'disparate_impact': 'Infinity'}}}
+    result = check_metrics(different, reference)
+    assert result['ok'] is False and [mismatch['metric'] for mismatch in result['mismatches']] == ['disparate_impact']
@@ -0,0 +1,74 @@
+from batch_analysis import analyze_batch
+from chunked_analysis import analyze_in_chunks
+from conftest import analysis_args, TARGET_COLUMN
+
+import synthetic_data
+
+def write_csv(tmp_path, name, frame):
+    path = tmp_path / name
+    frame.to_csv(path, index=False)
+    return str(path)
+
+def batch(sources, chunksize=1000, **options):
+    target_column, protected_attributes, dataset_type, reference_religion, reference_sexual_orientation, _ = analysis_args()
+    return analyze_batch(sources, target_column, protected_attributes, dataset_type, reference_religion,
+                         reference_sexual_orientation, chunksize=chunksize, **options)
+
+def separate(path):
+    return analyze_in_chunks(path, *analysis_args(), chunksize=1000)
+
+def test_every_file_matches_a_separate_run(tmp_path):
+    paths = [write_csv(tmp_path, f'{seed}.csv', synthetic_data.generate_frame(2500, seed=seed, missing_rate=0.01))
+             for seed in range(3)]
+    result = batch([(str(seed), path) for seed, path in enumerate(paths)])
+    assert result['error'] is None
+    for seed, path in enumerate(paths):
+        assert result['partitions'][str(seed)] == separate(path)
+
+def test_overall_matches_all_rows_in_one_file(tmp_path, frame):
+    first = write_csv(tmp_path, 'a.csv', frame.iloc[:1500])
+    second = write_csv(tmp_path, 'b.csv', frame.iloc[1500:])
+    result = batch([('a', first), ('b', second)])
+    assert result['overall'] == separate(write_csv(tmp_path, 'all.csv', frame))
+
+def test_partition_column_matches_separate_runs(tmp_path, frame):
+    frame['Model'] = ['v1', 'v2', 'v3'] * (len(frame) // 3)
+    result = batch([('all', write_csv(tmp_path, 'all.csv', frame))], partition_column='Model')
+    assert sorted(result['partitions']) == ['v1', 'v2', 'v3']
+    for version in ('v1', 'v2', 'v3'):
+        rows = frame[frame['Model'] == version].drop(columns=['Model'])
+        assert result['partitions'][version] == separate(write_csv(tmp_path, f'{version}.csv', rows))
+
+def test_files_with_extra_columns_keep_all_their_rows(tmp_path, frame):
+    # Regression: the rows of a file without a column another file has were silently dropped
+    # once both files were concatenated into one batch
+    with_extra = frame.assign(Extra='x')
+    with_extra.loc[with_extra.index[:10], 'Extra'] = ''
+    first = write_csv(tmp_path, 'a.csv', frame)
+    second = write_csv(tmp_path, 'b.csv', with_extra)
+    result = batch([('a', first), ('b', second)], chunksize=10000)
+    assert result['error'] is None
+    assert sorted(result['partitions']) == ['a', 'b']
+    assert result['partitions']['a'] == separate(first)
+    # Rows with an empty cell in the unused column are dropped, as in a separate run
+    assert result['partitions']['b'] == separate(second)
+    assert result['partitions']['b']['rows'] < result['partitions']['a']['rows']
+
+def test_file_missing_an_analysed_column_is_rejected(tmp_path, frame):
+    first = write_csv(tmp_path, 'a.csv', frame)
+    second = write_csv(tmp_path, 'b.csv', frame.drop(columns=['Race']))
+    result = batch([('a', first), ('b', second)], chunksize=10000)
+    assert result['partitions'] is None
+    assert "Dataset 'b'" in result['error'] and 'Race' in result['error']
+
+def test_file_missing_the_target_column_is_rejected(tmp_path, frame):
+    first = write_csv(tmp_path, 'a.csv', frame)
+    second = write_csv(tmp_path, 'b.csv', frame.drop(columns=[TARGET_COLUMN]))
+    result = batch([('a', first), ('b', second)])
+    assert f"'{TARGET_COLUMN}' column not found in dataset 'b'" == result['error']
+
+def test_duplicate_dataset_names_are_rejected(tmp_path, frame):
+    path = write_csv(tmp_path, 'a.csv', frame)
+    result = batch([('a', path), ('a', path)])
+    assert result['partitions'] is None
+    assert result['error'] == 'Dataset names must be unique: a'
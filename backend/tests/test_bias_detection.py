@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from bias_detection import detect_bias, categorical_metrics_from_counts, binary_metrics_from_counts
+
+def test_binary_metrics_match_the_selection_rates():
+    # Unprivileged (0) approved 1 of 4, privileged (1) 3 of 4
+    counts = np.array([[3.0, 1.0], [1.0, 3.0]])
+    metrics = binary_metrics_from_counts(np.array([0.0, 1.0]), counts)
+    assert metrics['statistical_parity_difference'] == 0.25 - 0.75
+    assert metrics['disparate_impact'] == 0.25 / 0.75
+
+def test_matrix_matches_group_metrics():
+    counts = np.array([[8.0, 2.0], [5.0, 5.0], [1.0, 9.0]])
+    metrics = categorical_metrics_from_counts(np.array([0.0, 1.0, 2.0]), counts, ['a', 'b', 'c'], reference='c')
+    matrix = metrics['matrix']
+    assert matrix['categories'] == ['a', 'b', 'c'] and matrix['reference'] == 'c'
+    for i, reference in enumerate(matrix['categories']):
+        for j, comparison in enumerate(matrix['categories']):
+            if i != j:
+                pair = metrics['group_metrics'][reference][comparison]
+                assert pair['statistical_parity_difference'] == matrix['statistical_parity_difference'][i][j]
+                assert pair['disparate_impact'] == matrix['disparate_impact'][i][j]
+    # c (rate 0.9) against a and b together (rate 0.35)
+    assert np.isclose(metrics['overall']['statistical_parity_difference'], 0.35 - 0.9)
+
+def test_detect_bias_on_encoded_rows():
+    df = pd.DataFrame({'Gender': [1, 1, 0, 0], 'Outcome': [1.0, 1.0, 1.0, 0.0]})
+    metrics = detect_bias(df, ['Outcome'], ['Gender'], 'false', None)
+    assert metrics['Gender'] == {'statistical_parity_difference': -0.5, 'disparate_impact': 0.5}
@@ -0,0 +1,54 @@
+import pytest
+
+import fairness_worker
+from aif360_preprocessing import aggregate_frame
+from chunked_analysis import analyze_in_chunks, analyze_aggregated
+from dataset_io import read_dataset
+from conftest import analysis_args, assert_close, TARGET_COLUMN, PROTECTED_ATTRIBUTES
+
+import synthetic_data
+
+RESULT_KEYS = ('original', 'reweighed', 'outcome_rates', 'raw_data', 'reweighing')
+
+CASES = [
+    ('training', None),
+    ('training', ['Religion']),
+    ('testing', ['Religion']),
+]
+
+def in_memory(path, dataset_type, categorical_attributes):
+    # The whole-frame path of the worker (preprocess_frame + detect_bias_sets)
+    target_column, protected_attributes, dataset_type, reference_religion, reference_sexual_orientation, _ = \
+        analysis_args(dataset_type, categorical_attributes)
+    response = fairness_worker.handle_request({
+        'input': path, 'input_format': 'csv', 'target_column': target_column,
+        'protected_attributes': protected_attributes, 'dataset_type': dataset_type,
+        'reference_religion': reference_religion, 'reference_sexual_orientation': reference_sexual_orientation,
+        'categorical_attributes': categorical_attributes,
+    })
+    assert response['error'] is None
+    return {key: response[key] for key in RESULT_KEYS}
+
+@pytest.mark.parametrize('dataset_type, categorical_attributes', CASES)
+@pytest.mark.parametrize('chunksize', [333, 100000])
+def test_chunked_matches_in_memory(csv_path, dataset_type, categorical_attributes, chunksize):
+    result = analyze_in_chunks(csv_path, *analysis_args(dataset_type, categorical_attributes), chunksize=chunksize)
+    assert result['error'] is None
+    assert_close({key: result[key] for key in RESULT_KEYS}, in_memory(csv_path, dataset_type, categorical_attributes))
+
+@pytest.mark.parametrize('dataset_type, categorical_attributes', CASES)
+def test_aggregated_table_matches_in_memory(csv_path, dataset_type, categorical_attributes):
+    table = aggregate_frame(read_dataset(csv_path, 'csv'), TARGET_COLUMN, PROTECTED_ATTRIBUTES)
+    assert len(table) < 3000
+    result = analyze_aggregated(table, *analysis_args(dataset_type, categorical_attributes))
+    assert result['error'] is None
+    assert result['rows'] == sum(group['total'] for group in result['raw_data']['Gender'].values())
+    assert_close({key: result[key] for key in RESULT_KEYS}, in_memory(csv_path, dataset_type, categorical_attributes))
+
+def test_chunked_reports_errors_in_the_result(tmp_path):
+    frame = synthetic_data.generate_frame(100, seed=0)
+    frame['Gender'] = 'Unknown gender'
+    path = tmp_path / 'bad.csv'
+    frame.to_csv(path, index=False)
+    result = analyze_in_chunks(str(path), *analysis_args())
+    assert result['original'] is None and result['error']
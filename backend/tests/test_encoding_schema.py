@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from bias_detection import CATEGORY_LABELS
+from encoding_schema import (ENCODING_SCHEMA, COMPILED_SCHEMA, OUTCOME_CODES, MISSING, ValueCodes, code_dtype,
+                             reference_codes, category_codes, require_reference)
+
+CODED_COLUMNS = [column for column, spec in ENCODING_SCHEMA.items() if 'codes' in spec]
+
+@pytest.mark.parametrize('column', CODED_COLUMNS)
+def test_declared_values_get_their_int8_codes(column):
+    mapping = ENCODING_SCHEMA[column]['codes']
+    codes = COMPILED_SCHEMA[column].encode(list(mapping))
+    assert codes.dtype == np.int8
+    assert codes.tolist() == list(mapping.values())
+
+@pytest.mark.parametrize('column', CODED_COLUMNS)
+def test_unmapped_and_blank_values_are_missing(column):
+    codes = COMPILED_SCHEMA[column].encode(['', 'unknown', ' ' + next(iter(ENCODING_SCHEMA[column]['codes']))])
+    assert codes.tolist() == [MISSING] * 3
+
+def test_outcome_codes():
+    assert OUTCOME_CODES.encode(['Approved', 'Denied', 'approved', '']).tolist() == [1, 0, MISSING, MISSING]
+
+def test_age_threshold():
+    codes = COMPILED_SCHEMA['Age'].encode(['18', '39', '39.5', '40', '75', '', 'old'])
+    assert codes.dtype == np.int8
+    assert codes.tolist() == [1, 1, 1, 0, 0, MISSING, MISSING]
+
+@pytest.mark.parametrize('column', sorted(CATEGORY_LABELS))
+def test_codes_round_trip_through_the_category_labels(column):
+    labels = CATEGORY_LABELS[column]
+    codes = COMPILED_SCHEMA[column].encode(labels)
+    assert [labels[code] for code in codes] == labels
+
+def test_per_request_codes():
+    values = np.array(['Muslim', 'Christian', 'Hindu', 'Christian', 'None'], dtype=object)
+    codes, categories = category_codes(values)
+    assert categories == ['Christian', 'Hindu', 'Muslim', 'None']
+    assert codes.dtype == np.int8
+    assert [categories[code] for code in codes] == values.tolist()
+    assert reference_codes(values, 'Christian').tolist() == [0, 1, 0, 1, 0]
+    assert require_reference('Religion', 'Christian') == 'Christian'
+    with pytest.raises(ValueError, match="'Religion'"):
+        require_reference('Religion', None)
+
+def test_code_width_grows_with_the_largest_code():
+    assert code_dtype(127) == np.int8 and code_dtype(128) == np.int16 and code_dtype(2 ** 31) == np.int64
+    codes = ValueCodes({str(value): value for value in range(300)}).encode(['0', '299', 'x'])
+    assert codes.dtype == np.int16 and codes.tolist() == [0, 299, MISSING]
@@ -0,0 +1,60 @@
+import io
+import json
+
+import fairness_worker
+from conftest import analysis_args
+
+def serve(*requests):
+    lines = [request if isinstance(request, str) else json.dumps(request) for request in requests]
+    output = io.StringIO()
+    fairness_worker.serve(io.StringIO('\n'.join(lines) + '\n'), output)
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+def file_request(path, **options):
+    target_column, protected_attributes, dataset_type, reference_religion, reference_sexual_orientation, categorical = \
+        analysis_args(categorical_attributes=['Religion'])
+    return {'input': path, 'input_format': 'csv', 'target_column': target_column,
+            'protected_attributes': protected_attributes, 'dataset_type': dataset_type,
+            'reference_religion': reference_religion, 'reference_sexual_orientation': reference_sexual_orientation,
+            'categorical_attributes': categorical, **options}
+
+def test_one_response_per_request_after_the_ready_event(csv_path):
+    messages = serve(file_request(csv_path, id=1), '', 'not json', file_request(csv_path, id=2, chunksize=500))
+    assert messages[0]['event'] == 'ready' and messages[0]['aif360_loaded'] is False
+    responses = messages[1:]
+    assert [response['id'] for response in responses] == [1, None, 2]
+    assert responses[0]['error'] is None and responses[2]['error'] is None
+    assert responses[1]['error'].startswith('Invalid request')
+    assert responses[0]['original'] == responses[2]['original']
+    assert {record['span'] for record in responses[0]['timing']['spans']} >= {'parse', 'encode', 'aggregate', 'metrics'}
+
+def test_requests_that_are_not_objects_are_rejected(csv_path):
+    messages = serve('[]', '1', '"x"', 'null', file_request(csv_path, id=5))
+    responses = messages[1:]
+    assert [response['id'] for response in responses] == [None, None, None, None, 5]
+    assert all(response['error'].startswith('Invalid request') for response in responses[:4])
+    assert responses[4]['error'] is None
+
+def test_progress_events_come_before_the_response_when_asked_for(csv_path):
+    messages = serve(file_request(csv_path, id=7, progress=True, chunksize=1000), file_request(csv_path, id=8))
+    events = [message for message in messages if message.get('event') == 'progress']
+    assert events and all(event['id'] == 7 for event in events)
+    assert [message.get('id') for message in messages if 'event' not in message] == [7, 8]
+    last_event = max(index for index, message in enumerate(messages) if message.get('event') == 'progress')
+    assert messages[last_event + 1]['id'] == 7
+    parse_rows = [event['rows'] for event in events if event['stage'] == 'parse']
+    assert parse_rows == sorted(parse_rows) and parse_rows[-1] == 3000
+
+def test_errors_are_reported_with_their_stage(tmp_path):
+    path = tmp_path / 'missing.csv'
+    response = fairness_worker.handle_request(file_request(str(path), id=3))
+    assert response['id'] == 3 and response['stage'] == 'worker' and response['error']
+
+def test_responses_are_strict_json():
+    # Infinite disparate impact (privileged rate 0) must not produce a bare Infinity token
+    data = [{'Gender': 'Male', 'Outcome': 'Denied'}, {'Gender': 'Female', 'Outcome': 'Approved'}]
+    messages = serve({'id': 4, 'data': data, 'target_column': 'Outcome', 'protected_attributes': ['Gender'],
+                      'dataset_type': 'testing'})
+    # Raises if a bare NaN / Infinity token was parsed into a float
+    json.dumps(messages[1], allow_nan=False)
+    assert messages[1]['original']['Gender']['disparate_impact'] == 'Infinity'
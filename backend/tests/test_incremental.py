@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from chunked_analysis import analyze_in_chunks
+from dataset_io import read_dataset
+from incremental import IncrementalMonitor
+from conftest import analysis_args, assert_close
+
+RESULT_KEYS = ('original', 'reweighed', 'outcome_rates', 'raw_data', 'reweighing', 'rows')
+CATEGORICAL = ['Religion']
+
+def monitor(**options):
+    target_column, protected_attributes, _, reference_religion, reference_sexual_orientation, categorical = \
+        analysis_args('training', CATEGORICAL)
+    return IncrementalMonitor(target_column, protected_attributes, reference_religion, reference_sexual_orientation,
+                              categorical, **options)
+
+def expected(rows, tmp_path, name='expected.csv'):
+    # analyze_in_chunks on exactly these rows
+    path = tmp_path / name
+    rows.drop(columns=['Time'], errors='ignore').to_csv(path, index=False)
+    result = analyze_in_chunks(str(path), *analysis_args('training', CATEGORICAL), chunksize=700)
+    assert result['error'] is None
+    return {key: result[key] for key in RESULT_KEYS}
+
+def selected(result):
+    return {key: result[key] for key in RESULT_KEYS}
+
+@pytest.fixture
+def rows(csv_path):
+    # The test rows as the CSV reader gives them, one every 5 minutes from 2024-01-01 (about 10.4 days)
+    df = read_dataset(csv_path, 'csv')
+    times = pd.Timestamp('2024-01-01', tz='UTC') + pd.to_timedelta(df.index * 5, unit='min')
+    return df.assign(Time=times.strftime('%Y-%m-%dT%H:%M:%SZ'))
+
+def days(rows):
+    return pd.to_datetime(rows['Time'], utc=True).dt.floor('1D')
+
+def test_batches_add_up_to_a_run_over_all_rows(rows, tmp_path):
+    state = monitor()
+    for start in range(0, len(rows), 450):
+        state.update(rows.drop(columns=['Time']).iloc[start:start + 450])
+    assert_close(selected(state.metrics('training')), expected(rows, tmp_path))
+
+def test_merged_monitors_match_one_monitor(rows, tmp_path):
+    first = monitor(time_column='Time').update(rows.iloc[:1700])
+    second = monitor(time_column='Time').update(rows.iloc[1700:])
+    merged = first.merge(second)
+    assert_close(selected(merged.metrics('training')), expected(rows, tmp_path))
+    assert_close(selected(merged.window('3D', dataset_type='training')),
+                 selected(monitor(time_column='Time').update(rows).window('3D', dataset_type='training')))
+
+def test_sliding_window_covers_the_buckets_after_its_start(rows, tmp_path):
+    state = monitor(time_column='Time').update(rows)
+    newest = days(rows).max()
+    # Buckets starting in (newest - 3D, newest]: the bucket starting exactly 3 days earlier is out
+    in_window = (days(rows) > newest - pd.Timedelta('3D')) & (days(rows) <= newest)
+    assert_close(selected(state.window('3D', dataset_type='training')), expected(rows[in_window], tmp_path))
+
+    # An explicit end is floored to its bucket
+    end = pd.Timestamp('2024-01-05T13:00:00Z')
+    in_window = (days(rows) > pd.Timestamp('2024-01-03', tz='UTC')) & (days(rows) <= pd.Timestamp('2024-01-05', tz='UTC'))
+    assert_close(selected(state.window('2D', end=end, dataset_type='training')), expected(rows[in_window], tmp_path))
+
+def test_tumbling_windows_are_aligned_and_do_not_overlap(rows, tmp_path):
+    state = monitor(time_column='Time').update(rows)
+    windows = state.tumbling('2D', 'training')
+    starts = days(rows).dt.floor('2D')
+    assert [window['start'] for window in windows] == [start.isoformat() for start in sorted(starts.unique())]
+    assert sum(window['metrics']['rows'] for window in windows) == state.metrics('training')['rows']
+    first = starts == starts.min()
+    assert_close(selected(windows[0]['metrics']), expected(rows[first], tmp_path))
+
+def test_expired_buckets_leave_windows_but_not_the_overall_totals(rows, tmp_path):
+    state = monitor(time_column='Time', retention='3D').update(rows)
+    newest = days(rows).max()
+    assert sorted(state.buckets) == [newest - pd.Timedelta(days=offset) for offset in (2, 1, 0)]
+    assert_close(selected(state.metrics('training')), expected(rows, tmp_path))
+    # A window longer than the retention only sees the buckets that are left
+    kept = days(rows) > newest - pd.Timedelta('3D')
+    assert_close(selected(state.window('7D', dataset_type='training')), expected(rows[kept], tmp_path))
+
+def test_state_survives_a_save_and_load(rows, tmp_path):
+    state = monitor(time_column='Time', retention='5D').update(rows.iloc[:2000])
+    state.save(tmp_path / 'state.pkl')
+    loaded = IncrementalMonitor.load(tmp_path / 'state.pkl').update(rows.iloc[2000:])
+    state.update(rows.iloc[2000:])
+    assert sorted(loaded.buckets) == sorted(state.buckets)
+    assert_close(selected(loaded.metrics('training')), selected(state.metrics('training')))
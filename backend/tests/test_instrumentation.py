@@ -0,0 +1,30 @@
+import logging
+
+import numpy as np
+
+from instrumentation import span, trace, Preview
+
+def test_span_reports_memory_growth_of_the_stage():
+    with trace() as spans:
+        with span('small'):
+            pass
+        with span('large'):
+            block = np.ones(64 * 1024 * 1024 // 8)
+        with span('small'):
+            pass
+    del block
+    records = {record['span']: record for record in spans}
+    assert records['small']['calls'] == 2
+    assert records['large']['rss_growth_mb'] >= 32
+    # Growth is per stage, not the process-lifetime peak
+    assert records['small']['rss_growth_mb'] < 32
+    assert records['small']['process_peak_rss_mb'] >= records['large']['rss_growth_mb']
+
+def test_preview_is_only_rendered_when_emitted(caplog):
+    calls = []
+    preview = Preview(lambda: calls.append(1) or list(range(10000)), chars=50)
+    with caplog.at_level(logging.WARNING):
+        logging.getLogger('test').debug('%s', preview)
+    assert calls == []
+    text = str(preview)
+    assert calls == [1] and text.endswith('characters)') and len(text) < 100
@@ -0,0 +1,92 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from aif360_preprocessing import preprocess_frame
+from intersectional import SubgroupLattice, rank_subgroups, detect_intersectional_bias
+from conftest import analysis_args, TARGET_COLUMN
+
+ATTRIBUTES = ['Gender', 'Race', 'Age', 'Religion']
+
+@pytest.fixture
+def encoded(frame):
+    result = preprocess_frame(frame, *analysis_args('training', ['Religion']))
+    assert result['error'] is None
+    return result['original_data'], result['instance_weights'], result['categories']
+
+def direct_counts(df, attributes, weights):
+    # {values of the attributes: [unfavorable, favorable]} by a plain groupby over the rows
+    grouped = df.assign(weight=weights, favorable=df[TARGET_COLUMN] == 1.0).groupby(attributes + ['favorable'])['weight'].sum()
+    counts = {}
+    for key, weight in grouped.items():
+        *values, favorable = key
+        counts.setdefault(tuple(values), [0.0, 0.0])[int(favorable)] = weight
+    return counts
+
+def lattice_counts(lattice, subset, codes, counts):
+    return {tuple(lattice.levels[attr][code] for attr, code in zip(subset, row)): list(cell)
+            for row, cell in zip(codes, counts)}
+
+def assert_same_counts(actual, expected):
+    assert set(actual) == set(expected)
+    for key, cell in expected.items():
+        np.testing.assert_allclose(actual[key], cell, rtol=1e-12)
+
+@pytest.mark.parametrize('weighted', [False, True])
+def test_every_subgroup_matches_a_groupby(encoded, weighted):
+    df, instance_weights, _ = encoded
+    weights = instance_weights if weighted else np.ones(len(df))
+    lattice = SubgroupLattice.from_frame(df, ATTRIBUTES, TARGET_COLUMN, instance_weights if weighted else None)
+    subgroups = lattice.subgroups(max_depth=len(ATTRIBUTES), min_support=0)
+    assert sorted(subset for subset, _, _ in subgroups) == sorted(
+        subset for depth in range(1, len(ATTRIBUTES) + 1) for subset in itertools.combinations(range(len(ATTRIBUTES)), depth))
+    for subset, codes, counts in subgroups:
+        attributes = [ATTRIBUTES[attr] for attr in subset]
+        assert_same_counts(lattice_counts(lattice, subset, codes, counts), direct_counts(df, attributes, weights))
+
+def test_marginals_do_not_depend_on_the_roll_up_order(encoded):
+    df, _, _ = encoded
+    rolled_up = SubgroupLattice.from_frame(df, ATTRIBUTES, TARGET_COLUMN)
+    rolled_up.marginal((0, 1, 3))
+    rolled_up.marginal((1, 3))
+    direct = SubgroupLattice.from_frame(df, ATTRIBUTES, TARGET_COLUMN)
+    for subset in [(3,), (1, 3), (0, 3)]:
+        codes, counts = rolled_up.marginal(subset)
+        expected_codes, expected_counts = direct.marginal(subset)
+        np.testing.assert_array_equal(codes, expected_codes)
+        np.testing.assert_allclose(counts, expected_counts, rtol=1e-12)
+
+def test_subgroups_below_min_support_are_left_out(encoded):
+    df, _, _ = encoded
+    lattice = SubgroupLattice.from_frame(df, ATTRIBUTES, TARGET_COLUMN)
+    for subset, codes, counts in lattice.subgroups(max_depth=3, min_support=40):
+        attributes = [ATTRIBUTES[attr] for attr in subset]
+        expected = {key: cell for key, cell in direct_counts(df, attributes, np.ones(len(df))).items() if sum(cell) >= 40}
+        assert_same_counts(lattice_counts(lattice, subset, codes, counts), expected)
+    # Some groups of 3 attributes are too small at this support
+    assert any(sum(cell) < 40 for cell in direct_counts(df, ['Race', 'Age', 'Religion'], np.ones(len(df))).values())
+
+def test_subgroups_are_ranked_against_the_rest_of_the_rows(encoded):
+    df, _, categories = encoded
+    lattice = SubgroupLattice.from_frame(df, ATTRIBUTES, TARGET_COLUMN)
+    ranked = rank_subgroups(lattice, max_depth=2, min_support=40, top_k=10, categories=categories)
+    assert len(ranked) == 10
+    gaps = [abs(subgroup['statistical_parity_difference']) for subgroup in ranked]
+    assert gaps == sorted(gaps, reverse=True)
+    for subgroup in ranked:
+        inside = np.ones(len(df), dtype=bool)
+        for name, label in subgroup['subgroup'].items():
+            values = df[name].to_numpy()
+            inside &= values == (categories[name].index(label) if name in categories else float(label))
+        favorable = df[TARGET_COLUMN].to_numpy() == 1.0
+        assert subgroup['size'] == inside.sum() >= 40
+        assert subgroup['favorable_rate'] == pytest.approx(favorable[inside].mean())
+        assert subgroup['statistical_parity_difference'] == pytest.approx(favorable[inside].mean() - favorable[~inside].mean())
+
+def test_detect_intersectional_bias_reports_its_settings(encoded):
+    df, _, categories = encoded
+    result = detect_intersectional_bias(df, [TARGET_COLUMN], list(ATTRIBUTES), categories, max_depth=2, min_support=40, top_k=5)
+    assert result['attributes'] == ATTRIBUTES and result['min_support'] == 40
+    assert len(result['subgroups']) == 5
+    assert all(1 <= subgroup['depth'] <= 2 for subgroup in result['subgroups'])
@@ -0,0 +1,52 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from label_dataset import LabelDataset
+
+INVALID = {
+    'na values': pd.DataFrame({'Gender': [0.0, 1.0], 'Outcome': [1.0, np.nan]}),
+    'missing label column': pd.DataFrame({'Gender': [0.0, 1.0], 'Decision': [1.0, 0.0]}),
+    'missing protected attribute': pd.DataFrame({'Race': [0.0, 1.0], 'Outcome': [1.0, 0.0]}),
+    'labels other than 0 and 1': pd.DataFrame({'Gender': [0.0, 1.0], 'Outcome': [1.0, 2.0]}),
+    'non-numeric values': pd.DataFrame({'Gender': ['Female', 'Male'], 'Outcome': [1.0, 0.0]}),
+}
+
+@pytest.fixture
+def binary_label_dataset():
+    # aif360's class, unloaded again afterwards: the worker tests check that serving never imports aif360
+    loaded = set(sys.modules)
+    datasets = pytest.importorskip('aif360.datasets')
+    yield datasets.BinaryLabelDataset
+    for name in set(sys.modules) - loaded:
+        if name.startswith('aif360'):
+            del sys.modules[name]
+
+def aif360_dataset(binary_label_dataset, df):
+    return binary_label_dataset(favorable_label=1.0, unfavorable_label=0.0, df=df, label_names=['Outcome'],
+                                protected_attribute_names=['Gender'])
+
+@pytest.mark.parametrize('case', sorted(INVALID))
+def test_invalid_frames_raise_what_aif360_raises(binary_label_dataset, case):
+    df = INVALID[case]
+    with pytest.raises(Exception) as expected:
+        aif360_dataset(binary_label_dataset, df.copy())
+    with pytest.raises(type(expected.value)) as actual:
+        LabelDataset(df.copy(), ['Outcome'], ['Gender'], favorable_label=1.0, unfavorable_label=0.0)
+    assert str(actual.value) == str(expected.value)
+
+def test_valid_frames_give_aif360_arrays(binary_label_dataset):
+    df = pd.DataFrame({'Gender': [0, 1, 1, 0], 'Race': [3.0, 2.0, 3.0, 0.0], 'Outcome': [1, 0, 1, 1]})
+    dataset = LabelDataset(df, ['Outcome'], ['Gender', 'Race'])
+    expected = binary_label_dataset(favorable_label=1.0, unfavorable_label=0.0, df=df.astype(float), label_names=['Outcome'],
+                                    protected_attribute_names=['Gender', 'Race'])
+    np.testing.assert_array_equal(dataset.labels, expected.labels)
+    np.testing.assert_array_equal(dataset.protected_attributes, expected.protected_attributes)
+    np.testing.assert_array_equal(dataset.instance_weights, expected.instance_weights)
+    assert dataset.protected_attribute_names == expected.protected_attribute_names
+
+def test_no_frame_is_a_type_error():
+    with pytest.raises(TypeError):
+        LabelDataset(None, ['Outcome'], ['Gender'])
@@ -0,0 +1,73 @@
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+import parallel
+from parallel import count_tables, EXECUTORS
+
+def inputs(rows=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {
+        'Gender': rng.integers(0, 2, rows).astype(np.int8),
+        'Race': rng.integers(0, 4, rows).astype(np.int8),
+        'Religion': rng.integers(0, 8, rows).astype(np.float64),
+    }
+    labels = rng.integers(0, 2, rows).astype(np.int8)
+    weight_sets = [None, rng.uniform(0.5, 2.0, rows)]
+    return columns, labels, weight_sets
+
+@pytest.fixture
+def shared_blocks(monkeypatch):
+    # Names of the shared memory blocks count_tables creates
+    names = []
+    share = parallel.SharedArrays.share
+
+    def recording_share(self, array):
+        handle = share(self, array)
+        if handle is not None:
+            names.append(handle[0])
+        return handle
+
+    monkeypatch.setattr(parallel.SharedArrays, 'share', recording_share)
+    return names
+
+def assert_released(names):
+    assert names
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+def test_every_executor_gives_the_serial_tables():
+    columns, labels, weight_sets = inputs()
+    expected = count_tables(columns, labels, weight_sets)
+    assert [list(tables) for tables in expected] == [list(columns)] * len(weight_sets)
+    for executor in EXECUTORS[1:]:
+        tables = count_tables(columns, labels, weight_sets, executor=executor, max_workers=2)
+        assert [list(result) for result in tables] == [list(result) for result in expected]
+        for result, expected_result in zip(tables, expected):
+            for attr, (group_values, counts) in expected_result.items():
+                np.testing.assert_array_equal(result[attr][0], group_values)
+                # Bit-identical, not just close
+                assert result[attr][1].tobytes() == counts.tobytes()
+
+def test_process_executor_releases_its_shared_memory(shared_blocks):
+    columns, labels, weight_sets = inputs()
+    count_tables(columns, labels, weight_sets, executor='process', max_workers=2)
+    assert_released(shared_blocks)
+
+def test_process_executor_releases_its_shared_memory_when_a_task_fails(shared_blocks):
+    columns, labels, weight_sets = inputs()
+    # Weights of the wrong length make every task of that weight set raise in its worker
+    weight_sets[1] = weight_sets[1][:10]
+    with pytest.raises(ValueError):
+        count_tables(columns, labels, weight_sets, executor='process', max_workers=2)
+    assert_released(shared_blocks)
+
+def test_unknown_executor_is_rejected(monkeypatch):
+    columns, labels, weight_sets = inputs(rows=10)
+    with pytest.raises(ValueError, match='Unknown executor'):
+        count_tables(columns, labels, weight_sets, executor='gpu')
+    monkeypatch.setenv('FAIRNESS_EXECUTOR', 'gpu')
+    with pytest.raises(ValueError, match='Unknown executor'):
+        parallel.executor_from_env()
@@ -0,0 +1,33 @@
+import json
+
+from aif360_preprocessing import preprocess_data, preprocess_frame
+from conftest import analysis_args
+
+def test_preprocess_data_returns_no_rows_by_default(frame):
+    result = preprocess_data(frame, *analysis_args())
+    assert result['error'] is None
+    assert result['original_data'] is None
+    assert result['instance_weights'] is None
+    assert 1 <= len(result['reweighing']['weights']) <= 16
+    json.dumps(result)
+
+def test_preprocess_data_includes_rows_on_request(frame):
+    result = preprocess_data(frame, *analysis_args(), include_rows=True)
+    expected = preprocess_frame(frame, *analysis_args())
+    assert len(result['original_data']) == len(expected['original_data'])
+    assert result['instance_weights'] == expected['instance_weights'].tolist()
+
+def test_categorical_attribute_uses_its_reference_everywhere(frame):
+    result = preprocess_frame(frame, *analysis_args(categorical_attributes=['Religion']))
+    reference = result['references']['Religion']
+    counts = result['raw_data']['Religion']
+    others = [counts[label] for label in counts if label != reference]
+    assert result['outcome_rates']['Religion'] == {
+        'privileged': counts[reference]['approved'] / counts[reference]['total'],
+        'unprivileged': sum(group['approved'] for group in others) / sum(group['total'] for group in others),
+    }
+
+def test_categorical_attribute_without_reference_is_rejected(frame):
+    target_column, protected_attributes, dataset_type, _, _, categorical = analysis_args(categorical_attributes=['Religion'])
+    result = preprocess_frame(frame, target_column, protected_attributes, dataset_type, None, None, categorical)
+    assert 'Religion' in result['error']
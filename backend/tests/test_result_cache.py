@@ -0,0 +1,61 @@
+import os
+
+import fairness_worker
+from result_cache import ResultCache, result_key, table_key
+from conftest import analysis_args, assert_close
+
+RESULT_KEYS = ('original', 'reweighed', 'outcome_rates', 'raw_data', 'reweighing')
+
+def entry_size(tmp_path):
+    probe = ResultCache(str(tmp_path / 'probe'))
+    probe.put('probe', {'value': 'x' * 1000})
+    return os.path.getsize(probe._path('probe', 'json'))
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    size = entry_size(tmp_path)
+    cache = ResultCache(str(tmp_path / 'cache'), max_bytes=2 * size)
+    cache.put('a', {'value': 'a' * 1000})
+    cache.put('b', {'value': 'b' * 1000})
+    os.utime(cache._path('a', 'json'), (1, 1))
+    os.utime(cache._path('b', 'json'), (2, 2))
+    # Reading a makes b the least recently used entry
+    assert cache.get('a') == {'value': 'a' * 1000}
+    cache.put('c', {'value': 'c' * 1000})
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+def test_unreadable_entries_are_misses(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    with open(cache._path('broken', 'json'), 'w') as f:
+        f.write('{"truncated')
+    assert cache.get('broken') is None
+    assert cache.get('missing') is None
+
+def test_keys_only_change_with_parameters_that_change_the_answer():
+    request = {'target_column': 'Outcome', 'protected_attributes': ['Gender'], 'dataset_type': 'training',
+               'reference_religion': 'Christian'}
+    assert result_key('digest', request) == result_key('digest', {**request, 'reference_religion': 'Muslim'})
+    with_religion = {**request, 'protected_attributes': ['Gender', 'Religion']}
+    assert result_key('digest', with_religion) != result_key('digest', {**with_religion, 'reference_religion': 'Muslim'})
+    assert result_key('digest', request) != result_key('digest', {**request, 'dataset_type': 'testing'})
+    assert table_key('digest', request) == table_key('digest', {**request, 'dataset_type': 'testing'})
+    assert result_key('digest', request) != result_key('other', request)
+
+def test_cached_responses_match_the_uncached_path(csv_path, tmp_path, monkeypatch):
+    target_column, protected_attributes, dataset_type, reference_religion, reference_sexual_orientation, categorical = \
+        analysis_args(categorical_attributes=['Religion'])
+    request = {'input': csv_path, 'input_format': 'csv', 'target_column': target_column,
+               'protected_attributes': protected_attributes, 'dataset_type': dataset_type,
+               'reference_religion': reference_religion, 'reference_sexual_orientation': reference_sexual_orientation,
+               'categorical_attributes': categorical}
+    expected = fairness_worker.handle_request(dict(request))
+
+    monkeypatch.setattr(fairness_worker, 'result_cache', ResultCache(str(tmp_path / 'cache')))
+    statuses = []
+    for changed in ({}, {}, {'dataset_type': 'testing'}):
+        response = fairness_worker.handle_request({**request, **changed})
+        statuses.append(response['cache'])
+        if not changed:
+            assert_close({key: response[key] for key in RESULT_KEYS}, {key: expected[key] for key in RESULT_KEYS})
+    # First a miss, then the stored result, then new metrics from the stored aggregated table
+    assert statuses == ['miss', 'result', 'table']
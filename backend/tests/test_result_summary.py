@@ -0,0 +1,48 @@
+import gzip
+import json
+
+import pytest
+
+import fairness_worker
+from result_summary import summarize, encode_summary, SUMMARY_VERSION
+from chunked_analysis import analyze_in_chunks
+from conftest import analysis_args
+
+def test_summary_keeps_counts_rates_weights_and_matrices(csv_path):
+    result = analyze_in_chunks(csv_path, *analysis_args(categorical_attributes=['Religion']))
+    summary = summarize(result)
+    assert summary['version'] == SUMMARY_VERSION
+    assert summary['rows'] == result['rows']
+    religion = summary['groups']['Religion']
+    assert {label: {'approved': approved, 'total': total}
+            for label, approved, total in zip(religion['labels'], religion['approved'], religion['total'])} \
+        == result['raw_data']['Religion']
+    assert summary['rates'] == result['outcome_rates']
+    assert summary['weights'] == result['reweighing']['weights']
+    metrics = summary['metrics']['original']['Religion']
+    assert 'group_metrics' not in metrics
+    assert metrics['matrix'] == result['original']['Religion']['matrix']
+    assert summary['metrics']['original']['Gender'] == result['original']['Gender']
+
+def test_worker_summary_format(csv_path):
+    target_column, protected_attributes, dataset_type, reference_religion, _, categorical = analysis_args()
+    response = fairness_worker.handle_request({'id': 1, 'input': csv_path, 'target_column': target_column,
+                                               'protected_attributes': protected_attributes, 'dataset_type': dataset_type,
+                                               'reference_religion': reference_religion, 'format': 'summary'})
+    assert set(response) == {'id', 'summary', 'error', 'timing'}
+    assert response['summary']['rows'] == sum(response['summary']['groups']['Gender']['total'])
+
+def test_encodings(csv_path):
+    summary = fairness_worker._json_safe(summarize(analyze_in_chunks(csv_path, *analysis_args())))
+    plain = encode_summary(summary)
+    assert json.loads(plain) == summary
+    assert gzip.decompress(encode_summary(summary, 'gzip')) == plain
+    with pytest.raises(ValueError):
+        encode_summary(summary, 'xml')
+    try:
+        import msgpack
+    except ImportError:
+        with pytest.raises(ImportError, match='msgpack'):
+            encode_summary(summary, 'msgpack')
+    else:
+        assert msgpack.unpackb(encode_summary(summary, 'msgpack')) == summary
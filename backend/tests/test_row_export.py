@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aif360_preprocessing import preprocess_frame
+from dataset_io import read_dataset
+from row_export import export_rows, ROW_COLUMN, WEIGHT_COLUMN
+import row_export
+from conftest import analysis_args
+
+def read_page(path):
+    return pd.read_csv(path, keep_default_na=False)
+
+def export(csv_path, output, offset, limit, dataset_type='training', weights=None):
+    args = analysis_args(dataset_type, ['Religion'])
+    return export_rows(csv_path, *args, offset=offset, limit=limit, input_format='csv', output=str(output), weights=weights)
+
+@pytest.mark.parametrize('limit', [700, 3000, 5000])
+def test_pages_add_up_to_the_encoded_dataset(csv_path, tmp_path, limit):
+    expected = preprocess_frame(read_dataset(csv_path, 'csv'), *analysis_args('training', ['Religion']))
+    pages = []
+    offset = 0
+    while offset is not None:
+        output = tmp_path / f'page-{offset}.csv'
+        result = export(csv_path, output, offset, limit)
+        assert result['error'] is None and result['offset'] == offset
+        pages.append(read_page(output))
+        assert len(pages[-1]) == result['rows']
+        offset = result['next_offset']
+    rows = pd.concat(pages, ignore_index=True)
+
+    df = expected['original_data']
+    assert rows[ROW_COLUMN].tolist() == df.index.tolist()
+    assert np.allclose(rows[WEIGHT_COLUMN], expected['instance_weights'])
+    religion = np.asarray(expected['categories']['Religion'], dtype=object)[df['Religion'].to_numpy().astype(int)]
+    assert rows['Religion'].tolist() == religion.tolist()
+    assert rows['Gender'].tolist() == df['Gender'].tolist()
+
+def test_weight_table_gives_the_same_weights_as_a_full_pass(csv_path, tmp_path):
+    expected = preprocess_frame(read_dataset(csv_path, 'csv'), *analysis_args('training', ['Religion']))
+    export(csv_path, tmp_path / 'table.csv', 1000, 500, weights=expected['reweighing']['weights'])
+    export(csv_path, tmp_path / 'pass.csv', 1000, 500)
+    assert read_page(tmp_path / 'table.csv').equals(read_page(tmp_path / 'pass.csv'))
+
+def test_testing_data_has_no_weights_and_past_the_end_is_empty(csv_path, tmp_path):
+    result = export(csv_path, tmp_path / 'page.csv', 0, 100, dataset_type='testing')
+    assert WEIGHT_COLUMN not in read_page(tmp_path / 'page.csv').columns
+    assert result['next_offset'] == 100
+    result = export(csv_path, tmp_path / 'end.csv', 10 ** 6, 100)
+    assert result['error'] is None and result['rows'] == 0 and result['next_offset'] is None
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson'])
+def test_page_rows_are_the_source_rows(frame, tmp_path, fmt):
+    path = tmp_path / f'data.{fmt}'
+    if fmt == 'csv':
+        frame.to_csv(path, index=False)
+    else:
+        frame.to_json(path, orient='records', lines=True)
+    source = read_dataset(str(path), fmt)
+    for offset in (0, 1, 999, 2990):
+        page = row_export.read_page(str(path), fmt, offset, 1000)
+        pd.testing.assert_frame_equal(page, source.iloc[offset:offset + 1000], check_index_type=False)
+    assert row_export.read_page(str(path), fmt, 3000, 1000) is None
@@ -0,0 +1,72 @@
+import numpy as np
+
+from aif360_preprocessing import preprocess_frame
+from bias_detection import detect_bias_sets
+from chunked_analysis import analyze_in_chunks
+from group_metrics import FAVORABLE
+from uncertainty import group_uncertainty, permutation_tables, bootstrap_tables, uncertainty_options
+from conftest import analysis_args, TARGET_COLUMN, PROTECTED_ATTRIBUTES
+
+OPTIONS = uncertainty_options({'replicates': 2000, 'seed': 3})
+
+def identity(value):
+    return value
+
+def test_resampled_tables_keep_the_table_shape_and_totals():
+    counts = np.array([[40.0, 60.0], [70.0, 30.0], [5.0, 5.0]])
+    rng = np.random.default_rng(0)
+    boot = bootstrap_tables(counts, 50, rng)
+    perm = permutation_tables(counts, 50, rng)
+    assert boot.shape == perm.shape == (50, 3, 2)
+    assert (boot.sum(axis=(1, 2)) == counts.sum()).all()
+    # Permutations keep every group's size and the favorable total
+    assert (perm.sum(axis=2) == counts.sum(axis=1)).all()
+    assert (perm[..., FAVORABLE].sum(axis=1) == counts[:, FAVORABLE].sum()).all()
+
+def test_intervals_contain_the_estimate_and_p_values_follow_the_bias():
+    privileged = np.array([True, False])
+    unprivileged = ~privileged
+    biased = np.array([[200.0, 800.0], [600.0, 400.0]])
+    fair = np.array([[500.0, 500.0], [505.0, 495.0]])
+
+    result = group_uncertainty(biased, privileged, unprivileged, OPTIONS, np.random.default_rng(0), identity)
+    spd = result['statistical_parity_difference']
+    assert spd['ci_low'] < 0.4 - 0.8 < spd['ci_high']
+    assert spd['p_value'] < 0.001
+    assert result['disparate_impact']['ci_low'] < 0.5 < result['disparate_impact']['ci_high']
+
+    result = group_uncertainty(fair, privileged, unprivileged, OPTIONS, np.random.default_rng(0), identity)
+    assert result['statistical_parity_difference']['p_value'] > 0.5
+
+def test_analysis_reports_its_options_and_is_reproducible(csv_path):
+    uncertainty = {'replicates': 500, 'seed': 7}
+    first = analyze_in_chunks(csv_path, *analysis_args(categorical_attributes=['Religion']), uncertainty=uncertainty)
+    second = analyze_in_chunks(csv_path, *analysis_args(categorical_attributes=['Religion']), uncertainty=uncertainty)
+    assert first == second
+
+    gender = first['original']['Gender']['uncertainty']
+    assert gender['options'] == uncertainty_options(uncertainty)
+    assert set(gender) == {'options', 'statistical_parity_difference', 'disparate_impact'}
+    religion = first['original']['Religion']['uncertainty']
+    assert set(religion) == {'options', 'overall', 'matrix'}
+    size = len(first['original']['Religion']['matrix']['categories'])
+    assert np.shape(religion['matrix']['statistical_parity_difference']['p_value']) == (size, size)
+
+def test_uncertainty_is_off_by_default(csv_path):
+    result = analyze_in_chunks(csv_path, *analysis_args())
+    assert all('uncertainty' not in metrics for metrics in result['original'].values())
+
+def test_reweighed_metrics_can_go_without_intervals(csv_path, frame):
+    uncertainty = {'replicates': 200, 'seed': 7, 'reweighed': False}
+    result = analyze_in_chunks(csv_path, *analysis_args(), uncertainty=uncertainty)
+    assert all('uncertainty' in metrics for metrics in result['original'].values())
+    assert all('uncertainty' not in metrics for metrics in result['reweighed'].values())
+    both = analyze_in_chunks(csv_path, *analysis_args(), uncertainty={**uncertainty, 'reweighed': True})
+    assert all('uncertainty' in metrics for metrics in both['reweighed'].values())
+
+    preprocessed = preprocess_frame(frame, *analysis_args())
+    original, reweighed = detect_bias_sets(preprocessed['original_data'], [TARGET_COLUMN], list(PROTECTED_ATTRIBUTES),
+                                           'training', None, weight_sets=[None, preprocessed['instance_weights']],
+                                           uncertainty=uncertainty)
+    assert all('uncertainty' in metrics for metrics in original.values())
+    assert all('uncertainty' not in metrics for metrics in reweighed.values())
@@ -8,6 +8,8 @@ import { useNavigate } from 'react-router-dom';
 const { Title, Text, Paragraph } = Typography;
 const { Option } = Select;
 
+const JOB_POLL_INTERVAL_MS = 1000;
+
 const DataUploadPage = () => {
   const [file, setFile] = useState(null);
   const [columns, setColumns] = useState([]);
@@ -119,10 +121,19 @@ const DataUploadPage = () => {
     formData.append('referenceSexualOrientation', referenceSexualOrientation);
   
     try {
-      const response = await axios.post('http://localhost:5003/api/upload', formData, {
+      // The analysis runs as a background job; poll it until it has finished
+      const submitted = await axios.post('http://localhost:5003/api/jobs', formData, {
         headers: { 'Content-Type': 'multipart/form-data' },
       });
-      const biasMetrics = response.data.biasMetrics;
+      let job = submitted.data;
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        job = (await axios.get(`http://localhost:5003/api/jobs/${submitted.data.jobId}`)).data;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error?.error || job.error?.message || 'Analysis failed');
+      }
+      const biasMetrics = job.result.biasMetrics;
       console.log('Bias metrics received:', biasMetrics); // Add this log
       setErrorMessage('');
       navigate('/results', { state: { biasMetrics, datasetType, referenceReligion, referenceSexualOrientation } });